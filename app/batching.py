@@ -0,0 +1,69 @@
+import time
+from collections import deque
+
+
+class LengthBucketBatcher:
+    """
+    Gom job theo bucket độ dài token để bình luận ngắn không phải pad theo bài báo dài.
+
+    Mỗi lần gọi next_batch lấy bucket có nhiều job chờ nhất. Nếu job chờ lâu nhất
+    đã quá max_delay_ms thì ưu tiên bucket của job đó (chống đói cho văn bản dài).
+    """
+
+    def __init__(self, buckets, max_batch_size, max_delay_ms):
+        self.buckets = sorted(buckets)
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.pending = {bucket: deque() for bucket in self.buckets}
+        self.batches = 0
+        self.padding_tokens = 0
+        self.padding_tokens_avoided = 0
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.pending.values())
+
+    def bucket_for(self, length):
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def add(self, item, length):
+        self.pending[self.bucket_for(length)].append((time.monotonic(), length, item))
+
+    def next_batch(self):
+        """
+        Trả về list (item, length) của batch tiếp theo, hoặc list rỗng nếu không có job chờ.
+        """
+        non_empty = [bucket for bucket in self.buckets if self.pending[bucket]]
+        if not non_empty:
+            return []
+
+        oldest_bucket = min(non_empty, key=lambda bucket: self.pending[bucket][0][0])
+        if time.monotonic() - self.pending[oldest_bucket][0][0] >= self.max_delay:
+            bucket = oldest_bucket
+        else:
+            bucket = max(non_empty, key=lambda bucket: len(self.pending[bucket]))
+
+        # Ước lượng padding nếu batch được lấy theo thứ tự đến (không chia bucket)
+        arrivals = sorted((entry for b in non_empty for entry in self.pending[b]), key=lambda entry: entry[0])
+        fifo_max_length = max(length for _, length, _ in arrivals[:self.max_batch_size])
+
+        queue = self.pending[bucket]
+        entries = [queue.popleft() for _ in range(min(len(queue), self.max_batch_size))]
+        lengths = [length for _, length, _ in entries]
+        padding = max(lengths) * len(lengths) - sum(lengths)
+        fifo_padding = fifo_max_length * len(lengths) - sum(lengths)
+
+        self.batches += 1
+        self.padding_tokens += padding
+        self.padding_tokens_avoided += max(0, fifo_padding - padding)
+        return [(item, length) for _, length, item in entries]
+
+    def get_stats(self):
+        return {
+            "batches": self.batches,
+            "pending": len(self),
+            "padding_tokens": self.padding_tokens,
+            "padding_tokens_avoided": self.padding_tokens_avoided,
+        }
@@ -0,0 +1,96 @@
+"""
+Quét các cách chia process × thread trên máy hiện tại và báo layout cho throughput tốt nhất.
+
+Mỗi layout chạy các process fork từ model đã load sẵn (giống worker.py), mỗi process
+giới hạn thread pool (và ghim CPU nếu có --pin), rồi chạy inference liên tục trong
+--duration giây trên văn bản giả lập.
+
+    python bench_layout.py --duration 20 --batch-size 16 --pin
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from settings import Settings
+from model_loader import load_model
+from backends import create_backend
+from utils import sentiment_inference_batch
+from supervisor import usable_cores, available_cpus, assign_cpu_sets, configure_worker_threads
+
+settings = Settings()
+
+SAMPLE_TEXTS = [
+    "FBPAGE_COMMENT Sản phẩm này thực sự rất tốt và tôi sẽ mua lại!",
+    "NEWS_TOPIC Nhiều người phản ánh bị treo tiền, không hoàn tiền khi làm cộng tác viên qua app. " * 8,
+    "FORUM_COMMENT Dịch vụ chăm sóc khách hàng quá chậm, chờ cả tuần chưa được xử lý.",
+]
+
+
+def run_worker(tokenizer, config, model, threads, cpu_set, batch_size, duration, output):
+    configure_worker_threads(threads, cpu_set)
+    texts = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(batch_size)]
+    sentiment_inference_batch(texts, tokenizer, config, model)
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        sentiment_inference_batch(texts, tokenizer, config, model)
+        latencies.append(time.perf_counter() - started)
+    output.put((len(latencies) * batch_size, latencies))
+
+
+def run_layout(tokenizer, config, model, processes, threads, args):
+    cpu_sets = assign_cpu_sets(available_cpus(), [threads] * processes) if args.pin else [None] * processes
+    mp_context = multiprocessing.get_context("fork")
+    output = mp_context.Queue()
+    workers = [
+        mp_context.Process(
+            target=run_worker,
+            args=(tokenizer, config, model, threads, cpu_set, args.batch_size, args.duration, output)
+        )
+        for cpu_set in cpu_sets
+    ]
+    for p in workers:
+        p.start()
+    results = [output.get() for _ in workers]
+    for p in workers:
+        p.join()
+
+    total = sum(count for count, _ in results)
+    latencies = sorted(latency for _, worker_latencies in results for latency in worker_latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    return total / args.duration, p99
+
+
+def candidate_layouts(cores):
+    layouts = []
+    threads = 1
+    while threads <= cores:
+        layouts.append((cores // threads, threads))
+        threads *= 2
+    return layouts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--pin", action="store_true", help="Ghim mỗi process vào tập CPU riêng")
+    args = parser.parse_args()
+
+    cores = usable_cores()
+    tokenizer, config, hf_model = load_model(settings.MODEL, settings.MODEL_DIR)
+    onnx_path = settings.ONNX_PATH or os.path.join(settings.MODEL_DIR, "onnx", "model.onnx")
+    model = create_backend(settings.INFERENCE_BACKEND, hf_model, onnx_path)
+
+    print(f"cores={cores} | backend={model.name} | batch_size={args.batch_size} | pin={args.pin}")
+    best = None
+    for processes, threads in candidate_layouts(cores):
+        throughput, p99 = run_layout(tokenizer, config, model, processes, threads, args)
+        print(f"processes={processes:3d} x threads={threads:3d} | texts/s={throughput:9.1f} | p99 batch={p99 * 1000:8.1f}ms")
+        if best is None or throughput > best[0]:
+            best = (throughput, processes, threads)
+
+    print(f"🏆 Best layout: WORKER_PROCESSES={best[1]} WORKER_THREADS={best[2]} ({best[0]:.1f} texts/s)")
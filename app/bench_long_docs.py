@@ -0,0 +1,95 @@
+"""
+So sánh chi phí và độ chính xác giữa cắt 512 token và chấm nhiều window cho văn bản dài.
+
+File dữ liệu: mỗi dòng là JSON {"text": ..., "label": "positive|negative|neutral"}
+(chấp nhận cả POS/NEG/NEU). Nên dùng các bài dài (NEWS_TOPIC) để thấy khác biệt.
+
+    python bench_long_docs.py --data long_news.jsonl --max-windows 2 4 8
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from settings import Settings
+from model_loader import load_model
+from backends import create_backend, softmax
+from utils import label_mapping
+from windows import encode_documents, aggregate_windows
+
+settings = Settings()
+
+
+def read_samples(path):
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            texts.append(obj["text"])
+            labels.append(label_mapping.get(obj["label"].upper(), obj["label"].lower()))
+    return texts, labels
+
+
+def evaluate(texts, labels, tokenizer, backend, class_labels, batch_size, long_doc, max_windows, rule):
+    negative_index = class_labels.index("negative") if "negative" in class_labels else None
+    predictions, windows_total = [], 0
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        encodings = encode_documents(
+            texts[start:start + batch_size],
+            tokenizer,
+            long_doc=long_doc,
+            window_tokens=settings.LONG_DOC_WINDOW_TOKENS,
+            overlap=settings.LONG_DOC_WINDOW_OVERLAP,
+            max_windows=max_windows
+        )
+        rows = [window for windows in encodings for window in windows]
+        windows_total += len(rows)
+        doc_index = np.repeat(np.arange(len(encodings)), [len(windows) for windows in encodings])
+        inputs = tokenizer.pad({"input_ids": rows}, return_tensors="np")
+        scores = aggregate_windows(
+            softmax(backend.logits(inputs["input_ids"], inputs["attention_mask"])),
+            doc_index, inputs["attention_mask"].sum(axis=1), len(encodings), rule, negative_index
+        )
+        predictions.extend(class_labels[i] for i in scores.argmax(axis=1))
+    elapsed = time.perf_counter() - started
+
+    correct = sum(p == y for p, y in zip(predictions, labels))
+    negatives = [p for p, y in zip(predictions, labels) if y == "negative"]
+    recall = sum(p == "negative" for p in negatives) / len(negatives) if negatives else float("nan")
+    return correct / len(labels), recall, len(texts) / elapsed, windows_total / len(texts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-windows", type=int, nargs="+", default=[2, 4, 8])
+    args = parser.parse_args()
+
+    texts, labels = read_samples(args.data)
+    tokenizer, config, hf_model = load_model(settings.MODEL, settings.MODEL_DIR)
+    onnx_path = settings.ONNX_PATH or os.path.join(settings.MODEL_DIR, "onnx", "model.onnx")
+    backend = create_backend(settings.INFERENCE_BACKEND, hf_model, onnx_path)
+    class_labels = [
+        label_mapping.get(config.id2label[i], config.id2label[i].lower()) for i in range(len(config.id2label))
+    ]
+
+    runs = [("truncate@512", False, 1, "max_negative")]
+    for max_windows in args.max_windows:
+        for rule in ("max_negative", "mean"):
+            runs.append((f"windows<={max_windows} {rule}", True, max_windows, rule))
+
+    print(f"samples={len(texts)} | window={settings.LONG_DOC_WINDOW_TOKENS} overlap={settings.LONG_DOC_WINDOW_OVERLAP}")
+    for name, long_doc, max_windows, rule in runs:
+        accuracy, recall, throughput, windows_per_doc = evaluate(
+            texts, labels, tokenizer, backend, class_labels, args.batch_size, long_doc, max_windows, rule
+        )
+        print(
+            f"{name:<28} | accuracy={accuracy * 100:6.2f}% | negative recall={recall * 100:6.2f}% | "
+            f"docs/s={throughput:7.1f} | windows/doc={windows_per_doc:5.2f}"
+        )
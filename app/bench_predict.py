@@ -0,0 +1,112 @@
+"""
+Benchmark số event `predict` đồng thời mà một server process xử lý được.
+
+Chạy server (python server.py) rồi chạy script này. Với --echo-worker, script
+tự chạy một worker giả trả kết quả ngay lập tức (không load model) để chỉ đo
+chi phí của server. Worker giả hỗ trợ cả giao thức cũ (list kết quả chung) và
+giao thức pub/sub theo reply_to, nên có thể chạy cùng lệnh trên phiên bản cũ
+và mới của server để so sánh.
+
+    python bench_predict.py --echo-worker --concurrency 10 50 100 200 500
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+import redis
+import socketio
+
+from settings import Settings
+
+settings = Settings()
+
+REDIS_REQUEST_QUEUE = "sentiment_request_queue"
+LEGACY_RESULT_QUEUE = "sentiment_result_queue"
+
+SAMPLE_ITEM = {
+    "id": "bench",
+    "topic_name": "Vinamilk",
+    "type": "NEWS_COMMENT",
+    "topic_id": "5cd2a99d2e81050a12e5339a",
+    "siteId": "7427331267015197703",
+    "siteName": "baothegioisua",
+    "title": "Vinamilk dính nghi vấn lừa đảo cộng tác viên qua app nhập liệu",
+    "content": "Nhiều người phản ánh bị treo tiền, không hoàn tiền khi làm cộng tác viên.",
+    "description": "",
+}
+
+
+def echo_worker(stop_event):
+    conn = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+    while not stop_event.is_set():
+        packed = conn.blpop(REDIS_REQUEST_QUEUE, timeout=1)
+        if not packed:
+            continue
+        task = json.loads(packed[1])
+        message = json.dumps({"job_id": task["job_id"], "result": {"sentiment": "neutral"}})
+        if "reply_to" in task:
+            conn.publish(task["reply_to"], message)
+        else:
+            conn.rpush(LEGACY_RESULT_QUEUE, message)
+
+
+async def run_client(url, items_per_event, latencies, errors):
+    client = socketio.AsyncClient()
+    done = asyncio.Event()
+
+    @client.on("result")
+    async def on_result(data):
+        errors.append(sum(1 for r in data["results"] if "error" in r))
+        done.set()
+
+    await client.connect(url, transports=["websocket"])
+    started = time.perf_counter()
+    await client.emit("predict", {"data": [dict(SAMPLE_ITEM, id=str(i)) for i in range(items_per_event)]})
+    await done.wait()
+    latencies.append(time.perf_counter() - started)
+    await client.disconnect()
+
+
+async def run_level(url, concurrency, items_per_event):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(url, items_per_event, latencies, errors) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"concurrency={concurrency:5d} | events/s={concurrency / elapsed:8.1f} | "
+        f"p50={p50 * 1000:8.1f}ms | p99={p99 * 1000:8.1f}ms | timeouts={sum(errors)}"
+    )
+
+
+async def main(args):
+    for concurrency in args.concurrency:
+        await run_level(args.url, concurrency, args.items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100, 200, 500])
+    parser.add_argument("--items", type=int, default=1, help="Số item trong mỗi event predict")
+    parser.add_argument("--echo-worker", action="store_true", help="Chạy worker giả trả kết quả ngay")
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    if args.echo_worker:
+        threading.Thread(target=echo_worker, args=(stop_event,), daemon=True).start()
+    try:
+        asyncio.run(main(args))
+    finally:
+        stop_event.set()
@@ -0,0 +1,106 @@
+"""
+So sánh generate_word_cloud cũ (tokenize từng bài, tạo WordCloudResponse cho mỗi lần xuất hiện của từ)
+với WordCloudEngine (tách từ cả batch, Counter, stopword, top-K, cache tách từ) trên các bài đăng giả lập.
+
+    python bench_wordcloud.py --posts 10000 --batch-size 64 --duplicate-rate 0.2
+"""
+import argparse
+import random
+import re
+import time
+from typing import List
+
+from pyvi import ViTokenizer
+
+from models import WordCloudResponse
+from wordcloud import WordCloudEngine
+
+SENTENCES = [
+    "Khách hàng phản ánh dịch vụ chăm sóc khách hàng của ngân hàng quá chậm trễ.",
+    "Sản phẩm sữa bị phát hiện có chất lượng kém, nhiều phụ huynh lo lắng cho sức khỏe của con.",
+    "Nhân viên tư vấn không hỗ trợ hoàn tiền dù đơn hàng đã bị hủy từ tuần trước.",
+    "Ứng dụng ngân hàng liên tục báo lỗi khi chuyển tiền vào cuối tháng.",
+    "Chương trình khuyến mãi bị nghi ngờ lừa đảo khách hàng tham gia mua sắm trực tuyến.",
+    "Giá vé máy bay tăng mạnh trong dịp lễ khiến hành khách bức xúc.",
+    "Cửa hàng tiện lợi mới khai trương tại thành phố Hồ Chí Minh thu hút đông đảo người dân.",
+    "Tuy nhiên, chúng tôi vẫn chưa nhận được phản hồi chính thức từ công ty.",
+    "Cơ quan chức năng đang điều tra vụ việc và sẽ công bố kết quả trong thời gian tới.",
+    "Người tiêu dùng nên kiểm tra kỹ thông tin sản phẩm trước khi thanh toán.",
+]
+
+
+def legacy_generate_word_cloud(content: str) -> List[WordCloudResponse]:
+    """generate_word_cloud trước khi có WordCloudEngine."""
+    tokenized_content = ViTokenizer.tokenize(content)
+    words = re.findall(r'\w+', tokenized_content.lower())
+    meaningful_words = [word for word in words if '_' in word]
+
+    word_cloud_dict = {}
+    for word in meaningful_words:
+        if word not in word_cloud_dict:
+            word_cloud_dict[word] = 1
+        else:
+            word_cloud_dict[word] += 1
+
+    word_cloud = [WordCloudResponse(word=word, frequency=word_cloud_dict[word]) for word in meaningful_words if
+                  word in word_cloud_dict]
+
+    seen = set()
+    ordered_word_cloud = []
+    for item in word_cloud:
+        if item.word not in seen:
+            ordered_word_cloud.append(item)
+            seen.add(item.word)
+
+    ordered_word_cloud.sort(key=lambda x: x.frequency, reverse=True)
+
+    return ordered_word_cloud
+
+
+def build_posts(count, duplicate_rate, seed=0):
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(count):
+        if posts and rng.random() < duplicate_rate:
+            posts.append(rng.choice(posts))
+        else:
+            posts.append(" ".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 8))))
+    return posts
+
+
+def main(args):
+    posts = build_posts(args.posts, args.duplicate_rate)
+    print(f"posts={len(posts)} | avg_chars={sum(map(len, posts)) // len(posts)} | duplicate_rate={args.duplicate_rate}")
+
+    started = time.perf_counter()
+    for post in posts:
+        [{"word": item.word, "frequency": item.frequency} for item in legacy_generate_word_cloud(post)]
+    legacy = time.perf_counter() - started
+    print(f"legacy     | total={legacy:6.2f}s | per_post={legacy / len(posts) * 1000:6.3f}ms")
+
+    engine = WordCloudEngine(top_k=args.top_k)
+    started = time.perf_counter()
+    for start in range(0, len(posts), args.batch_size):
+        engine.generate_batch_dicts(posts[start:start + args.batch_size])
+    batched = time.perf_counter() - started
+    print(
+        f"engine     | total={batched:6.2f}s | per_post={batched / len(posts) * 1000:6.3f}ms | "
+        f"speedup={legacy / batched:5.2f}x | cache={engine.get_stats()}"
+    )
+
+    # Không có bài trùng: chỉ còn tác dụng của batch + Counter + top-K
+    engine = WordCloudEngine(top_k=args.top_k, cache_size=0)
+    started = time.perf_counter()
+    for start in range(0, len(posts), args.batch_size):
+        engine.generate_batch_dicts(posts[start:start + args.batch_size])
+    uncached = time.perf_counter() - started
+    print(f"no cache   | total={uncached:6.2f}s | per_post={uncached / len(posts) * 1000:6.3f}ms | speedup={legacy / uncached:5.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    parser.add_argument("--top-k", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,282 @@
+import asyncio
+import time
+
+import redis
+import redis.asyncio as aioredis
+import requests
+
+from settings import Settings
+from near_duplicate import get_index, near_duplicate_fingerprint
+from rate_limiter import RateLimiter, AsyncRateLimiter, estimate_tokens, parse_retry_after
+from providers import (
+    ProviderRouter, RequestTimer, create_providers, build_combined_text, build_targeting_prompt,
+    build_batch_targeting_prompt, parse_targeting_output, parse_batch_output
+)
+import providers
+from topic_matcher import TopicPrefilter, not_mentioned_verdict
+
+settings = Settings()
+
+# Session dùng lại kết nối HTTP cho đường gọi đồng bộ (sentiment_filtering từng bài)
+_http_session = requests.Session()
+
+# Token bucket theo từng provider, dùng chung giữa mọi worker / replica (tạo khi cần)
+_rate_limiters = {}
+_async_rate_limiters = {}
+
+REDIS_PREFILTER_STATS = "llm_prefilter:stats"
+
+# Bỏ qua LLM với bài không nhắc tới chủ đề / alias (None nếu tắt)
+prefilter = TopicPrefilter() if settings.LLM_PREFILTER_ENABLED else None
+
+# Provider được bật theo LLM_PROVIDERS (thứ tự ưu tiên) và có API key
+router = ProviderRouter(
+    create_providers(
+        [name.strip() for name in settings.LLM_PROVIDERS.split(",") if name.strip()],
+        {"gemini": settings.GEMINI_API_KEY, "fireworks": settings.FIREWORKS_API_KEY}
+    ),
+    hedge=settings.LLM_HEDGE_ENABLED,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    hedge_max_delay=settings.LLM_HEDGE_MAX_DELAY,
+    max_failures=settings.LLM_PROVIDER_MAX_FAILURES,
+    cooldown=settings.LLM_PROVIDER_COOLDOWN
+)
+
+
+def rate_limits(name):
+    """(request/phút, token/phút) theo quota của từng provider"""
+    return {
+        "gemini": (settings.LLM_GEMINI_REQUESTS_PER_MINUTE, settings.LLM_GEMINI_TOKENS_PER_MINUTE),
+        "fireworks": (settings.LLM_FIREWORKS_REQUESTS_PER_MINUTE, settings.LLM_FIREWORKS_TOKENS_PER_MINUTE),
+    }[name]
+
+
+def get_rate_limiter(name):
+    if name not in _rate_limiters and settings.LLM_RATE_LIMIT_ENABLED:
+        _rate_limiters[name] = RateLimiter(
+            redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB),
+            name, *rate_limits(name),
+            settings.LLM_RATE_LIMIT_MAX_WAIT
+        )
+    return _rate_limiters.get(name)
+
+
+def get_async_rate_limiter(name):
+    if name not in _async_rate_limiters and settings.LLM_RATE_LIMIT_ENABLED:
+        _async_rate_limiters[name] = AsyncRateLimiter(
+            aioredis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB),
+            name, *rate_limits(name),
+            settings.LLM_RATE_LIMIT_MAX_WAIT
+        )
+    return _async_rate_limiters.get(name)
+
+
+def error_verdict(e):
+    return {**providers.error_verdict(e), "provenance": {"source": "llm"}}
+
+
+def prefilter_verdict(data):
+    """Kết quả tại chỗ nếu bài không nhắc tới chủ đề; None nếu cần gọi LLM."""
+    if prefilter is None:
+        return None
+    text = " ".join([data.get("title", ""), data.get("description", ""), data.get("content", "")])
+    if prefilter.mentions_topic(data, text):
+        return None
+    return not_mentioned_verdict()
+
+
+def flush_prefilter_stats(redis_conn):
+    """Cộng dồn bộ đếm prefilter của process này vào hash thống kê chung trên Redis."""
+    if prefilter is None:
+        return
+    deltas = prefilter.pop_unflushed()
+    if not deltas:
+        return
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for name, value in deltas.items():
+            pipe.hincrby(REDIS_PREFILTER_STATS, name, value)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Prefilter stats error: {e}")
+
+
+def find_reused_verdict(data):
+    """
+    Dùng lại kết quả LLM của bài gần trùng cùng chủ đề (repost, khác hashtag / emoji / nguồn).
+    Trả về (verdict hoặc None, fingerprint để lưu lại sau khi gọi LLM).
+    """
+    index = get_index("topic")
+    fingerprint = near_duplicate_fingerprint(build_combined_text(data)) if index is not None else None
+    if fingerprint is None:
+        return None, None
+
+    match = index.find(fingerprint, scope=data.get("topic_name", ""))
+    if match is None:
+        return None, fingerprint
+    verdict, similarity = match
+    return {**verdict, "provenance": {"source": "near_duplicate", "similarity": similarity}}, fingerprint
+
+
+def remember_verdict(data, fingerprint, result, provider=None):
+    if fingerprint is not None:
+        get_index("topic").add(fingerprint, dict(result), scope=data.get("topic_name", ""))
+    result["provenance"] = {"source": "llm", "provider": provider}
+    return result
+
+
+def post_llm(provider, prompt, timer=None):
+    """
+    Gọi một provider (đồng bộ) sau khi lấy đủ ngân sách từ rate limiter của provider đó.
+    429 không bị coi là kết quả: chờ theo Retry-After rồi gọi lại, tối đa LLM_MAX_RETRIES lần.
+    timer chỉ đo thời gian HTTP (không tính chờ rate limiter / Retry-After).
+    """
+    timer = timer or RequestTimer()
+    limiter = get_rate_limiter(provider.name)
+    url, headers, payload = provider.build_request(prompt)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire(estimate_tokens(prompt))
+        with timer.measure():
+            response = _http_session.post(url, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT)
+        if response.status_code == 429 and attempt < settings.LLM_MAX_RETRIES:
+            delay = parse_retry_after(response.headers.get("Retry-After"), default=2 ** attempt)
+            if limiter is not None:
+                limiter.penalize(delay)
+            else:
+                time.sleep(delay)
+            continue
+        response.raise_for_status()
+        return provider.extract_text(response.json())
+
+
+async def post_llm_async(session, provider, prompt, timer=None):
+    """Phiên bản async của post_llm, dùng aiohttp session chung của LLM stage."""
+    timer = timer or RequestTimer()
+    limiter = get_async_rate_limiter(provider.name)
+    url, headers, payload = provider.build_request(prompt)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        if limiter is not None:
+            await limiter.acquire(estimate_tokens(prompt))
+        with timer.measure():
+            async with session.post(url, headers=headers, json=payload) as response:
+                if response.status == 429 and attempt < settings.LLM_MAX_RETRIES:
+                    delay = parse_retry_after(response.headers.get("Retry-After"), default=2 ** attempt)
+                else:
+                    response.raise_for_status()
+                    return provider.extract_text(await response.json())
+        if limiter is not None:
+            await limiter.penalize(delay)
+        else:
+            await asyncio.sleep(delay)
+
+
+def complete(prompt):
+    """
+    Đường đồng bộ: gọi provider nhanh nhất còn khỏe, lỗi thì thử lần lượt các provider sau
+    (không hedge vì không chạy song song được). Trả về (text, tên provider).
+    """
+    ranked = router.ranked()
+    if not ranked:
+        raise RuntimeError("No LLM provider configured")
+    error = None
+    for provider in ranked:
+        timer = RequestTimer()
+        try:
+            text = post_llm(provider, prompt, timer)
+        except Exception as e:
+            provider.record(timer.seconds, False, router.max_failures, router.cooldown)
+            error = e
+            continue
+        provider.record(timer.seconds, True, router.max_failures, router.cooldown)
+        return text, provider.name
+    raise error
+
+
+async def complete_async(session, prompt):
+    """Gọi qua router: provider nhanh nhất, hedge sang provider thứ hai nếu quá p95."""
+    return await router.complete(prompt, lambda provider, text, timer: post_llm_async(session, provider, text, timer))
+
+
+def check_targeting_topic(data: dict) -> dict:
+    """Phiên bản đồng bộ, dùng khi không chạy LLM stage riêng."""
+    verdict, fingerprint = find_reused_verdict(data)
+    if verdict is not None:
+        return verdict
+
+    try:
+        text, provider = complete(build_targeting_prompt(data))
+        return remember_verdict(data, fingerprint, parse_targeting_output(text), provider)
+
+    except Exception as e:
+        return error_verdict(e)
+
+
+async def check_targeting_topic_async(session, data: dict) -> dict:
+    """
+    Phiên bản async cho LLM stage; session là aiohttp.ClientSession dùng chung
+    (connection pool và timeout được cấu hình khi tạo session).
+    """
+    verdict, fingerprint = find_reused_verdict(data)
+    if verdict is not None:
+        return verdict
+
+    try:
+        text, provider = await complete_async(session, build_targeting_prompt(data))
+        return remember_verdict(data, fingerprint, parse_targeting_output(text), provider)
+
+    except Exception as e:
+        return error_verdict(e)
+
+
+async def _check_chunk_async(session, chunk):
+    """
+    Một request cho cả chunk (cùng chủ đề); trả về (list verdict, tên provider),
+    None cho phần tử thiếu hoặc sai schema.
+    """
+    items = [(str(number), data) for number, data in enumerate(chunk, start=1)]
+    try:
+        text, provider = await complete_async(
+            session, build_batch_targeting_prompt(items, chunk[0].get("topic_name", ""))
+        )
+        verdicts = parse_batch_output(text)
+    except Exception as e:
+        print(f"⚠️ Batched LLM call failed ({len(chunk)} items): {e}")
+        verdicts, provider = {}, None
+    return [verdicts.get(item_id) for item_id, _ in items], provider
+
+
+async def check_targeting_topics_async(session, items: list) -> list:
+    """
+    Phiên bản batch của check_targeting_topic_async: gộp tối đa LLM_BATCH_SIZE bài cùng chủ đề
+    vào một prompt, chỉ gọi lại từng bài với các phần tử không đọc được.
+    Trả về list verdict theo thứ tự đầu vào.
+    """
+    verdicts = [None] * len(items)
+    fingerprints = [None] * len(items)
+    groups = {}
+    for i, data in enumerate(items):
+        verdicts[i], fingerprints[i] = find_reused_verdict(data)
+        if verdicts[i] is None:
+            groups.setdefault(data.get("topic_name", ""), []).append(i)
+
+    chunks = [
+        indexes[start:start + settings.LLM_BATCH_SIZE]
+        for indexes in groups.values()
+        for start in range(0, len(indexes), settings.LLM_BATCH_SIZE)
+    ]
+    chunk_results = await asyncio.gather(*[
+        _check_chunk_async(session, [items[i] for i in chunk])
+        for chunk in chunks if len(chunk) > 1
+    ])
+    for chunk, (results, provider) in zip([chunk for chunk in chunks if len(chunk) > 1], chunk_results):
+        for i, verdict in zip(chunk, results):
+            if verdict is not None:
+                verdicts[i] = remember_verdict(items[i], fingerprints[i], verdict, provider)
+
+    # Bài lẻ và phần tử lỗi: gọi từng bài như trước
+    retry_indexes = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    retries = await asyncio.gather(*[check_targeting_topic_async(session, items[i]) for i in retry_indexes])
+    for i, verdict in zip(retry_indexes, retries):
+        verdicts[i] = verdict
+    return verdicts
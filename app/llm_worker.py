@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import socket
+
+import aiohttp
+import redis
+import redis.asyncio as aioredis
+
+from settings import Settings
+from llm import check_targeting_topics_async, router
+from payloads import parse_payload
+from sentiment import apply_topic_analysis
+
+settings = Settings()
+
+REDIS_RESULT_CHANNEL = "sentiment_result"
+REDIS_LLM_QUEUE = "sentiment_llm_queue"
+REDIS_LLM_PROVIDER_STATS = "llm_providers:stats"
+PROVIDER_STATS_INTERVAL = 10
+# Redis lỗi (mất kết nối, failover): chờ rồi thử lại, thời gian chờ tăng gấp đôi tới tối đa
+REDIS_RETRY_MIN_DELAY = 1
+REDIS_RETRY_MAX_DELAY = 30
+
+# LLM stage: nhận các bài đăng tiêu cực từ model worker, gọi Gemini bất đồng bộ
+# (connection pool + giới hạn số request đồng thời + timeout) rồi publish kết quả cuối về reply_to.
+
+def get_redis_connection():
+    return aioredis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+
+async def handle_jobs(redis_conn, session, semaphore, jobs):
+    # Các job cùng chủ đề: một prompt cho cả nhóm (xem check_targeting_topics_async)
+    results = [job.get("result", {}) for job in jobs]
+    try:
+        async with semaphore:
+            topic_analyses = await check_targeting_topics_async(session, [job.get("data_input", {}) for job in jobs])
+        results = [
+            apply_topic_analysis(job.get("data_input", {}), result, topic_analysis)
+            for job, result, topic_analysis in zip(jobs, results, topic_analyses)
+        ]
+    except Exception as e:
+        print(f"❌ LLM jobs {[job.get('job_id') for job in jobs]} | Error: {e}")
+        results = [{**result, "error": str(e)} for result in results]
+
+    await publish_results(redis_conn, jobs, results)
+
+async def publish_results(redis_conn, jobs, results):
+    pipe = redis_conn.pipeline(transaction=False)
+    for job, result in zip(jobs, results):
+        pipe.publish(job.get("reply_to", REDIS_RESULT_CHANNEL), json.dumps({
+            "job_id": job.get("job_id"),
+            "result": result
+        }))
+    try:
+        await pipe.execute()
+    except redis.RedisError as e:
+        # Server chờ job sẽ hết timeout; không để lỗi Redis làm hỏng task
+        print(f"❌ Publish LLM results {[job.get('job_id') for job in jobs]} | Error: {e}")
+
+async def parse_jobs(redis_conn, payloads):
+    """
+    Parse các payload lấy từ queue như worker.enqueue_payloads: job hỏng bị bỏ qua,
+    job hỏng đọc được job_id nhận kết quả lỗi ngay thay vì để server chờ hết timeout.
+    """
+    jobs, failed = [], []
+    for payload in payloads:
+        job, error = parse_payload(payload)
+        if error is None:
+            jobs.append(job)
+        else:
+            failed.append((job, error))
+    if failed:
+        print(f"❌ invalid_llm_jobs={len(failed)} | job_ids={[job.get('job_id') for job, _ in failed]} | errors={[error for _, error in failed]}")
+        failed = [(job, error) for job, error in failed if job.get("job_id")]
+        if failed:
+            await publish_results(redis_conn, [job for job, _ in failed], [{"error": error} for _, error in failed])
+    return jobs
+
+async def fetch_jobs(redis_conn, max_jobs):
+    """
+    Chờ job đầu tiên, sau đó gom thêm trong tối đa LLM_BATCH_WAIT_MS để có nhiều bài cùng chủ đề.
+    """
+    packed = await redis_conn.blpop(REDIS_LLM_QUEUE, timeout=5)
+    if not packed:
+        return []
+
+    payloads = [packed[1]]
+    deadline = asyncio.get_running_loop().time() + settings.LLM_BATCH_WAIT_MS / 1000
+    while len(payloads) < max_jobs:
+        available = await redis_conn.lpop(REDIS_LLM_QUEUE, max_jobs - len(payloads))
+        if available:
+            payloads.extend(available)
+            continue
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(remaining, 0.01))
+    return await parse_jobs(redis_conn, payloads)
+
+async def publish_provider_stats(redis_conn):
+    # Latency / hedge của router nằm trong process: ghi định kỳ để server đọc qua /stats/llm
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        try:
+            await redis_conn.hset(REDIS_LLM_PROVIDER_STATS, worker, json.dumps(router.get_stats()))
+        except Exception as e:
+            print(f"⚠️ Provider stats error: {e}")
+        await asyncio.sleep(PROVIDER_STATS_INTERVAL)
+
+def group_jobs(jobs):
+    # Chia theo chủ đề, mỗi nhóm tối đa LLM_BATCH_SIZE bài
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.get("data_input", {}).get("topic_name", ""), []).append(job)
+    return [
+        topic_jobs[start:start + settings.LLM_BATCH_SIZE]
+        for topic_jobs in groups.values()
+        for start in range(0, len(topic_jobs), settings.LLM_BATCH_SIZE)
+    ]
+
+async def main():
+    redis_conn = get_redis_connection()
+    semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=settings.LLM_MAX_CONNECTIONS, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=settings.LLM_TIMEOUT)
+    in_flight = set()
+    retry_delay = REDIS_RETRY_MIN_DELAY
+
+    print(f"🤖 LLM worker started | providers={[provider.name for provider in router.providers]} | concurrency={settings.LLM_CONCURRENCY} | batch_size={settings.LLM_BATCH_SIZE} | timeout={settings.LLM_TIMEOUT}s")
+    stats_task = asyncio.create_task(publish_provider_stats(redis_conn))
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        try:
+            while True:
+                # Không lấy thêm job khi đã có quá nhiều nhóm đang chờ LLM (backpressure về Redis queue)
+                if len(in_flight) >= settings.LLM_CONCURRENCY * 2:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                try:
+                    jobs = await fetch_jobs(redis_conn, settings.LLM_BATCH_SIZE * settings.LLM_CONCURRENCY)
+                except redis.RedisError as e:
+                    print(f"⚠️ Redis error while fetching LLM jobs: {e} | retry in {retry_delay}s")
+                    await asyncio.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, REDIS_RETRY_MAX_DELAY)
+                    continue
+                retry_delay = REDIS_RETRY_MIN_DELAY
+
+                for group in group_jobs(jobs):
+                    task = asyncio.create_task(handle_jobs(redis_conn, session, semaphore, group))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+        finally:
+            stats_task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            await redis_conn.hdel(REDIS_LLM_PROVIDER_STATS, f"{socket.gethostname()}:{os.getpid()}")
+            await redis_conn.aclose()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Shutting down...")
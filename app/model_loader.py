@@ -0,0 +1,69 @@
+import os
+import time
+from transformers import AutoTokenizer, AutoConfig, AutoModelForSequenceClassification
+from huggingface_hub import snapshot_download
+
+from utils import sentiment_inference_batch
+
+WEIGHT_FILES = ("model.safetensors", "model.safetensors.index.json", "pytorch_model.bin", "pytorch_model.bin.index.json")
+
+WARM_UP_TEXTS = [
+    "NEWS_TOPIC Khởi động model trước khi nhận job.",
+    "FBPAGE_COMMENT Sản phẩm này thực sự rất tốt và tôi sẽ mua lại! " * 20,
+]
+
+
+def is_model_dir_complete(local_dir):
+    """
+    Kiểm tra thư mục model đã tải đủ (config, tokenizer, weights) và không còn file tải dở.
+    """
+    if not os.path.isdir(local_dir):
+        return False
+
+    files = set(os.listdir(local_dir))
+    if "config.json" not in files or "tokenizer_config.json" not in files:
+        return False
+    if not any(name in files for name in WEIGHT_FILES):
+        return False
+
+    for root, _, names in os.walk(local_dir):
+        if any(name.endswith(".incomplete") for name in names):
+            return False
+    return True
+
+
+def resolve_model_dir(repo_id, local_dir):
+    """
+    Trả về thư mục model local, chỉ gọi Hugging Face Hub khi thư mục chưa đầy đủ.
+    """
+    if is_model_dir_complete(local_dir):
+        print(f"📦 Using cached model at {local_dir}")
+        return local_dir
+    return snapshot_download(repo_id=repo_id, local_dir=local_dir)
+
+
+def load_model(repo_id, local_dir):
+    """
+    Load tokenizer, config và model một lần ở process cha.
+    Weights chỉ được đọc nên các worker fork ra dùng chung trang nhớ (copy-on-write).
+    """
+    started = time.perf_counter()
+    model_dir = resolve_model_dir(repo_id, local_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    config = AutoConfig.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+    print(f"📦 Model loaded in {time.perf_counter() - started:.1f}s")
+    return tokenizer, config, model
+
+
+def warm_up(tokenizer, config, model):
+    """
+    Chạy thử vài batch để khởi tạo thread pool và bộ nhớ trước khi worker nhận job.
+    """
+    started = time.perf_counter()
+    sentiment_inference_batch(WARM_UP_TEXTS, tokenizer, config, model)
+    sentiment_inference_batch(WARM_UP_TEXTS[:1], tokenizer, config, model)
+    return time.perf_counter() - started
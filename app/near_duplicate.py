@@ -0,0 +1,129 @@
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from settings import Settings
+
+settings = Settings()
+
+FINGERPRINT_BITS = 64
+# Số band tối đa (band 4 bit); chỉ đảm bảo không bỏ sót khi số band > max_distance
+MAX_BANDS = 16
+
+
+def tokenize(text):
+    """Tách từ (bỏ dấu câu, emoji) trên văn bản NFC chữ thường."""
+    return re.findall(r"\w+", unicodedata.normalize("NFC", text or "").lower())
+
+
+def simhash(tokens):
+    """
+    SimHash 64 bit trên các cặp từ liền nhau (word bigram).
+    Đếm bit của mọi hash bằng numpy: bit của fingerprint bật khi quá nửa số bigram có bit đó.
+    """
+    shingles = [" ".join(tokens[i:i + 2]) for i in range(max(1, len(tokens) - 1))]
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    # Mỗi hàng là 64 bit của một hash, bit cao nhất trước (big-endian như int.from_bytes)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(shingles), 8), axis=1)
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+class SimHashIndex:
+    """
+    Chỉ mục SimHash cho các nội dung gần đây, giới hạn theo thời gian (window_seconds)
+    và số phần tử (max_items). Tìm kiếm chia fingerprint thành max_distance + 1 band: hai fingerprint
+    lệch nhau không quá max_distance bit chắc chắn trùng nhau ở ít nhất một band.
+    Vì số band tối đa là MAX_BANDS, max_distance bị giới hạn ở MAX_BANDS - 1 (threshold >= ~0.77).
+    """
+
+    def __init__(self, window_seconds, max_items, threshold):
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        max_distance = max(0, int(FINGERPRINT_BITS * (1 - threshold)))
+        self.max_distance = min(max_distance, MAX_BANDS - 1)
+        if self.max_distance < max_distance:
+            print(
+                f"⚠️ NEAR_DUP_THRESHOLD={threshold} allows {max_distance} differing bits; "
+                f"clamped to {self.max_distance} (threshold {1 - self.max_distance / FINGERPRINT_BITS:.4f})"
+            )
+        num_bands = self.max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // num_bands
+        self.bands = [(i * self.band_bits, self.band_bits) for i in range(num_bands)]
+        self.entries = OrderedDict()
+        self.tables = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _band_keys(self, fingerprint, scope):
+        for number, (shift, width) in enumerate(self.bands):
+            yield scope, number, fingerprint >> shift & ((1 << width) - 1)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.entries:
+            entry_id, (fingerprint, scope, created, _) = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_items and now - created <= self.window_seconds:
+                break
+            self.entries.popitem(last=False)
+            for band_key in self._band_keys(fingerprint, scope):
+                ids = self.tables.get(band_key)
+                if ids is not None:
+                    ids.discard(entry_id)
+                    if not ids:
+                        del self.tables[band_key]
+
+    def add(self, fingerprint, value, scope=""):
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (fingerprint, scope, time.monotonic(), value)
+        for band_key in self._band_keys(fingerprint, scope):
+            self.tables.setdefault(band_key, set()).add(entry_id)
+        self._evict()
+
+    def find(self, fingerprint, scope=""):
+        """Trả về (value, similarity) của nội dung gần nhất trong cùng scope, hoặc None."""
+        self._evict()
+        candidates = set()
+        for band_key in self._band_keys(fingerprint, scope):
+            candidates |= self.tables.get(band_key, set())
+
+        best = None
+        for entry_id in candidates:
+            other, _, _, value = self.entries[entry_id]
+            distance = bin(fingerprint ^ other).count("1")
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, value)
+        if best is None:
+            return None
+        return best[1], round(1 - best[0] / FINGERPRINT_BITS, 4)
+
+
+def near_duplicate_fingerprint(text):
+    """Fingerprint của văn bản, None nếu văn bản quá ngắn để so khớp gần đúng an toàn."""
+    tokens = tokenize(text)
+    if len(tokens) < settings.NEAR_DUP_MIN_TOKENS:
+        return None
+    return simhash(tokens)
+
+
+_indexes = {}
+
+
+def get_index(name):
+    """Chỉ mục dùng chung trong process theo tên ("sentiment", "topic"); None nếu tắt."""
+    if not settings.NEAR_DUP_ENABLED:
+        return None
+    if name not in _indexes:
+        _indexes[name] = SimHashIndex(
+            settings.NEAR_DUP_WINDOW_SECONDS,
+            settings.NEAR_DUP_MAX_ITEMS,
+            settings.NEAR_DUP_THRESHOLD
+        )
+    return _indexes[name]
@@ -0,0 +1,87 @@
+"""
+So sánh một backend inference (onnx / int8) với model fp32 gốc trên tập held-out.
+
+File dữ liệu: mỗi dòng là một văn bản, hoặc một JSON có trường "text".
+Báo cáo tỉ lệ trùng label, chênh lệch confidence và throughput của từng backend.
+
+    python parity_check.py --data heldout.jsonl --backend int8
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from settings import Settings
+from model_loader import load_model
+from backends import TorchBackend, create_backend, softmax
+
+settings = Settings()
+
+
+def read_texts(path, limit):
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                line = json.loads(line).get("text", "")
+            texts.append(line)
+            if limit and len(texts) >= limit:
+                break
+    return texts
+
+
+def score_all(backend, tokenizer, texts, batch_size):
+    scores = []
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        inputs = tokenizer(
+            texts[start:start + batch_size], return_tensors="np", truncation=True, padding=True, max_length=512
+        )
+        scores.append(softmax(backend.logits(inputs["input_ids"], inputs["attention_mask"])))
+    return np.concatenate(scores), time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--backend", default="int8", choices=["onnx", "int8"])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = read_texts(args.data, args.limit)
+    tokenizer, config, model = load_model(settings.MODEL, settings.MODEL_DIR)
+    onnx_path = settings.ONNX_PATH or os.path.join(settings.MODEL_DIR, "onnx", "model.onnx")
+
+    reference = TorchBackend(model)
+    candidate = create_backend(args.backend, model, onnx_path)
+
+    # Khởi tạo session / thread pool trước khi đo thời gian
+    score_all(reference, tokenizer, texts[:1], 1)
+    score_all(candidate, tokenizer, texts[:1], 1)
+
+    ref_scores, ref_time = score_all(reference, tokenizer, texts, args.batch_size)
+    cand_scores, cand_time = score_all(candidate, tokenizer, texts, args.batch_size)
+
+    ref_labels = ref_scores.argmax(axis=1)
+    cand_labels = cand_scores.argmax(axis=1)
+    rows = np.arange(len(texts))
+    confidence_diff = np.abs(ref_scores[rows, ref_labels] - cand_scores[rows, ref_labels])
+    mismatches = np.flatnonzero(ref_labels != cand_labels)
+
+    print(f"samples               : {len(texts)}")
+    print(f"label agreement       : {100 * (1 - len(mismatches) / max(len(texts), 1)):.2f}%")
+    print(f"confidence diff mean  : {confidence_diff.mean():.5f}")
+    print(f"confidence diff p99   : {np.percentile(confidence_diff, 99):.5f}")
+    print(f"confidence diff max   : {confidence_diff.max():.5f}")
+    print(f"throughput torch fp32 : {len(texts) / ref_time:.1f} texts/s")
+    print(f"throughput {candidate.name:<10} : {len(texts) / cand_time:.1f} texts/s")
+    for i in mismatches[:10]:
+        print(
+            f"  ✗ {config.id2label[int(ref_labels[i])]} -> {config.id2label[int(cand_labels[i])]} | {texts[i][:80]}"
+        )
@@ -0,0 +1,28 @@
+import json
+import re
+
+# Lấy job_id / reply_to từ payload không parse được để vẫn trả lỗi về đúng server đang chờ
+_PAYLOAD_FIELDS = {
+    "job_id": re.compile(r'"job_id"\s*:\s*"([^"]*)"'),
+    "reply_to": re.compile(r'"reply_to"\s*:\s*"([^"]*)"')
+}
+
+def parse_payload(payload):
+    """
+    Parse một payload trong queue, trả về (task, lỗi).
+    Payload hỏng vẫn giữ job_id / reply_to đọc được để client nhận lỗi ngay thay vì chờ hết timeout.
+    """
+    try:
+        task = json.loads(payload)
+        if isinstance(task, dict):
+            return task, None
+        error = "Invalid payload: not a JSON object"
+    except ValueError as e:
+        error = f"Invalid payload: {e}"
+
+    task = {}
+    for key, pattern in _PAYLOAD_FIELDS.items():
+        match = pattern.search(payload) if isinstance(payload, str) else None
+        if match:
+            task[key] = match.group(1)
+    return task, error
@@ -1,22 +1,27 @@
-from utils import sentiment_inference, check_targeting_topic
+from utils import sentiment_inference_batch, sentiment_inference_encoded
+from llm import check_targeting_topic, prefilter_verdict
+from sentiment_cache import normalize_text
+from near_duplicate import get_index, near_duplicate_fingerprint
 
-def analyze_sentiment(data_input, tokenizer, config, model):
+def build_sentiment_text(data_input):
     """
-    Hàm phân tích sentiment của nội dung đầu vào.
-    Trả về label sentiment và thông tin cơ bản.
+    Ghép văn bản đưa vào model từ dữ liệu đầu vào.
+    """
+    return data_input['type'] + ' ' + data_input.get('content', '') + ' ' + data_input.get('description', '')
+
+def build_sentiment_result(data_input, label, provenance=None):
+    """
+    Tạo kết quả cơ bản từ label sentiment.
+    provenance cho biết label đến từ model hay được dùng lại (cache / nội dung gần trùng).
     """
-    text = data_input['type'] + ' ' + data_input.get('content', '') + ' ' + data_input.get('description', '')
     input_type = data_input.get('type', '')
     title = data_input.get('title', '')
     site_name = data_input.get('siteName', '')
     is_kol = data_input.get("is_kol", False)
     total_interactions = data_input.get("total_interactions", 0)
 
-    ref_list, top_label = sentiment_inference(text, tokenizer, config, model)
-    label = top_label if top_label else None
-
     # Kết quả cơ bản
-    result = {
+    return {
         "log_level": 0,
         "reason": "Không phải nội dung tiêu cực.",
         "id": data_input.get('id', ''),
@@ -34,29 +39,139 @@ def analyze_sentiment(data_input, tokenizer, config, model):
         "crisis_keywords": [],
         "is_kol": is_kol,
         "total_interactions": total_interactions,
+        "provenance": {"sentiment": provenance or {"source": "model"}},
     }
 
-    return result, label
+def predict_unique(texts, tokenizer, config, model, encodings=None, cache=None):
+    """
+    Chạy model cho batch nhưng gộp các văn bản trùng nhau (sau chuẩn hóa) để mỗi nội dung
+    chỉ chạy model một lần; nội dung đã có trong cache hoặc gần trùng với nội dung vừa chấm
+    thì dùng lại kết quả.
+    Trả về list (ref_list, top_label) và list provenance theo thứ tự đầu vào.
+    """
+    keys = [cache.key(text) if cache is not None else normalize_text(text) for text in texts]
+    found = cache.get_many(list(dict.fromkeys(keys))) if cache is not None else {}
+    provenance = {key: {"source": "exact_cache"} for key in found}
+
+    # Nội dung gần trùng (khác hashtag, emoji, dòng nguồn...) với nội dung đã chấm gần đây
+    index = get_index("sentiment")
+    fingerprints = {}
+    if index is not None:
+        for text, key in zip(texts, keys):
+            if key in found or key in fingerprints:
+                continue
+            fingerprints[key] = near_duplicate_fingerprint(text)
+            match = index.find(fingerprints[key]) if fingerprints[key] is not None else None
+            if match is not None:
+                found[key] = match[0]
+                provenance[key] = {"source": "near_duplicate", "similarity": match[1]}
+
+    # Vị trí đầu tiên của mỗi nội dung chưa có kết quả
+    first_index = {}
+    for i, key in enumerate(keys):
+        if key not in found and key not in first_index:
+            first_index[key] = i
+
+    unique_indexes = list(first_index.values())
+    if encodings is None:
+        predictions = sentiment_inference_batch([texts[i] for i in unique_indexes], tokenizer, config, model)
+    else:
+        predictions = sentiment_inference_encoded([encodings[i] for i in unique_indexes], tokenizer, config, model)
+
+    computed = dict(zip(first_index.keys(), predictions))
+    if cache is not None:
+        cache.set_many(computed)
+        cache.count_deduplicated(sum(1 for key in keys if key not in found) - len(computed))
+    if index is not None:
+        for key, prediction in computed.items():
+            if fingerprints.get(key) is not None:
+                index.add(fingerprints[key], prediction)
+
+    outputs = [found[key] if key in found else computed[key] for key in keys]
+    return outputs, [provenance.get(key) for key in keys]
+
+def analyze_sentiment_batch(data_inputs, tokenizer, config, model, encodings=None, cache=None):
+    """
+    Hàm phân tích sentiment cho cả batch bằng một lần chạy model.
+    Nếu đã có input_ids (encodings) thì dùng lại, không tokenize lần nữa.
+    Trả về list (result, label) theo thứ tự đầu vào.
+    """
+    texts = [build_sentiment_text(data_input) for data_input in data_inputs]
+    predictions, provenances = predict_unique(texts, tokenizer, config, model, encodings, cache)
+
+    outputs = []
+    for data_input, (ref_list, top_label), provenance in zip(data_inputs, predictions, provenances):
+        label = top_label if top_label else None
+        outputs.append((build_sentiment_result(data_input, label, provenance), label))
+    return outputs
 
-def filter_negative_content(data_input, result):
+def analyze_sentiment(data_input, tokenizer, config, model):
     """
-    Hàm lọc nội dung tiêu cực, chỉ gọi khi sentiment là negative.
+    Hàm phân tích sentiment của nội dung đầu vào.
+    Trả về label sentiment và thông tin cơ bản.
     """
-    array_type_comment = [
-        "FBPAGE_COMMENT", "FBGROUP_COMMENT", "FBUSER_COMMENT", "FORUM_COMMENT",
-        "NEWS_COMMENT", "YOUTUBE_COMMENT", "BLOG_COMMENT", "QA_COMMENT",
-        "SNS_COMMENT", "TIKTOK_COMMENT", "LINKEDIN_COMMENT", "ECOMMERCE_COMMENT"
-    ]
+    return analyze_sentiment_batch([data_input], tokenizer, config, model)[0]
+
+array_type_comment = [
+    "FBPAGE_COMMENT", "FBGROUP_COMMENT", "FBUSER_COMMENT", "FORUM_COMMENT",
+    "NEWS_COMMENT", "YOUTUBE_COMMENT", "BLOG_COMMENT", "QA_COMMENT",
+    "SNS_COMMENT", "TIKTOK_COMMENT", "LINKEDIN_COMMENT", "ECOMMERCE_COMMENT"
+]
 
-    array_type_post = [
-        "FBPAGE_TOPIC", "FBGROUP_TOPIC", "FBUSER_TOPIC", "FORUM_TOPIC", "NEWS_TOPIC",
-        "YOUTUBE_TOPIC", "BLOG_TOPIC", "QA_TOPIC", "SNS_TOPIC", "TIKTOK_TOPIC",
-        "LINKEDIN_TOPIC", "ECOMMERCE_TOPIC"
-    ]
+array_type_post = [
+    "FBPAGE_TOPIC", "FBGROUP_TOPIC", "FBUSER_TOPIC", "FORUM_TOPIC", "NEWS_TOPIC",
+    "YOUTUBE_TOPIC", "BLOG_TOPIC", "QA_TOPIC", "SNS_TOPIC", "TIKTOK_TOPIC",
+    "LINKEDIN_TOPIC", "ECOMMERCE_TOPIC"
+]
+
+def needs_topic_analysis(data_input):
+    """
+    Bài đăng (post) tiêu cực cần gọi LLM kiểm tra có nhắm vào chủ đề hay không.
+    """
+    return data_input.get('type', '') in array_type_post
 
+def apply_topic_analysis(data_input, result, topic_analysis):
+    """
+    Xếp level 2 / 3 cho bài đăng tiêu cực dựa trên kết quả LLM (check_targeting_topic).
+    """
     input_type = data_input.get('type', '')
     is_kol = data_input.get("is_kol", False)
     total_interactions = data_input.get("total_interactions", 0)
+
+    targeting_topic = topic_analysis.get("targeting_topic", False)
+    contains_topic = topic_analysis.get("contains_topic", False)
+    crisis_keywords = topic_analysis.get("crisis_keywords", [])
+    reason = topic_analysis.get("reason", [])
+
+    result.update({
+        "contains_topic": contains_topic,
+        "targeting_topic": targeting_topic,
+        "crisis_keywords": crisis_keywords
+    })
+    result.setdefault("provenance", {})["topic"] = topic_analysis.get("provenance", {"source": "llm"})
+
+    # Check điều kiện Level 3
+    if targeting_topic and len(crisis_keywords) > 0:
+        if "NEWS" in input_type or is_kol or total_interactions >= 100:
+            result.update({
+                "log_level": 3,
+                "reason": reason
+            })
+            return result
+
+    # Nếu không đủ Level 3 → Level 2
+    result.update({
+        "log_level": 2,
+        "reason": reason
+    })
+    return result
+
+def filter_negative_content(data_input, result, defer_topic_analysis=False):
+    """
+    Hàm lọc nội dung tiêu cực, chỉ gọi khi sentiment là negative.
+    Với defer_topic_analysis=True, bài đăng được giữ nguyên kết quả để LLM stage xử lý sau.
+    """
+    input_type = data_input.get('type', '')
     reason = None
 
     # Level 1: Bình luận tiêu cực
@@ -68,35 +183,14 @@ def filter_negative_content(data_input, result):
         return result
 
     # Là bài đăng (post)
-    if input_type in array_type_post:
-        topic_analysis = check_targeting_topic(data_input)
-
-        targeting_topic = topic_analysis.get("targeting_topic", False)
-        contains_topic = topic_analysis.get("contains_topic", False)
-        crisis_keywords = topic_analysis.get("crisis_keywords", [])
-        reason = topic_analysis.get("reason", [])
-
-        result.update({
-            "contains_topic": contains_topic,
-            "targeting_topic": targeting_topic,
-            "crisis_keywords": crisis_keywords
-        })
-
-        # Check điều kiện Level 3
-        if targeting_topic and len(crisis_keywords) > 0:
-            if "NEWS" in input_type or is_kol or total_interactions >= 100:
-                result.update({
-                    "log_level": 3,
-                    "reason": reason
-                })
+    if needs_topic_analysis(data_input):
+        # Bài không nhắc tới chủ đề: có kết quả ngay, không cần chờ LLM stage
+        topic_analysis = prefilter_verdict(data_input)
+        if topic_analysis is None:
+            if defer_topic_analysis:
                 return result
-
-        # Nếu không đủ Level 3 → Level 2
-        result.update({
-            "log_level": 2,
-            "reason": reason
-        })
-        return result
+            topic_analysis = check_targeting_topic(data_input)
+        return apply_topic_analysis(data_input, result, topic_analysis)
 
     # Nếu không xác định rõ type → fallback
     result.update({
@@ -114,4 +208,28 @@ def sentiment_filtering(data_input, tokenizer, config, model):
     if label == 'negative':
         result = filter_negative_content(data_input, result)
 
-    return result
\ No newline at end of file
+    return result
+
+def sentiment_filtering_batch(data_inputs, tokenizer, config, model, encodings=None, cache=None, defer_topic_analysis=False):
+    """
+    Phiên bản batch của sentiment_filtering: chạy model một lần cho cả batch,
+    sau đó lọc từng nội dung tiêu cực.
+    Với defer_topic_analysis=True, bài đăng tiêu cực không gọi LLM ở đây (xem needs_llm_stage).
+    """
+    results = []
+    for data_input, (result, label) in zip(data_inputs, analyze_sentiment_batch(data_inputs, tokenizer, config, model, encodings, cache)):
+        if label == 'negative':
+            result = filter_negative_content(data_input, result, defer_topic_analysis)
+        results.append(result)
+    return results
+
+def needs_llm_stage(data_input, result):
+    """
+    Kết quả còn chờ LLM stage: bài đăng tiêu cực chưa có kết quả kiểm tra chủ đề.
+    """
+    return (
+        isinstance(data_input, dict)
+        and result.get("sentiment") == 'negative'
+        and needs_topic_analysis(data_input)
+        and "topic" not in result.get("provenance", {})
+    )
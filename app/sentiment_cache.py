@@ -0,0 +1,115 @@
+import hashlib
+import json
+import re
+import unicodedata
+from collections import OrderedDict
+
+import redis
+
+REDIS_CACHE_PREFIX = "sentiment_cache"
+REDIS_CACHE_STATS = "sentiment_cache:stats"
+
+
+def normalize_text(text):
+    """Chuẩn hóa văn bản trước khi băm: Unicode NFC, gộp khoảng trắng (giữ hoa/thường vì model phân biệt)."""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class SentimentCache:
+    """
+    Cache kết quả sentiment theo hash của văn bản đã chuẩn hóa.
+    Tầng 1 là LRU trong process (giới hạn max_items), tầng 2 là Redis dùng chung giữa các worker.
+    """
+
+    def __init__(self, redis_conn, namespace, max_items=10000, ttl=86400):
+        self.redis_conn = redis_conn
+        self.namespace = namespace
+        self.max_items = max_items
+        self.ttl = ttl
+        self.local = OrderedDict()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "deduplicated": 0}
+        self._unflushed = dict(self.stats)
+
+    def key(self, text):
+        digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{REDIS_CACHE_PREFIX}:{self.namespace}:{digest}"
+
+    def _count(self, name, value=1):
+        self.stats[name] += value
+        self._unflushed[name] += value
+
+    def _remember(self, key, value):
+        self.local[key] = value
+        self.local.move_to_end(key)
+        while len(self.local) > self.max_items:
+            self.local.popitem(last=False)
+
+    def get_many(self, keys):
+        """Trả về dict key -> (ref_list, top_label) cho các key có trong cache."""
+        found = {}
+        remote_keys = []
+        for key in keys:
+            if key in self.local:
+                self.local.move_to_end(key)
+                found[key] = self.local[key]
+                self._count("local_hits")
+            else:
+                remote_keys.append(key)
+
+        if remote_keys:
+            try:
+                values = self.redis_conn.mget(remote_keys)
+            except redis.RedisError as e:
+                print(f"⚠️ Sentiment cache read error: {e}")
+                values = [None] * len(remote_keys)
+
+            for key, value in zip(remote_keys, values):
+                if value is None:
+                    self._count("misses")
+                    continue
+                obj = json.loads(value)
+                found[key] = (obj["ref_list"], obj["label"])
+                self._remember(key, found[key])
+                self._count("redis_hits")
+        return found
+
+    def set_many(self, items):
+        """Lưu dict key -> (ref_list, top_label) vào cả LRU local và Redis."""
+        if not items:
+            return
+        for key, value in items.items():
+            self._remember(key, value)
+        try:
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for key, (ref_list, label) in items.items():
+                pipe.set(key, json.dumps({"ref_list": ref_list, "label": label}), ex=self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"⚠️ Sentiment cache write error: {e}")
+
+    def count_deduplicated(self, value):
+        self._count("deduplicated", value)
+
+    def flush_stats(self):
+        """Cộng dồn bộ đếm của process này vào hash thống kê chung trên Redis."""
+        deltas = {name: value for name, value in self._unflushed.items() if value}
+        if not deltas:
+            return
+        try:
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for name, value in deltas.items():
+                pipe.hincrby(REDIS_CACHE_STATS, name, value)
+            pipe.execute()
+            self._unflushed = {name: 0 for name in self.stats}
+        except redis.RedisError as e:
+            print(f"⚠️ Sentiment cache stats error: {e}")
+
+    def get_stats(self):
+        lookups = self.stats["local_hits"] + self.stats["redis_hits"] + self.stats["misses"]
+        hits = self.stats["local_hits"] + self.stats["redis_hits"]
+        return {
+            **self.stats,
+            "local_size": len(self.local),
+            "hit_rate": round(hits / lookups * 100, 2) if lookups else 0.0,
+        }
@@ -2,49 +2,190 @@ import socketio
 from aiohttp import web
 import asyncio
 import json
-import redis
+import redis.asyncio as aioredis
 import uuid
 
 from settings import Settings
+from topic_terms import TopicTermAggregator
 
 settings = Settings()
 
-redis_conn = redis.Redis(
+# Pool giới hạn số kết nối: khi hết kết nối, coroutine sẽ chờ thay vì mở thêm
+redis_pool = aioredis.BlockingConnectionPool(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
     db=settings.REDIS_DB,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
     decode_responses=True
 )
+redis_conn = aioredis.Redis(connection_pool=redis_pool)
 REDIS_REQUEST_QUEUE = "sentiment_request_queue"
-REDIS_RESULT_QUEUE = "sentiment_result_queue"
+REDIS_RESULT_CHANNEL = "sentiment_result"
+REDIS_CACHE_STATS = "sentiment_cache:stats"
+REDIS_LLM_RATE_LIMIT_STATS = "llm_rate_limit:{provider}:stats"
+REDIS_LLM_PROVIDER_STATS = "llm_providers:stats"
+REDIS_PREFILTER_STATS = "llm_prefilter:stats"
+REDIS_TOPIC_TERMS_CHANNEL = "topic_terms"
+
+# Mỗi server process nghe kết quả trên một channel riêng,
+# worker publish kết quả vào channel được ghi trong "reply_to" của job
+RESULT_CHANNEL = f"{REDIS_RESULT_CHANNEL}:{uuid.uuid4()}"
+
+# job_id -> asyncio.Future đang chờ kết quả
+pending_results = {}
+
+# Top từ khóa theo chủ đề, mỗi server process tự gộp từ channel topic_terms của worker
+topic_terms = TopicTermAggregator(settings.TOPIC_TERMS_CAPACITY, settings.TOPIC_TERMS_MAX_TOPICS)
+
+# Số payload tối đa trong một lệnh RPUSH
+ENQUEUE_CHUNK_SIZE = 500
 
 # Socket.IO setup
 sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins="*")
 app = web.Application()
 sio.attach(app)
 
-# Đẩy request vào Redis queue
+# Nhận kết quả từ Redis pub/sub và trả về cho future tương ứng
+def _resolve_result(job_id, result):
+    future = pending_results.get(job_id)
+    if future is not None and not future.done():
+        future.set_result(result)
+
+def _add_topic_terms(obj):
+    for topic_id, counts in obj.get("topics", {}).items():
+        topic_terms.add(topic_id, counts, obj.get("ts"))
+
+async def listen_results(pubsub):
+    async for message in pubsub.listen():
+        if message["type"] != "message":
+            continue
+        obj = json.loads(message["data"])
+        if message["channel"] == REDIS_TOPIC_TERMS_CHANNEL:
+            _add_topic_terms(obj)
+            continue
+        _resolve_result(obj.get("job_id"), obj.get("result"))
+
+async def start_result_listener(app):
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(RESULT_CHANNEL)
+    if settings.TOPIC_TERMS_ENABLED:
+        await pubsub.subscribe(REDIS_TOPIC_TERMS_CHANNEL)
+    app["result_pubsub"] = pubsub
+    app["result_listener"] = asyncio.create_task(listen_results(pubsub))
+
+async def stop_result_listener(app):
+    app["result_listener"].cancel()
+    await app["result_pubsub"].aclose()
+    await redis_pool.aclose()
+
+app.on_startup.append(start_result_listener)
+app.on_cleanup.append(stop_result_listener)
+
+# Đẩy một batch request vào Redis queue bằng một lần pipeline
+async def enqueue_requests(jobs):
+    loop = asyncio.get_running_loop()
+    job_ids, payloads = [], []
+    for data_input, meta in jobs:
+        job_id = str(uuid.uuid4())
+        job_ids.append(job_id)
+        payloads.append(json.dumps({
+            "job_id": job_id,
+            "reply_to": RESULT_CHANNEL,
+            "data_input": data_input,
+            "meta": meta
+        }))
+        # Đăng ký future trước khi đẩy job để không bỏ lỡ kết quả trả về sớm
+        pending_results[job_id] = loop.create_future()
+
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for start in range(0, len(payloads), ENQUEUE_CHUNK_SIZE):
+            pipe.rpush(REDIS_REQUEST_QUEUE, *payloads[start:start + ENQUEUE_CHUNK_SIZE])
+        await pipe.execute()
+    return job_ids
+
 async def enqueue_request(data_input, meta):
-    job_id = str(uuid.uuid4())
-    payload = {
-        "job_id": job_id,
-        "data_input": data_input,
-        "meta": meta
-    }
-    redis_conn.rpush(REDIS_REQUEST_QUEUE, json.dumps(payload))
-    return job_id
+    job_ids = await enqueue_requests([(data_input, meta)])
+    return job_ids[0]
+
+# Đợi kết quả của cả batch với một deadline chung, giữ nguyên thứ tự đầu vào
+async def wait_for_results(job_ids, timeout=None):
+    timeout = settings.PREDICT_BATCH_TIMEOUT if timeout is None else timeout
+    futures = [pending_results[job_id] for job_id in job_ids]
+    try:
+        if futures:
+            await asyncio.wait(futures, timeout=timeout)
+        return [
+            future.result() if future.done() else {"error": "Timeout"}
+            for future in futures
+        ]
+    finally:
+        for job_id in job_ids:
+            pending_results.pop(job_id, None)
 
-# Đợi kết quả từ Redis
 async def wait_for_result(job_id, timeout=5):
-    for _ in range(timeout * 10):  # Kiểm tra mỗi 100ms
-        results = redis_conn.lrange(REDIS_RESULT_QUEUE, 0, -1)
-        for item in results:
-            obj = json.loads(item)
-            if obj.get("job_id") == job_id:
-                redis_conn.lrem(REDIS_RESULT_QUEUE, 1, item)
-                return obj["result"]
-        await asyncio.sleep(0.1)
-    return {"error": "Timeout"}
+    results = await wait_for_results([job_id], timeout)
+    return results[0]
+
+# Thống kê cache sentiment do các worker cộng dồn vào Redis
+async def cache_stats(request):
+    stats = {name: int(value) for name, value in (await redis_conn.hgetall(REDIS_CACHE_STATS)).items()}
+    hits = stats.get("local_hits", 0) + stats.get("redis_hits", 0)
+    lookups = hits + stats.get("misses", 0)
+    stats["hit_rate"] = round(hits / lookups * 100, 2) if lookups else 0.0
+    return web.json_response(stats)
+
+app.router.add_get("/stats/cache", cache_stats)
+
+async def llm_stats(request):
+    # Thời gian chờ do rate limit và số lần provider trả 429 (cộng dồn từ mọi LLM worker),
+    # cùng latency / hedge của router mà từng LLM worker ghi lại định kỳ
+    rate_limit = {}
+    for provider in [name.strip() for name in settings.LLM_PROVIDERS.split(",") if name.strip()]:
+        stats = {
+            name: float(value)
+            for name, value in (await redis_conn.hgetall(REDIS_LLM_RATE_LIMIT_STATS.format(provider=provider))).items()
+        }
+        stats["throttled_calls"] = int(stats.get("throttled_calls", 0))
+        stats["rate_limited"] = int(stats.get("rate_limited", 0))
+        stats["throttled_seconds"] = round(stats.get("throttled_seconds", 0.0), 3)
+        rate_limit[provider] = stats
+
+    workers = {
+        worker: json.loads(stats)
+        for worker, stats in (await redis_conn.hgetall(REDIS_LLM_PROVIDER_STATS)).items()
+    }
+    # Tỉ lệ bài đăng tiêu cực không cần gọi LLM vì không nhắc tới chủ đề
+    prefilter = {name: int(value) for name, value in (await redis_conn.hgetall(REDIS_PREFILTER_STATS)).items()}
+    checked = prefilter.get("checked", 0)
+    prefilter["llm_calls_avoided_rate"] = round(prefilter.get("skipped", 0) / checked * 100, 2) if checked else 0.0
+    return web.json_response({"rate_limit": rate_limit, "workers": workers, "prefilter": prefilter})
+
+app.router.add_get("/stats/llm", llm_stats)
+
+# Top từ khóa của một chủ đề: GET /topics/{topic_id}/terms?window=3600&k=20 (window tính bằng giây, tối đa 1 ngày)
+async def topic_top_terms(request):
+    try:
+        window = int(request.query.get("window", 3600))
+        k = int(request.query.get("k", 20))
+    except ValueError:
+        return web.json_response({"error": "window and k must be integers"}, status=400)
+    if window <= 0 or k <= 0:
+        return web.json_response({"error": "window and k must be positive"}, status=400)
+
+    topic_id = request.match_info["topic_id"]
+    return web.json_response({
+        "topic_id": topic_id,
+        "window": window,
+        "terms": topic_terms.top(topic_id, window, k)
+    })
+
+app.router.add_get("/topics/{topic_id}/terms", topic_top_terms)
+
+async def topic_terms_stats(request):
+    return web.json_response(topic_terms.get_stats())
+
+app.router.add_get("/stats/topic_terms", topic_terms_stats)
 
 # Socket events
 @sio.event
@@ -58,13 +199,15 @@ async def disconnect(sid):
 @sio.event
 async def predict(sid, data):
     items = data.get("data", [])
-    results = []
+    results = [None] * len(items)
+    jobs, job_indexes = [], []
 
-    for item in items:
+    for index, item in enumerate(items):
         # Tạo data_input theo cấu trúc cần thiết
         data_input = {
             "id": item.get("id", ""),
             "topic_name": item.get("topic_name", ""),
+            "topic_aliases": item.get("topic_aliases") or [],
             "type": item.get("type", ""),
             "topic_id": item.get("topic_id", ""),
             "site_id": item.get("siteId", ""),
@@ -77,13 +220,13 @@ async def predict(sid, data):
         }
 
         if not data_input["title"] and not data_input["content"] and not data_input["description"]:
-            results.append({
+            results[index] = {
                 "id": item.get("id"),
                 "error": "Empty text"
-            })
+            }
             continue
 
-        job_id = await enqueue_request(data_input, {
+        jobs.append((data_input, {
             "id": item.get("id"),
             "topic_name": item.get("topic_name", ""),
             "topic_id": item.get("topic_id", ""),
@@ -93,14 +236,19 @@ async def predict(sid, data):
             "siteName": item.get("siteName", ""),
             "siteId": item.get("siteId", ""),
             "type": item.get("type", "")
-        })
+        }))
+        job_indexes.append(index)
+
+    job_ids = await enqueue_requests(jobs)
+    job_results = await wait_for_results(job_ids)
 
-        result = await wait_for_result(job_id)
+    for index, result in zip(job_indexes, job_results):
+        item = items[index]
         result.update({
             "id": item.get("id"),
             "topic_name": item.get("topic_name", "")
         })
-        results.append(result)
+        results[index] = result
 
     await sio.emit("result", {"results": results}, to=sid)
 
@@ -1,14 +1,67 @@
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional  # ✅ Import thêm Optional
+from typing import List, Optional  # ✅ Import thêm Optional
 
 class Settings(BaseSettings):
     GEMINI_API_KEY: Optional[str] = Field(default=None, env="GEMINI_API_KEY")
+    FIREWORKS_API_KEY: Optional[str] = Field(default=None, env="FIREWORKS_API_KEY")
     REDIS_HOST: str = Field(default="localhost", env="REDIS_HOST")
     REDIS_PORT: int = Field(default=6379, env="REDIS_PORT")
     REDIS_DB: int = Field(default=0, env="REDIS_DB")
+    REDIS_MAX_CONNECTIONS: int = Field(default=50, env="REDIS_MAX_CONNECTIONS")
+    REDIS_POOL_TIMEOUT: int = Field(default=5, env="REDIS_POOL_TIMEOUT")
+    PREDICT_BATCH_TIMEOUT: float = Field(default=30.0, env="PREDICT_BATCH_TIMEOUT")
     MODEL: str = Field(..., env="MODEL")
+    MODEL_DIR: str = Field(default="./models", env="MODEL_DIR")
+    INFERENCE_BACKEND: str = Field(default="torch", env="INFERENCE_BACKEND")
+    ONNX_PATH: Optional[str] = Field(default=None, env="ONNX_PATH")
+    WORKER_PROCESSES: int = Field(default=0, env="WORKER_PROCESSES")
+    WORKER_THREADS: int = Field(default=0, env="WORKER_THREADS")
+    WORKER_PIN_CPUS: bool = Field(default=False, env="WORKER_PIN_CPUS")
+    WORKER_MAX_BATCH_SIZE: int = Field(default=16, env="WORKER_MAX_BATCH_SIZE")
+    WORKER_MAX_BATCH_WAIT_MS: int = Field(default=20, env="WORKER_MAX_BATCH_WAIT_MS")
+    WORKER_LENGTH_BUCKETS: List[int] = Field(default=[64, 128, 256, 512], env="WORKER_LENGTH_BUCKETS")
+    WORKER_BUCKET_MAX_DELAY_MS: int = Field(default=200, env="WORKER_BUCKET_MAX_DELAY_MS")
+    SENTIMENT_CACHE_ENABLED: bool = Field(default=True, env="SENTIMENT_CACHE_ENABLED")
+    SENTIMENT_CACHE_SIZE: int = Field(default=10000, env="SENTIMENT_CACHE_SIZE")
+    SENTIMENT_CACHE_TTL: int = Field(default=86400, env="SENTIMENT_CACHE_TTL")
+    LONG_DOC_MODE: bool = Field(default=False, env="LONG_DOC_MODE")
+    LONG_DOC_WINDOW_TOKENS: int = Field(default=256, env="LONG_DOC_WINDOW_TOKENS")
+    LONG_DOC_WINDOW_OVERLAP: int = Field(default=64, env="LONG_DOC_WINDOW_OVERLAP")
+    LONG_DOC_MAX_WINDOWS: int = Field(default=8, env="LONG_DOC_MAX_WINDOWS")
+    LONG_DOC_AGGREGATION: str = Field(default="max_negative", env="LONG_DOC_AGGREGATION")
+    NEAR_DUP_ENABLED: bool = Field(default=True, env="NEAR_DUP_ENABLED")
+    NEAR_DUP_THRESHOLD: float = Field(default=0.9, env="NEAR_DUP_THRESHOLD")
+    NEAR_DUP_WINDOW_SECONDS: int = Field(default=3600, env="NEAR_DUP_WINDOW_SECONDS")
+    NEAR_DUP_MAX_ITEMS: int = Field(default=50000, env="NEAR_DUP_MAX_ITEMS")
+    NEAR_DUP_MIN_TOKENS: int = Field(default=8, env="NEAR_DUP_MIN_TOKENS")
+    LLM_STAGE_ENABLED: bool = Field(default=True, env="LLM_STAGE_ENABLED")
+    LLM_CONCURRENCY: int = Field(default=32, env="LLM_CONCURRENCY")
+    LLM_MAX_CONNECTIONS: int = Field(default=64, env="LLM_MAX_CONNECTIONS")
+    LLM_TIMEOUT: float = Field(default=20.0, env="LLM_TIMEOUT")
+    LLM_BATCH_SIZE: int = Field(default=8, env="LLM_BATCH_SIZE")
+    LLM_BATCH_WAIT_MS: int = Field(default=50, env="LLM_BATCH_WAIT_MS")
+    LLM_RATE_LIMIT_ENABLED: bool = Field(default=True, env="LLM_RATE_LIMIT_ENABLED")
+    # Quota riêng của từng provider (mỗi provider một bucket trong Redis)
+    LLM_GEMINI_REQUESTS_PER_MINUTE: int = Field(default=2000, env="LLM_GEMINI_REQUESTS_PER_MINUTE")
+    LLM_GEMINI_TOKENS_PER_MINUTE: int = Field(default=4000000, env="LLM_GEMINI_TOKENS_PER_MINUTE")
+    LLM_FIREWORKS_REQUESTS_PER_MINUTE: int = Field(default=600, env="LLM_FIREWORKS_REQUESTS_PER_MINUTE")
+    LLM_FIREWORKS_TOKENS_PER_MINUTE: int = Field(default=1000000, env="LLM_FIREWORKS_TOKENS_PER_MINUTE")
+    LLM_RATE_LIMIT_MAX_WAIT: float = Field(default=60.0, env="LLM_RATE_LIMIT_MAX_WAIT")
+    LLM_MAX_RETRIES: int = Field(default=3, env="LLM_MAX_RETRIES")
+    LLM_PROVIDERS: str = Field(default="gemini,fireworks", env="LLM_PROVIDERS")
+    LLM_HEDGE_ENABLED: bool = Field(default=False, env="LLM_HEDGE_ENABLED")
+    LLM_HEDGE_MIN_DELAY: float = Field(default=0.5, env="LLM_HEDGE_MIN_DELAY")
+    LLM_HEDGE_MAX_DELAY: float = Field(default=10.0, env="LLM_HEDGE_MAX_DELAY")
+    LLM_PROVIDER_MAX_FAILURES: int = Field(default=3, env="LLM_PROVIDER_MAX_FAILURES")
+    LLM_PROVIDER_COOLDOWN: float = Field(default=30.0, env="LLM_PROVIDER_COOLDOWN")
+    LLM_PREFILTER_ENABLED: bool = Field(default=True, env="LLM_PREFILTER_ENABLED")
+    WORD_CLOUD_TOP_K: Optional[int] = Field(default=50, env="WORD_CLOUD_TOP_K")
+    WORD_CLOUD_CACHE_SIZE: int = Field(default=10000, env="WORD_CLOUD_CACHE_SIZE")
+    TOPIC_TERMS_ENABLED: bool = Field(default=True, env="TOPIC_TERMS_ENABLED")
+    TOPIC_TERMS_CAPACITY: int = Field(default=50, env="TOPIC_TERMS_CAPACITY")
+    TOPIC_TERMS_MAX_TOPICS: int = Field(default=1000, env="TOPIC_TERMS_MAX_TOPICS")
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,98 @@
+import math
+import os
+
+import torch
+
+
+def available_cpus():
+    """Danh sách CPU mà process được phép chạy (theo affinity / cpuset)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cgroup_cpu_limit():
+    """
+    Số core tối đa theo CPU quota của cgroup (v2 rồi v1), None nếu không giới hạn.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def usable_cores():
+    """Số core thực sự dùng được: min(CPU trong affinity, quota của cgroup)."""
+    cores = len(available_cpus())
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cores = min(cores, max(1, math.floor(limit)))
+    return cores
+
+
+def plan_layout(cores, processes=0, threads=0):
+    """
+    Chọn số process và số thread của từng process sao cho tổng thread không vượt quá số core.
+    processes / threads = 0 nghĩa là tự chọn; khi tự chọn, core còn dư (ví dụ 5 core với
+    2 thread mỗi process) được chia thêm cho các process đầu thay vì bỏ trống: 5 core -> [3, 2].
+    Trả về list số thread, mỗi phần tử ứng với một process.
+    """
+    if processes and threads:
+        return [threads] * processes
+    if processes:
+        threads = max(1, cores // processes)
+    else:
+        if not threads:
+            threads = 2 if cores >= 4 else 1
+        processes = max(1, cores // threads)
+    spare = max(0, cores - processes * threads)
+    return [threads + spare // processes + (1 if i < spare % processes else 0) for i in range(processes)]
+
+
+def assign_cpu_sets(cpus, thread_counts):
+    """
+    Chia CPU thành các tập rời nhau cho từng process (process i nhận thread_counts[i] CPU).
+    Trả về None cho mọi process nếu không đủ CPU để ghim riêng.
+    """
+    if sum(thread_counts) > len(cpus):
+        return [None] * len(thread_counts)
+    starts = [sum(thread_counts[:i]) for i in range(len(thread_counts))]
+    return [set(cpus[start:start + threads]) for start, threads in zip(starts, thread_counts)]
+
+
+def configure_worker_threads(threads, cpu_set=None):
+    """
+    Gọi trong từng worker process: ghim CPU (nếu có) và giới hạn thread pool của torch / BLAS.
+    Không dùng OMP_NUM_THREADS / MKL_NUM_THREADS: torch đã được import và khởi tạo thread pool
+    ở process cha nên các biến môi trường này không còn tác dụng; chỉ các API runtime dưới đây có hiệu lực.
+    """
+    if cpu_set and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_set)
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Chỉ set được trước khi torch chạy phép tính song song đầu tiên
+        pass
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
@@ -0,0 +1,62 @@
+# Cài dependency test: pip install -r requirements-dev.txt (trong app/), rồi chạy python -m pytest -q tests
+import os
+import sys
+
+import fakeredis
+import pytest
+
+# Các module của service import phẳng (from settings import Settings) như khi chạy trong /app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL", "test-model")
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_conn(redis_server):
+    return fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+
+
+TINY_VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + (
+    "sản phẩm rất tốt tệ quá lỗi dịch vụ khách hàng ngân hàng chậm hoàn tiền "
+    "NEWS_TOPIC FBPAGE_COMMENT fbPageComment Khởi động model trước khi nhận job. "
+    "này thực sự và tôi sẽ mua lại!"
+).split()
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory):
+    """Model BERT 2 lớp + tokenizer WordLevel lưu ra thư mục, đủ để chạy thật mà không cần tải từ Hub."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import BertConfig, BertForSequenceClassification, PreTrainedTokenizerFast
+
+    model_dir = str(tmp_path_factory.mktemp("tiny_model"))
+    vocab = {token: index for index, token in enumerate(dict.fromkeys(TINY_VOCAB))}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])]
+    )
+    PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]", cls_token="[CLS]", sep_token="[SEP]",
+        model_max_length=512
+    ).save_pretrained(model_dir)
+
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64,
+        max_position_embeddings=512, num_labels=3,
+        id2label={0: "NEG", 1: "NEU", 2: "POS"}, label2id={"NEG": 0, "NEU": 1, "POS": 2}
+    )
+    BertForSequenceClassification(config).save_pretrained(model_dir)
+    return model_dir
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tiny_model_dir):
+    from model_loader import load_model
+    return load_model("unused/repo", tiny_model_dir)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import backends
+from utils import encode_texts
+
+TEXTS = ["sản phẩm rất tốt", "dịch vụ khách hàng quá chậm , lỗi hoàn tiền", "ngân hàng"]
+
+
+@pytest.fixture(scope="module")
+def batch(tiny_model):
+    tokenizer, _, _ = tiny_model
+    rows = [windows[0] for windows in encode_texts(TEXTS, tokenizer)]
+    inputs = tokenizer.pad({"input_ids": rows}, return_tensors="np")
+    return inputs["input_ids"], inputs["attention_mask"]
+
+
+def test_softmax_rows_sum_to_one():
+    probs = backends.softmax(np.array([[1000.0, 1000.0], [0.0, np.log(3.0)]]))
+    np.testing.assert_allclose(probs, [[0.5, 0.5], [0.25, 0.75]])
+
+
+def test_create_backend_rejects_unknown_name(tiny_model):
+    with pytest.raises(ValueError, match="Unknown inference backend"):
+        backends.create_backend("tensorrt", tiny_model[2])
+
+
+def test_as_backend_wraps_hf_models(tiny_model):
+    backend = backends.as_backend(tiny_model[2])
+    assert isinstance(backend, backends.TorchBackend)
+    assert backends.as_backend(backend) is backend
+
+
+@pytest.mark.parametrize("name", ["int8", "onnx"])
+def test_backend_matches_fp32(name, tiny_model, batch, tmp_path):
+    if name == "onnx":
+        pytest.importorskip("onnxruntime")
+    input_ids, attention_mask = batch
+    expected = backends.softmax(backends.TorchBackend(tiny_model[2]).logits(input_ids, attention_mask))
+
+    backend = backends.create_backend(name, tiny_model[2], str(tmp_path / "onnx" / "model.onnx"))
+    probs = backends.softmax(backend.logits(input_ids, attention_mask))
+
+    assert backend.name == name
+    if name == "onnx":
+        np.testing.assert_allclose(probs, expected, atol=1e-4)
+    else:
+        # Lượng tử hóa int8 chỉ xấp xỉ fp32
+        np.testing.assert_allclose(probs, expected, atol=0.05)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import fakeredis
+
+import server
+
+
+def _use_fake_redis(monkeypatch, redis_server):
+    conn = fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+    monkeypatch.setattr(server, "redis_conn", conn)
+    monkeypatch.setattr(server, "pending_results", {})
+    return conn
+
+
+def test_enqueue_requests_pushes_every_job_in_order(monkeypatch, redis_server):
+    monkeypatch.setattr(server, "ENQUEUE_CHUNK_SIZE", 2)
+
+    async def run():
+        conn = _use_fake_redis(monkeypatch, redis_server)
+        job_ids = await server.enqueue_requests([({"title": str(i)}, {"id": i}) for i in range(5)])
+        return job_ids, await conn.lrange(server.REDIS_REQUEST_QUEUE, 0, -1)
+
+    job_ids, queued = asyncio.run(run())
+    payloads = [json.loads(payload) for payload in queued]
+    assert [payload["job_id"] for payload in payloads] == job_ids
+    assert [payload["meta"]["id"] for payload in payloads] == list(range(5))
+    assert {payload["reply_to"] for payload in payloads} == {server.RESULT_CHANNEL}
+    assert set(server.pending_results) == set(job_ids)
+
+
+def test_wait_for_results_times_out_missing_jobs_and_cleans_up(monkeypatch):
+    async def run():
+        monkeypatch.setattr(server, "pending_results", {})
+        loop = asyncio.get_running_loop()
+        server.pending_results["a"] = loop.create_future()
+        server.pending_results["b"] = loop.create_future()
+        server.pending_results["a"].set_result({"sentiment": "positive"})
+        return await server.wait_for_results(["b", "a"], timeout=0.05)
+
+    assert asyncio.run(run()) == [{"error": "Timeout"}, {"sentiment": "positive"}]
+    assert server.pending_results == {}
+
+
+def test_predict_keeps_input_order_around_empty_items(monkeypatch, redis_server):
+    emitted = []
+
+    async def emit(event, data, to=None):
+        emitted.append((event, data, to))
+
+    monkeypatch.setattr(server.sio, "emit", emit)
+
+    async def fake_worker(conn):
+        # Trả kết quả cho từng job trong queue như worker thật
+        while True:
+            payload = await conn.lpop(server.REDIS_REQUEST_QUEUE)
+            if payload is None:
+                await asyncio.sleep(0.01)
+                continue
+            job = json.loads(payload)
+            server._resolve_result(job["job_id"], {"sentiment": "neutral", "title": job["data_input"]["title"]})
+
+    async def run():
+        conn = _use_fake_redis(monkeypatch, redis_server)
+        worker_task = asyncio.create_task(fake_worker(conn))
+        await server.predict("sid", {"data": [
+            {"id": "1", "title": "một", "topic_name": "A"},
+            {"id": "2"},
+            {"id": "3", "title": "ba", "topic_name": "B"},
+        ]})
+        worker_task.cancel()
+
+    asyncio.run(run())
+    event, data, to = emitted[0]
+    assert (event, to) == ("result", "sid")
+    assert data["results"] == [
+        {"sentiment": "neutral", "title": "một", "id": "1", "topic_name": "A"},
+        {"id": "2", "error": "Empty text"},
+        {"sentiment": "neutral", "title": "ba", "id": "3", "topic_name": "B"},
+    ]
@@ -0,0 +1,58 @@
+import batching
+from batching import LengthBucketBatcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_for_uses_smallest_fitting_bucket():
+    batcher = LengthBucketBatcher([512, 64, 128], 8, 200)
+    assert [batcher.bucket_for(length) for length in (1, 64, 65, 500, 2000)] == [64, 64, 128, 512, 512]
+
+
+def test_next_batch_takes_fullest_bucket_up_to_max_batch_size(monkeypatch):
+    monkeypatch.setattr(batching.time, "monotonic", FakeClock())
+    batcher = LengthBucketBatcher([64, 512], 3, 200)
+    batcher.add("long", 400)
+    for i in range(4):
+        batcher.add(f"short-{i}", 10 + i)
+
+    assert batcher.next_batch() == [("short-0", 10), ("short-1", 11), ("short-2", 12)]
+    assert len(batcher) == 2
+    assert LengthBucketBatcher([64], 3, 200).next_batch() == []
+
+
+def test_oldest_job_is_served_after_max_delay(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(batching.time, "monotonic", clock)
+    batcher = LengthBucketBatcher([64, 512], 8, 200)
+    batcher.add("long", 400)
+    clock.now = 0.1
+    batcher.add("short-0", 10)
+    batcher.add("short-1", 10)
+
+    clock.now = 0.15
+    assert [item for item, _ in batcher.next_batch()] == ["short-0", "short-1"]
+    batcher.add("short-2", 10)
+    batcher.add("short-3", 10)
+    # Bài dài đã chờ quá 200ms: lấy trước dù bucket ngắn đông hơn
+    clock.now = 0.25
+    assert batcher.next_batch() == [("long", 400)]
+
+
+def test_stats_count_padding_avoided_by_bucketing(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(batching.time, "monotonic", clock)
+    batcher = LengthBucketBatcher([64, 512], 2, 200)
+    for item, length in (("long", 500), ("a", 10), ("b", 20)):
+        batcher.add(item, length)
+        clock.now += 0.01
+
+    assert [item for item, _ in batcher.next_batch()] == ["a", "b"]
+    # Theo thứ tự đến batch sẽ là (long, a): pad theo 500 token
+    assert batcher.get_stats() == {"batches": 1, "pending": 1, "padding_tokens": 10, "padding_tokens_avoided": 960}
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import llm
+from providers import parse_batch_output
+
+VERDICT = {"contains_topic": True, "targeting_topic": True, "reason": "Công kích.", "crisis_keywords": ["lừa đảo"]}
+
+
+def _post(post_id, topic="Ngân hàng A"):
+    return {"id": post_id, "topic_name": topic, "content": f"bài {post_id}"}
+
+
+def test_parse_batch_output_keeps_only_valid_elements():
+    raw = "```json\n" + json.dumps([
+        {"id": 1, **VERDICT},
+        {"id": "2", "contains_topic": "yes", "targeting_topic": False, "reason": ""},
+        {"contains_topic": False, "targeting_topic": False, "reason": "thiếu id"},
+        {"id": "4", "contains_topic": False, "targeting_topic": False, "reason": "", "crisis_keywords": [1]},
+        "not an object",
+    ]) + "\n```"
+    assert parse_batch_output(raw) == {"1": VERDICT}
+    assert parse_batch_output("không có JSON") == {}
+    assert parse_batch_output('{"id": 1}') == {}
+
+
+def _run_check(monkeypatch, items, batch_reply):
+    """Chạy check_targeting_topics_async với LLM giả; trả về (verdicts, các prompt đã gửi)."""
+    calls = []
+    monkeypatch.setattr(llm, "get_index", lambda name: None)
+    monkeypatch.setattr(llm.settings, "LLM_BATCH_SIZE", 3)
+    monkeypatch.setattr(llm, "build_batch_targeting_prompt", lambda chunk, topic: ("batch", topic, [data["id"] for _, data in chunk]))
+    monkeypatch.setattr(llm, "build_targeting_prompt", lambda data: ("single", data["id"]))
+
+    async def fake_complete(session, prompt):
+        calls.append(prompt)
+        if prompt[0] == "batch":
+            return batch_reply(prompt[2]), "gemini"
+        return json.dumps(dict(VERDICT, reason=f"single {prompt[1]}")), "fireworks"
+
+    monkeypatch.setattr(llm, "complete_async", fake_complete)
+    return asyncio.run(llm.check_targeting_topics_async(None, items)), calls
+
+
+def test_posts_are_packed_per_topic_up_to_batch_size(monkeypatch):
+    items = [_post(f"a{i}") for i in range(4)] + [_post("b0", topic="B"), _post("b1", topic="B")]
+
+    def reply(ids):
+        return json.dumps([{"id": str(number), **dict(VERDICT, reason=post_id)} for number, post_id in enumerate(ids, start=1)])
+
+    verdicts, calls = _run_check(monkeypatch, items, reply)
+
+    assert sorted(calls) == sorted([
+        ("batch", "Ngân hàng A", ["a0", "a1", "a2"]),
+        ("batch", "B", ["b0", "b1"]),
+        ("single", "a3"),
+    ])
+    assert [verdict["reason"] for verdict in verdicts] == ["a0", "a1", "a2", "single a3", "b0", "b1"]
+    assert verdicts[0]["provenance"] == {"source": "llm", "provider": "gemini"}
+    assert verdicts[3]["provenance"] == {"source": "llm", "provider": "fireworks"}
+
+
+def test_only_unparsed_elements_are_retried_alone(monkeypatch):
+    items = [_post(f"a{i}") for i in range(3)]
+
+    def reply(ids):
+        # Phần tử thứ hai sai schema, phần tử thứ ba bị thiếu
+        return json.dumps([{"id": "1", **VERDICT}, {"id": "2", "contains_topic": None}])
+
+    verdicts, calls = _run_check(monkeypatch, items, reply)
+
+    assert calls[0][0] == "batch"
+    assert sorted(calls[1:]) == [("single", "a1"), ("single", "a2")]
+    assert [verdict["reason"] for verdict in verdicts] == ["Công kích.", "single a1", "single a2"]
+
+
+def test_failed_batch_call_falls_back_to_single_calls(monkeypatch):
+    items = [_post("a0"), _post("a1")]
+
+    def reply(ids):
+        raise RuntimeError("timeout")
+
+    verdicts, calls = _run_check(monkeypatch, items, reply)
+    assert sorted(calls[1:]) == [("single", "a0"), ("single", "a1")]
+    assert [verdict["reason"] for verdict in verdicts] == ["single a0", "single a1"]
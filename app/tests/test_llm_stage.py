@@ -0,0 +1,171 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+import redis
+
+import llm_worker
+import sentiment
+import worker
+
+VERDICT = {"contains_topic": True, "targeting_topic": True, "reason": "Công kích ngân hàng.", "crisis_keywords": ["lừa đảo"]}
+
+
+def _post(post_id, topic="Ngân hàng A", post_type="NEWS_TOPIC"):
+    return {"id": post_id, "type": post_type, "topic_name": topic, "content": f"Ngân hàng A lừa đảo {post_id}"}
+
+
+def _published(pubsub):
+    messages = []
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.05)
+        if message is not None and message["type"] == "message":
+            messages.append((message["channel"], json.loads(message["data"])))
+    return messages
+
+
+def _no_sync_llm_call(data):
+    raise AssertionError("model worker must not call the LLM")
+
+
+def test_negative_posts_are_deferred_to_llm_stage(monkeypatch):
+    monkeypatch.setattr(sentiment, "prefilter_verdict", lambda data: None)
+    monkeypatch.setattr(sentiment, "check_targeting_topic", _no_sync_llm_call)
+
+    post, comment = _post("p1"), _post("c1", post_type="FBPAGE_COMMENT")
+    post_result = sentiment.filter_negative_content(post, sentiment.build_sentiment_result(post, "negative"), True)
+    comment_result = sentiment.filter_negative_content(comment, sentiment.build_sentiment_result(comment, "negative"), True)
+
+    assert sentiment.needs_llm_stage(post, post_result)
+    assert not sentiment.needs_llm_stage(comment, comment_result)
+    assert comment_result["log_level"] == 1
+
+
+def test_prefiltered_posts_are_not_deferred(monkeypatch):
+    verdict = {"contains_topic": False, "targeting_topic": False, "reason": "", "crisis_keywords": [], "provenance": {"source": "prefilter"}}
+    monkeypatch.setattr(sentiment, "prefilter_verdict", lambda data: verdict)
+
+    post = _post("p1")
+    result = sentiment.filter_negative_content(post, sentiment.build_sentiment_result(post, "negative"), True)
+    assert not sentiment.needs_llm_stage(post, result)
+    assert result["log_level"] == 2
+
+
+def test_enqueued_jobs_are_fetched_by_llm_stage(redis_server, redis_conn, monkeypatch):
+    monkeypatch.setattr(llm_worker.settings, "LLM_BATCH_WAIT_MS", 0)
+    tasks = [{"job_id": f"j{i}", "reply_to": "sentiment_result:a", "data_input": _post(f"p{i}")} for i in range(3)]
+    worker.enqueue_llm_jobs(redis_conn, tasks, [{"id": f"p{i}"} for i in range(3)])
+
+    async def fetch():
+        async_conn = fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+        try:
+            return await llm_worker.fetch_jobs(async_conn, 2), await llm_worker.fetch_jobs(async_conn, 2)
+        finally:
+            await async_conn.aclose()
+
+    first, second = asyncio.run(fetch())
+    assert [job["job_id"] for job in first] == ["j0", "j1"]
+    assert [job["job_id"] for job in second] == ["j2"]
+    assert first[0] == {"job_id": "j0", "reply_to": "sentiment_result:a", "data_input": _post("p0"), "result": {"id": "p0"}}
+
+
+def test_group_jobs_splits_by_topic_and_batch_size(monkeypatch):
+    monkeypatch.setattr(llm_worker.settings, "LLM_BATCH_SIZE", 2)
+    jobs = [{"job_id": i, "data_input": _post(str(i), topic="A" if i < 3 else "B")} for i in range(5)]
+    assert [[job["job_id"] for job in group] for group in llm_worker.group_jobs(jobs)] == [[0, 1], [2], [3, 4]]
+
+
+def _handle(redis_server, redis_conn, jobs):
+    pubsub = redis_conn.pubsub()
+    pubsub.subscribe("sentiment_result:a")
+
+    async def run():
+        async_conn = fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+        try:
+            await llm_worker.handle_jobs(async_conn, None, asyncio.Semaphore(1), jobs)
+        finally:
+            await async_conn.aclose()
+
+    asyncio.run(run())
+    return _published(pubsub)
+
+
+def test_handle_jobs_publishes_final_results(redis_server, redis_conn, monkeypatch):
+    async def fake_check(session, items):
+        return [dict(VERDICT, provenance={"source": "llm", "provider": "gemini"}) for _ in items]
+
+    monkeypatch.setattr(llm_worker, "check_targeting_topics_async", fake_check)
+    post = _post("p1")
+    jobs = [{"job_id": "j1", "reply_to": "sentiment_result:a", "data_input": post, "result": sentiment.build_sentiment_result(post, "negative")}]
+
+    [(channel, message)] = _handle(redis_server, redis_conn, jobs)
+    assert channel == "sentiment_result:a"
+    assert message["job_id"] == "j1"
+    assert message["result"]["log_level"] == 3
+    assert message["result"]["crisis_keywords"] == ["lừa đảo"]
+    assert message["result"]["provenance"]["topic"] == {"source": "llm", "provider": "gemini"}
+
+
+def test_handle_jobs_publishes_error_when_llm_fails(redis_server, redis_conn, monkeypatch):
+    async def failing_check(session, items):
+        raise RuntimeError("no provider")
+
+    monkeypatch.setattr(llm_worker, "check_targeting_topics_async", failing_check)
+    jobs = [{"job_id": f"j{i}", "reply_to": "sentiment_result:a", "data_input": _post(f"p{i}"), "result": {"id": f"p{i}"}} for i in range(2)]
+
+    messages = _handle(redis_server, redis_conn, jobs)
+    assert [message["job_id"] for _, message in messages] == ["j0", "j1"]
+    assert all(message["result"]["error"] == "no provider" for _, message in messages)
+
+
+def test_malformed_llm_job_is_reported_and_skipped(redis_server, redis_conn, monkeypatch):
+    monkeypatch.setattr(llm_worker.settings, "LLM_BATCH_WAIT_MS", 0)
+    redis_conn.rpush(
+        llm_worker.REDIS_LLM_QUEUE,
+        json.dumps({"job_id": "j0", "data_input": _post("p0")}),
+        '{"job_id": "bad", "reply_to": "sentiment_result:a", "data_input": {',
+        "[]",
+        json.dumps({"job_id": "j1", "data_input": _post("p1")}),
+    )
+    pubsub = redis_conn.pubsub()
+    pubsub.subscribe("sentiment_result:a")
+    pubsub.get_message(timeout=0.05)
+
+    async def fetch():
+        async_conn = fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+        try:
+            return await llm_worker.fetch_jobs(async_conn, 10)
+        finally:
+            await async_conn.aclose()
+
+    jobs = asyncio.run(fetch())
+    assert [job["job_id"] for job in jobs] == ["j0", "j1"]
+    [(channel, message)] = _published(pubsub)
+    assert message["job_id"] == "bad"
+    assert message["result"]["error"].startswith("Invalid payload")
+
+
+class Stop(Exception):
+    pass
+
+
+def test_llm_worker_retries_after_redis_errors(redis_server, monkeypatch):
+    calls = []
+
+    async def flaky_fetch(redis_conn, max_jobs):
+        calls.append(asyncio.get_running_loop().time())
+        if len(calls) <= 2:
+            raise redis.ConnectionError("redis restarting")
+        raise Stop()
+
+    monkeypatch.setattr(llm_worker, "get_redis_connection", lambda: fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True))
+    monkeypatch.setattr(llm_worker, "fetch_jobs", flaky_fetch)
+    monkeypatch.setattr(llm_worker, "REDIS_RETRY_MIN_DELAY", 0.01)
+
+    with pytest.raises(Stop):
+        asyncio.run(llm_worker.main())
+    assert len(calls) == 3
+    # Chờ tăng gấp đôi giữa các lần thử lại: 0.01s rồi 0.02s
+    assert calls[1] - calls[0] >= 0.01
+    assert calls[2] - calls[1] >= 0.02
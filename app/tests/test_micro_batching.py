@@ -0,0 +1,72 @@
+import json
+
+import worker
+from batching import LengthBucketBatcher
+
+
+def _job(job_id, title, reply_to="sentiment_result:test"):
+    return json.dumps({
+        "job_id": job_id,
+        "reply_to": reply_to,
+        "data_input": {"type": "fbPageComment", "content": title},
+        "meta": {"id": job_id}
+    })
+
+
+def _fake_encode_texts(texts, tokenizer):
+    if any("boom" in text for text in texts):
+        raise RuntimeError("tokenizer failed")
+    return [[[0] * (len(text) + 2)] for text in texts]
+
+
+def _published(pubsub):
+    messages = []
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.05)
+        if message is not None:
+            messages.append((message["channel"], json.loads(message["data"])))
+    return messages
+
+
+def test_fetch_batch_takes_at_most_max_batch_size(monkeypatch, redis_conn):
+    monkeypatch.setattr(worker.settings, "WORKER_MAX_BATCH_SIZE", 3)
+    redis_conn.rpush(worker.REDIS_REQUEST_QUEUE, *[_job(str(i), "x") for i in range(5)])
+
+    assert [json.loads(payload)["job_id"] for payload in worker.fetch_batch(redis_conn)] == ["0", "1", "2"]
+    assert [json.loads(payload)["job_id"] for payload in worker.fetch_batch(redis_conn, block=False)] == ["3", "4"]
+    assert worker.fetch_batch(redis_conn, block=False) == []
+
+
+def test_enqueue_payloads_fails_only_the_bad_jobs(monkeypatch, redis_conn):
+    monkeypatch.setattr(worker, "encode_texts", _fake_encode_texts)
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe("sentiment_result:test", "sentiment_result:other")
+    batcher = LengthBucketBatcher([64, 512], 16, 200)
+
+    worker.enqueue_payloads(redis_conn, batcher, [
+        _job("ok-1", "một"),
+        '{"job_id": "broken", "reply_to": "sentiment_result:other", "data_input": {',
+        _job("boom", "boom"),
+        _job("ok-2", "hai"),
+    ])
+
+    assert [item[0]["job_id"] for item, _ in batcher.next_batch()] == ["ok-1", "ok-2"]
+    messages = _published(pubsub)
+    assert [(channel, message["job_id"]) for channel, message in messages] == [
+        ("sentiment_result:other", "broken"),
+        ("sentiment_result:test", "boom"),
+    ]
+    assert messages[0][1]["result"]["error"].startswith("Invalid payload")
+    assert messages[1][1]["result"] == {"id": "boom", "error": "tokenizer failed", "word_cloud": []}
+
+
+def test_unreadable_payload_without_job_id_is_dropped(monkeypatch, redis_conn):
+    monkeypatch.setattr(worker, "encode_texts", _fake_encode_texts)
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(worker.REDIS_RESULT_CHANNEL)
+    batcher = LengthBucketBatcher([64, 512], 16, 200)
+
+    worker.enqueue_payloads(redis_conn, batcher, ["not json", "[1, 2]"])
+
+    assert len(batcher) == 0
+    assert _published(pubsub) == []
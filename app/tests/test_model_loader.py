@@ -0,0 +1,32 @@
+import model_loader
+
+
+def test_is_model_dir_complete(tmp_path, tiny_model_dir):
+    assert model_loader.is_model_dir_complete(tiny_model_dir)
+    assert not model_loader.is_model_dir_complete(str(tmp_path / "missing"))
+
+    (tmp_path / "config.json").write_text("{}")
+    (tmp_path / "tokenizer_config.json").write_text("{}")
+    assert not model_loader.is_model_dir_complete(str(tmp_path))
+    (tmp_path / "model.safetensors").write_text("")
+    assert model_loader.is_model_dir_complete(str(tmp_path))
+    # File đang tải dở
+    (tmp_path / "part.incomplete").write_text("")
+    assert not model_loader.is_model_dir_complete(str(tmp_path))
+
+
+def test_resolve_model_dir_downloads_only_incomplete_dirs(monkeypatch, tmp_path, tiny_model_dir):
+    downloads = []
+    monkeypatch.setattr(model_loader, "snapshot_download", lambda repo_id, local_dir: downloads.append(repo_id) or local_dir)
+
+    assert model_loader.resolve_model_dir("org/model", tiny_model_dir) == tiny_model_dir
+    assert downloads == []
+    assert model_loader.resolve_model_dir("org/model", str(tmp_path)) == str(tmp_path)
+    assert downloads == ["org/model"]
+
+
+def test_load_model_and_warm_up(tiny_model):
+    tokenizer, config, model = tiny_model
+    assert not model.training
+    assert not any(param.requires_grad for param in model.parameters())
+    assert model_loader.warm_up(tokenizer, config, model) > 0
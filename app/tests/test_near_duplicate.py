@@ -0,0 +1,90 @@
+import hashlib
+import random
+
+import near_duplicate
+from near_duplicate import FINGERPRINT_BITS, MAX_BANDS, SimHashIndex, near_duplicate_fingerprint, simhash, tokenize
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def reference_simhash(tokens):
+    shingles = [" ".join(tokens[i:i + 2]) for i in range(max(1, len(tokens) - 1))]
+    weights = [0] * FINGERPRINT_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def flip_bits(fingerprint, count, rng):
+    for bit in rng.sample(range(FINGERPRINT_BITS), count):
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+
+def test_simhash_matches_bit_by_bit_reference():
+    rng = random.Random(0)
+    words = tokenize("khách hàng phản ánh dịch vụ ngân hàng quá chậm trễ giá vé máy bay tăng mạnh")
+    for length in (0, 1, 2, 3, 10, 200):
+        tokens = [rng.choice(words) for _ in range(length)]
+        assert simhash(tokens) == reference_simhash(tokens)
+
+
+def test_near_duplicate_fingerprint_skips_short_texts():
+    assert near_duplicate_fingerprint("quá ngắn") is None
+    text = "Giá vé máy bay tăng mạnh trong dịp lễ khiến hành khách bức xúc"
+    assert near_duplicate_fingerprint(text) == near_duplicate_fingerprint(text.upper() + "!!! 😡")
+    assert near_duplicate_fingerprint(text) == simhash(tokenize(text))
+
+
+def test_find_never_misses_within_max_distance():
+    rng = random.Random(1)
+    for threshold in (0.99, 0.95, 0.9, 0.8):
+        index = SimHashIndex(3600, 10000, threshold)
+        assert len(index.bands) > index.max_distance
+        for i in range(200):
+            fingerprint = rng.getrandbits(FINGERPRINT_BITS)
+            index.add(fingerprint, i)
+            match = index.find(flip_bits(fingerprint, index.max_distance, rng))
+            assert match is not None
+            assert match[1] >= round(1 - index.max_distance / FINGERPRINT_BITS, 4)
+
+
+def test_low_threshold_is_clamped_to_band_count():
+    index = SimHashIndex(3600, 100, 0.5)
+    assert index.max_distance == MAX_BANDS - 1
+    assert len(index.bands) == MAX_BANDS
+    assert SimHashIndex(3600, 100, 1.5).max_distance == 0
+
+
+def test_find_rejects_distant_fingerprints_and_other_scopes():
+    index = SimHashIndex(3600, 100, 0.9)
+    index.add(0, "negative", scope="topic-1")
+
+    assert index.find(0, scope="topic-2") is None
+    assert index.find((1 << FINGERPRINT_BITS) - 1, scope="topic-1") is None
+    assert index.find(0b111, scope="topic-1") == ("negative", round(1 - 3 / FINGERPRINT_BITS, 4))
+
+
+def test_entries_expire_by_age_and_count(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(near_duplicate.time, "monotonic", clock)
+    index = SimHashIndex(60, 2, 0.9)
+    index.add(1, "a")
+    clock.now = 30
+    index.add(2, "b")
+    index.add(3, "c")
+    assert len(index) == 2
+    assert [value for _, _, _, value in index.entries.values()] == ["b", "c"]
+
+    clock.now = 100
+    assert index.find(3) is None
+    assert len(index) == 0
+    assert index.tables == {}
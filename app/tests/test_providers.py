@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+import providers
+from providers import ProviderRouter, create_providers
+
+
+def _router(**kwargs):
+    gemini, fireworks = create_providers(["gemini", "fireworks"], {"gemini": "g", "fireworks": "f"})
+    return ProviderRouter([gemini, fireworks], **kwargs), gemini, fireworks
+
+
+def _sender(delays, failures=(), waits=None):
+    """
+    send(provider, prompt, timer) giả: chờ waits[tên provider] giây (như chờ rate limiter, không đo),
+    rồi delays[tên provider] giây cho "HTTP" (đo bằng timer) và trả lời (hoặc lỗi).
+    """
+    calls = []
+
+    async def send(provider, prompt, timer):
+        calls.append(provider.name)
+        await asyncio.sleep((waits or {}).get(provider.name, 0.0))
+        with timer.measure():
+            await asyncio.sleep(delays[provider.name])
+        if provider.name in failures:
+            raise RuntimeError(f"{provider.name} failed")
+        return f"{provider.name}: {prompt}"
+
+    return send, calls
+
+
+def test_create_providers_skips_missing_keys_and_rejects_unknown():
+    assert [provider.name for provider in create_providers(["fireworks", "gemini"], {"gemini": "g"})] == ["gemini"]
+    with pytest.raises(ValueError):
+        create_providers(["openai"], {})
+
+
+def test_ranked_prefers_unmeasured_then_fastest_healthy():
+    router, gemini, fireworks = _router(max_failures=2, cooldown=30)
+    assert router.ranked() == [gemini, fireworks]
+
+    gemini.record(0.8, True, 2, 30)
+    fireworks.record(0.2, True, 2, 30)
+    assert router.ranked() == [fireworks, gemini]
+
+    fireworks.record(0.2, False, 2, 30)
+    fireworks.record(0.2, False, 2, 30)
+    assert not fireworks.healthy()
+    assert router.ranked() == [gemini]
+
+
+def test_hedging_is_off_by_default():
+    router, gemini, fireworks = _router()
+    assert router.hedge is False
+    send, calls = _sender({"gemini": 0.05, "fireworks": 0.0})
+
+    assert asyncio.run(router.complete("p", send)) == ("gemini: p", "gemini")
+    assert calls == ["gemini"]
+    assert router.hedged == 0
+
+
+def test_failover_without_hedging():
+    router, gemini, fireworks = _router()
+    send, calls = _sender({"gemini": 0.0, "fireworks": 0.0}, failures={"gemini"})
+
+    assert asyncio.run(router.complete("p", send)) == ("fireworks: p", "fireworks")
+    assert calls == ["gemini", "fireworks"]
+    assert gemini.latency.errors == 1
+
+
+def test_hedge_sends_backup_after_delay_and_cancels_loser():
+    router, gemini, fireworks = _router(hedge=True, hedge_min_delay=0.01, hedge_max_delay=0.02)
+    send, calls = _sender({"gemini": 0.5, "fireworks": 0.0})
+
+    assert asyncio.run(router.complete("p", send)) == ("fireworks: p", "fireworks")
+    assert calls == ["gemini", "fireworks"]
+    assert (router.hedged, router.hedge_wins) == (1, 1)
+    # Request thua bị hủy nhưng thời gian đã chờ vẫn được ghi
+    assert len(gemini.latency.samples) == 1 and gemini.latency.errors == 0
+
+
+def test_failover_is_not_counted_as_a_hedge_win():
+    router, gemini, fireworks = _router(hedge=True, hedge_min_delay=0.5, hedge_max_delay=1.0)
+    send, calls = _sender({"gemini": 0.0, "fireworks": 0.0}, failures={"gemini"})
+
+    assert asyncio.run(router.complete("p", send)) == ("fireworks: p", "fireworks")
+    assert calls == ["gemini", "fireworks"]
+    assert (router.hedged, router.hedge_wins) == (0, 0)
+
+
+def test_latency_excludes_rate_limiter_wait():
+    router, gemini, _ = _router()
+    send, _ = _sender({"gemini": 0.01, "fireworks": 0.0}, waits={"gemini": 0.2})
+
+    asyncio.run(router.complete("p", send))
+    [seconds] = gemini.latency.samples
+    assert 0.01 <= seconds < 0.1
+
+
+def test_cancelled_request_before_http_is_not_recorded():
+    router, gemini, fireworks = _router(hedge=True, hedge_min_delay=0.01, hedge_max_delay=0.02)
+    # gemini còn đang chờ rate limiter khi fireworks trả lời: không có mẫu latency nào cho gemini
+    send, _ = _sender({"gemini": 0.0, "fireworks": 0.0}, waits={"gemini": 0.5})
+
+    assert asyncio.run(router.complete("p", send)) == ("fireworks: p", "fireworks")
+    assert (router.hedged, router.hedge_wins) == (1, 1)
+    assert len(gemini.latency.samples) == 0 and gemini.latency.errors == 0
+
+
+def test_all_providers_failing_raises_last_error():
+    router, _, _ = _router()
+    send, _ = _sender({"gemini": 0.0, "fireworks": 0.0}, failures={"gemini", "fireworks"})
+    with pytest.raises(RuntimeError, match="fireworks failed"):
+        asyncio.run(router.complete("p", send))
+
+    with pytest.raises(RuntimeError, match="No LLM provider"):
+        asyncio.run(ProviderRouter([]).complete("p", send))
+
+
+def test_hedge_delay_follows_p95_within_bounds():
+    router, gemini, _ = _router(hedge=True, hedge_min_delay=0.5, hedge_max_delay=10.0)
+    assert router.hedge_delay(gemini) == 10.0
+    for seconds in [0.1] * 19 + [2.0]:
+        gemini.latency.record(seconds)
+    assert router.hedge_delay(gemini) == 2.0
+    gemini.latency.samples.clear()
+    gemini.latency.record(0.1)
+    assert router.hedge_delay(gemini) == 0.5
+
+
+def test_parse_targeting_output_fills_defaults():
+    result = providers.parse_targeting_output('Kết quả: {"contains_topic": 1, "crisis_keywords": "x"}')
+    assert result == {
+        "contains_topic": True,
+        "targeting_topic": False,
+        "reason": "Không xác định hoặc lỗi đầu ra.",
+        "crisis_keywords": []
+    }
@@ -0,0 +1,164 @@
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+from fakeredis.commands_mixins import server_mixin
+import pytest
+import redis
+
+import rate_limiter
+from rate_limiter import AsyncRateLimiter, RateLimiter, RateLimitTimeout, estimate_tokens, parse_retry_after
+
+
+class FakeTime:
+    """Thay module time trong rate_limiter: sleep chỉ tăng đồng hồ."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class BrokenRedis:
+    def register_script(self, script):
+        def run(keys, args):
+            raise redis.ConnectionError("down")
+        return run
+
+    def pipeline(self, transaction=False):
+        raise redis.ConnectionError("down")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Một đồng hồ giả cho cả client lẫn lệnh TIME của fakeredis (đồng hồ của Redis)."""
+    fake = FakeTime()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    monkeypatch.setattr(server_mixin, "time", fake)
+    return fake
+
+
+def test_requests_per_minute_bucket(redis_conn, clock):
+    limiter = RateLimiter(redis_conn, "gemini", requests_per_minute=2, tokens_per_minute=10_000)
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == 0.0
+
+    # Bucket rỗng: nạp lại 1 request sau 30 giây
+    assert limiter.acquire() == pytest.approx(30.0)
+    assert clock.sleeps == [30.0]
+    assert limiter.get_stats() == {"throttled_calls": 1, "throttled_seconds": 30.0, "rate_limited": 0}
+
+
+def test_tokens_per_minute_bucket_and_oversized_requests(redis_conn, clock):
+    limiter = RateLimiter(redis_conn, "gemini", requests_per_minute=1000, tokens_per_minute=100)
+    assert limiter.acquire(80) == 0.0
+    # Cần thêm 60 token với tốc độ 100 token / phút
+    assert limiter.acquire(80) == pytest.approx(36.0)
+
+    # Request lớn hơn cả bucket được giới hạn ở dung lượng bucket thay vì chờ mãi
+    clock.now += 60
+    assert limiter.acquire(10_000) == 0.0
+
+
+def test_limit_is_shared_between_limiters(redis_conn, clock):
+    first = RateLimiter(redis_conn, "gemini", 1, 10_000)
+    second = RateLimiter(redis_conn, "gemini", 1, 10_000)
+    other_provider = RateLimiter(redis_conn, "fireworks", 1, 10_000)
+    assert first.acquire() == 0.0
+    assert other_provider.acquire() == 0.0
+    assert second.acquire() == pytest.approx(60.0)
+
+
+def test_skewed_client_clocks_do_not_refill_twice(redis_conn, clock, monkeypatch):
+    # Replica có đồng hồ nhanh 30 giây: bucket vẫn tính theo đồng hồ của Redis
+    ahead = FakeTime()
+    ahead.now = clock.now + 30
+    limiter = RateLimiter(redis_conn, "gemini", 2, 10_000, max_wait=0)
+    for client_clock in [ahead, clock]:
+        monkeypatch.setattr(rate_limiter, "time", client_clock)
+        assert limiter.acquire() == 0.0
+
+    monkeypatch.setattr(rate_limiter, "time", ahead)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire()
+
+
+def test_wait_longer_than_max_wait_raises(redis_conn, clock):
+    limiter = RateLimiter(redis_conn, "gemini", 1, 10_000, max_wait=5)
+    limiter.acquire()
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_penalize_blocks_and_drains_bucket(redis_conn, clock):
+    limiter = RateLimiter(redis_conn, "gemini", 60, 10_000)
+    limiter.penalize(10)
+
+    # Chờ hết thời gian chặn, sau đó bucket request bắt đầu từ rỗng (1 request / giây)
+    assert limiter.acquire() == pytest.approx(11.0)
+    assert limiter.get_stats()["rate_limited"] == 1
+
+
+def test_redis_errors_fail_open(clock):
+    limiter = RateLimiter(BrokenRedis(), "gemini", 1, 1)
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == 0.0
+    limiter.penalize(5)
+
+
+def test_async_limiter_uses_same_buckets(redis_server, clock, monkeypatch):
+    async def fake_sleep(seconds):
+        clock.sleep(seconds)
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+
+    async def scenario():
+        async_conn = fakeredis.FakeAsyncRedis(server=redis_server)
+        try:
+            limiter = AsyncRateLimiter(async_conn, "gemini", 2, 10_000)
+            waits = [await limiter.acquire() for _ in range(3)]
+            await limiter.penalize(1)
+            return waits, await limiter.get_stats()
+        finally:
+            await async_conn.aclose()
+
+    waits, stats = asyncio.run(scenario())
+    assert waits == [0.0, 0.0, pytest.approx(30.0)]
+    assert stats == {"throttled_calls": 1, "throttled_seconds": 30.0, "rate_limited": 1}
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None, default=2) == 2
+    assert parse_retry_after("soon", default=3) == 3
+    in_ten_seconds = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    assert 8 <= parse_retry_after(in_ten_seconds) <= 10
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 300) == 100
+
+
+def test_each_provider_gets_its_own_bucket_and_quota(monkeypatch):
+    import llm
+
+    monkeypatch.setattr(llm, "_rate_limiters", {})
+    monkeypatch.setattr(llm.settings, "LLM_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(llm.settings, "LLM_GEMINI_REQUESTS_PER_MINUTE", 2000)
+    monkeypatch.setattr(llm.settings, "LLM_FIREWORKS_REQUESTS_PER_MINUTE", 600)
+    gemini, fireworks = llm.get_rate_limiter("gemini"), llm.get_rate_limiter("fireworks")
+    assert (gemini.key, gemini.requests_per_minute) == ("llm_rate_limit:gemini", 2000)
+    assert (fireworks.key, fireworks.requests_per_minute) == ("llm_rate_limit:fireworks", 600)
+    assert fireworks.tokens_per_minute == llm.settings.LLM_FIREWORKS_TOKENS_PER_MINUTE
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import server
+import worker
+
+
+def test_publish_results_uses_reply_to_channel(redis_conn):
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe("sentiment_result:a", "sentiment_result:b", worker.REDIS_RESULT_CHANNEL)
+
+    tasks = [
+        {"job_id": "1", "reply_to": "sentiment_result:a"},
+        {"job_id": "2", "reply_to": "sentiment_result:b"},
+        {"job_id": "3"},
+    ]
+    worker.publish_results(redis_conn, tasks, [{"sentiment": "positive"}, {"sentiment": "negative"}, {"error": "x"}])
+
+    messages = []
+    for _ in range(20):
+        message = pubsub.get_message(timeout=0.05)
+        if message is not None:
+            messages.append((message["channel"], json.loads(message["data"])))
+    assert messages == [
+        ("sentiment_result:a", {"job_id": "1", "result": {"sentiment": "positive"}}),
+        ("sentiment_result:b", {"job_id": "2", "result": {"sentiment": "negative"}}),
+        (worker.REDIS_RESULT_CHANNEL, {"job_id": "3", "result": {"error": "x"}}),
+    ]
+
+
+def test_resolve_result_ignores_unknown_and_finished_jobs(monkeypatch):
+    async def run():
+        loop = asyncio.get_running_loop()
+        pending = {"done": loop.create_future(), "waiting": loop.create_future()}
+        pending["done"].set_result({"sentiment": "neutral"})
+        monkeypatch.setattr(server, "pending_results", pending)
+
+        server._resolve_result("unknown", {"sentiment": "positive"})
+        server._resolve_result("done", {"sentiment": "negative"})
+        server._resolve_result("waiting", {"sentiment": "positive"})
+        return pending["done"].result(), pending["waiting"].result()
+
+    assert asyncio.run(run()) == ({"sentiment": "neutral"}, {"sentiment": "positive"})
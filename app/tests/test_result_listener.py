@@ -0,0 +1,29 @@
+import asyncio
+import json
+
+import fakeredis
+
+import server
+
+
+def test_result_listener_resolves_published_results(monkeypatch, redis_server):
+    async def run():
+        conn = fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+        monkeypatch.setattr(server, "redis_conn", conn)
+        monkeypatch.setattr(server, "pending_results", {})
+        app = {}
+        await server.start_result_listener(app)
+
+        future = server.pending_results["job-1"] = asyncio.get_running_loop().create_future()
+        await conn.publish(server.RESULT_CHANNEL, json.dumps({"job_id": "job-1", "result": {"sentiment": "negative"}}))
+        # Kết quả của process server khác không được resolve ở đây
+        await conn.publish("sentiment_result:other", json.dumps({"job_id": "job-1", "result": {"sentiment": "positive"}}))
+        result = await asyncio.wait_for(future, timeout=2)
+
+        await server.stop_result_listener(app)
+        await asyncio.gather(app["result_listener"], return_exceptions=True)
+        return result, app["result_listener"].cancelled()
+
+    result, cancelled = asyncio.run(run())
+    assert result == {"sentiment": "negative"}
+    assert cancelled
@@ -0,0 +1,103 @@
+import unicodedata
+
+import fakeredis
+import redis
+
+import sentiment
+from sentiment_cache import REDIS_CACHE_STATS, SentimentCache, normalize_text
+
+PREDICTION = ([{"label": "negative", "confidence": 0.9}], "negative")
+
+
+class BrokenRedis:
+    def mget(self, keys):
+        raise redis.ConnectionError("down")
+
+    def pipeline(self, transaction=False):
+        raise redis.ConnectionError("down")
+
+
+def test_key_ignores_whitespace_and_unicode_form():
+    cache = SentimentCache(None, "model:torch")
+    assert normalize_text("  Sản  phẩm\n tốt ") == "Sản phẩm tốt"
+    # "ẩ" dựng sẵn và dạng tổ hợp cho cùng một key
+    assert cache.key("Sản phẩm tốt") == cache.key("Sản  phẩm tốt")
+    assert cache.key("Sản phẩm tốt") != cache.key("sản phẩm tốt")
+    assert cache.key("x") != SentimentCache(None, "model:onnx").key("x")
+
+
+def test_values_are_shared_through_redis(redis_conn):
+    writer = SentimentCache(redis_conn, "ns")
+    key = writer.key("dịch vụ quá chậm")
+    writer.set_many({key: PREDICTION})
+
+    reader = SentimentCache(redis_conn, "ns")
+    assert reader.get_many([key, "missing"]) == {key: PREDICTION}
+    assert reader.get_many([key]) == {key: PREDICTION}
+    assert reader.stats == {"local_hits": 1, "redis_hits": 1, "misses": 1, "deduplicated": 0}
+    assert 0 < redis_conn.ttl(key) <= writer.ttl
+
+
+def test_local_tier_is_bounded_lru(redis_conn):
+    cache = SentimentCache(redis_conn, "ns", max_items=2)
+    cache.set_many({"a": PREDICTION, "b": PREDICTION})
+    cache.get_many(["a"])
+    cache.set_many({"c": PREDICTION})
+    assert list(cache.local) == ["a", "c"]
+
+
+def test_redis_errors_degrade_to_misses():
+    cache = SentimentCache(BrokenRedis(), "ns")
+    cache.set_many({"a": PREDICTION})
+    assert cache.get_many(["a", "b"]) == {"a": PREDICTION}
+    assert cache.stats["misses"] == 1
+
+
+def test_flush_stats_adds_deltas_once(redis_conn):
+    cache = SentimentCache(redis_conn, "ns")
+    cache.get_many(["a", "b"])
+    cache.count_deduplicated(3)
+    cache.flush_stats()
+    cache.flush_stats()
+    assert redis_conn.hgetall(REDIS_CACHE_STATS) == {"misses": "2", "deduplicated": "3"}
+
+
+def test_predict_unique_runs_model_once_per_content(monkeypatch):
+    redis_conn = fakeredis.FakeRedis(decode_responses=True)
+    calls = []
+
+    def fake_inference(texts, tokenizer, config, model):
+        calls.append(list(texts))
+        return [([{"label": "positive", "confidence": 1.0}], "positive") for _ in texts]
+
+    monkeypatch.setattr(sentiment, "sentiment_inference_batch", fake_inference)
+    monkeypatch.setattr(sentiment, "get_index", lambda name: None)
+    cache = SentimentCache(redis_conn, "ns")
+    cache.set_many({cache.key("đã có"): PREDICTION})
+
+    outputs, provenance = sentiment.predict_unique(["a  b", "đã có", "a b", "c"], None, None, None, cache=cache)
+
+    assert calls == [["a  b", "c"]]
+    assert [label for _, label in outputs] == ["positive", "negative", "positive", "positive"]
+    assert provenance == [None, {"source": "exact_cache"}, None, None]
+    assert cache.stats["deduplicated"] == 1
+
+
+def test_cache_namespace_changes_with_long_doc_settings():
+    import worker
+    from settings import Settings
+
+    base = Settings(MODEL="m", INFERENCE_BACKEND="torch", LONG_DOC_MODE=False)
+    assert worker.cache_namespace(base) == worker.cache_namespace(base.model_copy(update={"LONG_DOC_WINDOW_TOKENS": 128}))
+
+    long_doc = base.model_copy(update={"LONG_DOC_MODE": True})
+    namespaces = {
+        worker.cache_namespace(base),
+        worker.cache_namespace(long_doc),
+        worker.cache_namespace(long_doc.model_copy(update={"LONG_DOC_WINDOW_TOKENS": 128})),
+        worker.cache_namespace(long_doc.model_copy(update={"LONG_DOC_WINDOW_OVERLAP": 32})),
+        worker.cache_namespace(long_doc.model_copy(update={"LONG_DOC_MAX_WINDOWS": 4})),
+        worker.cache_namespace(long_doc.model_copy(update={"LONG_DOC_AGGREGATION": "mean"})),
+        worker.cache_namespace(base.model_copy(update={"INFERENCE_BACKEND": "onnx"})),
+    }
+    assert len(namespaces) == 7
@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+# Module dùng chung giữa các service được copy vào từng thư mục service (mỗi image chỉ COPY thư mục của nó),
+# các bản copy phải giống hệt nhau
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SHARED_MODULES = [
+    ("app/backends.py", "litserve/backends.py"),
+    ("app/windows.py", "litserve/windows.py"),
+    ("app/wordcloud.py", "litserve/word_cloud.py"),
+    ("app/rate_limiter.py", "negative_buzz_analyzer/app/rate_limiter.py"),
+    ("app/providers.py", "negative_buzz_analyzer/app/providers.py"),
+    ("app/topic_matcher.py", "negative_buzz_analyzer/app/topic_matcher.py"),
+]
+
+
+@pytest.mark.parametrize("original,copy", SHARED_MODULES)
+def test_shared_module_copies_are_identical(original, copy):
+    with open(os.path.join(REPO_ROOT, original), "rb") as f:
+        expected = f.read()
+    with open(os.path.join(REPO_ROOT, copy), "rb") as f:
+        assert f.read() == expected, f"{copy} differs from {original}; copy the change to both files"
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+import torch
+
+import supervisor
+
+
+@pytest.mark.parametrize("cores,processes,threads,expected", [
+    (8, 0, 0, [2, 2, 2, 2]),
+    (2, 0, 0, [1, 1]),
+    (8, 3, 0, [3, 3, 2]),
+    (8, 0, 4, [4, 4]),
+    (8, 2, 2, [2, 2]),
+    (1, 4, 0, [1, 1, 1, 1]),
+    # Core lẻ được chia cho các process đầu, không bỏ trống
+    (5, 0, 0, [3, 2]),
+    (7, 0, 0, [3, 2, 2]),
+    (11, 0, 4, [6, 5]),
+    (3, 0, 0, [1, 1, 1]),
+])
+def test_plan_layout(cores, processes, threads, expected):
+    assert supervisor.plan_layout(cores, processes, threads) == expected
+
+
+def test_assign_cpu_sets_splits_disjoint_sets():
+    assert supervisor.assign_cpu_sets([0, 1, 2, 3, 4], [2, 2]) == [{0, 1}, {2, 3}]
+    assert supervisor.assign_cpu_sets([0, 1, 2, 3, 4], [3, 2]) == [{0, 1, 2}, {3, 4}]
+    assert supervisor.assign_cpu_sets([0, 1, 2], [2, 2]) == [None, None]
+
+
+def test_usable_cores_respects_cgroup_quota(monkeypatch):
+    monkeypatch.setattr(supervisor, "available_cpus", lambda: list(range(16)))
+    monkeypatch.setattr(supervisor, "cgroup_cpu_limit", lambda: 2.5)
+    assert supervisor.usable_cores() == 2
+    monkeypatch.setattr(supervisor, "cgroup_cpu_limit", lambda: 0.5)
+    assert supervisor.usable_cores() == 1
+    monkeypatch.setattr(supervisor, "cgroup_cpu_limit", lambda: None)
+    assert supervisor.usable_cores() == 16
+
+
+def test_configure_worker_threads_sets_torch_threads(monkeypatch):
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+    original = torch.get_num_threads()
+    try:
+        supervisor.configure_worker_threads(1)
+        assert torch.get_num_threads() == 1
+        # Biến môi trường không có tác dụng sau khi torch đã khởi tạo nên không bị ghi
+        assert "OMP_NUM_THREADS" not in os.environ
+    finally:
+        torch.set_num_threads(original)
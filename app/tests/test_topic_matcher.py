@@ -0,0 +1,69 @@
+import random
+
+import llm
+from topic_matcher import AhoCorasick, TopicPrefilter, fold_text, not_mentioned_verdict, topic_patterns
+
+
+def test_fold_text_strips_diacritics_case_and_punctuation():
+    assert fold_text("Đường   sắt Việt Nam!!") == " duong sat viet nam "
+    assert fold_text("#VietnamAirlines, 😡 bay trễ") == " vietnamairlines bay tre "
+    assert fold_text(None) == "  "
+
+
+def test_topic_patterns_cover_spacing_variants_and_aliases():
+    assert topic_patterns("Việt Nam Airlines", ["VNA"]) == [
+        " viet nam airlines", " viet namairlines", " vietnam airlines", " vietnamairlines", " vna"
+    ]
+    long_name = "một hai ba bốn năm sáu bảy"
+    assert topic_patterns(long_name) == [" mot hai ba bon nam sau bay", " mothaibabonnamsaubay"]
+    assert topic_patterns("!!!") == []
+
+
+def test_aho_corasick_matches_naive_search():
+    rng = random.Random(0)
+    patterns = ["he", "she", "his", "hers", "a", "aab"]
+    automaton = AhoCorasick(patterns)
+    for _ in range(200):
+        text = "".join(rng.choice("abehirs") for _ in range(rng.randint(0, 30)))
+        expected = sorted(
+            (start + len(pattern) - 1, index)
+            for index, pattern in enumerate(patterns)
+            for start in range(len(text))
+            if text.startswith(pattern, start)
+        )
+        assert sorted(automaton.iter_matches(text)) == expected
+        assert automaton.contains_any(text) == bool(expected)
+
+
+def test_prefilter_checks_word_start_boundary():
+    prefilter = TopicPrefilter()
+    data = {"topic_name": "Vietcombank", "topic_aliases": ["VCB"]}
+    assert prefilter.mentions_topic(data, "Khách hàng Vietcombank2024 phản ánh")
+    assert prefilter.mentions_topic(data, "App #vcb lỗi cả ngày")
+    assert not prefilter.mentions_topic(data, "Ngân hàng myvietcombank khác")
+    assert not prefilter.mentions_topic(data, "Bài không liên quan")
+
+
+def test_prefilter_defers_to_llm_without_topic():
+    prefilter = TopicPrefilter()
+    assert prefilter.mentions_topic({"topic_name": ""}, "bất kỳ nội dung nào")
+    assert prefilter.get_stats()["skipped"] == 0
+
+
+def test_prefilter_keeps_bounded_lru_and_stats():
+    prefilter = TopicPrefilter(max_topics=2)
+    for topic in ["A ngân hàng", "B hàng không", "C bảo hiểm"]:
+        prefilter.mentions_topic({"topic_name": topic}, "không nhắc tới")
+    assert list(prefilter.automata) == [("B hàng không", ()), ("C bảo hiểm", ())]
+
+    stats = prefilter.get_stats()
+    assert stats == {"checked": 3, "skipped": 3, "llm_calls_avoided_rate": 100.0, "topics": 2}
+    assert prefilter.pop_unflushed() == {"checked": 3, "skipped": 3}
+    assert prefilter.pop_unflushed() == {}
+
+
+def test_prefilter_verdict_skips_llm_only_when_topic_absent(monkeypatch):
+    monkeypatch.setattr(llm, "prefilter", TopicPrefilter())
+    data = {"topic_name": "Vinamilk", "title": "Sữa bị lỗi", "content": "Nhiều phụ huynh lo lắng"}
+    assert llm.prefilter_verdict(data) == not_mentioned_verdict()
+    assert llm.prefilter_verdict({**data, "description": "Sản phẩm của VINAMILK"}) is None
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import random
+from collections import Counter
+
+import fakeredis
+from aiohttp.test_utils import make_mocked_request
+
+import server
+from topic_terms import SpaceSaving, TopicTermAggregator, TopicTerms, topic_word_counts
+
+HOUR = 3600
+
+
+def _zipf_stream(rng, words, length):
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return rng.choices(words, weights=weights, k=length)
+
+
+def test_space_saving_is_exact_under_capacity():
+    summary = SpaceSaving(3)
+    for word in ["a", "b", "a", "c", "a"]:
+        summary.add(word)
+    assert summary.counts == {"a": 3, "b": 1, "c": 1}
+    assert summary.errors == {"a": 0, "b": 0, "c": 0}
+    assert summary.min_count() == 0
+
+
+def test_space_saving_bounds_each_tracked_word():
+    rng = random.Random(0)
+    words = [f"w{i}" for i in range(200)]
+    stream = _zipf_stream(rng, words, 5000)
+    summary = SpaceSaving(20)
+    for word in stream:
+        summary.add(word)
+
+    truth = Counter(stream)
+    assert len(summary.counts) == 20
+    assert summary.min_count() == min(summary.counts.values())
+    for word, count in summary.counts.items():
+        assert count - summary.errors[word] <= truth[word] <= count
+    # Từ không được theo dõi xuất hiện không quá min_count() lần
+    assert all(truth[word] <= summary.min_count() for word in truth if word not in summary.counts)
+
+
+def test_merged_buckets_bound_words_evicted_from_some_buckets():
+    terms = TopicTerms(capacity=2)
+    # Bucket 1: "a" nhiều nhất; bucket 2: "a" bị đẩy ra bởi các từ khác
+    terms.add({"a": 10, "b": 1}, 0)
+    terms.add({"a": 3}, 300)
+    terms.add({"c": 5, "d": 5, "e": 5}, 300)
+
+    by_word = {term["word"]: term for term in terms.top(HOUR, 10, 600)}
+    # "a" xuất hiện thật 13 lần: phải nằm trong [frequency - max_error, frequency]
+    a = by_word["a"]
+    assert a["frequency"] - a["max_error"] <= 13 <= a["frequency"]
+
+
+def test_merged_bounds_hold_on_random_streams():
+    rng = random.Random(1)
+    words = [f"w{i}" for i in range(100)]
+    terms = TopicTerms(capacity=10)
+    truth = Counter()
+    for bucket in range(12):
+        for _ in range(20):
+            counts = Counter(_zipf_stream(rng, words, 10))
+            terms.add(dict(counts), bucket * 300 + 1)
+            truth.update(counts)
+
+    top = terms.top(HOUR, 10, 12 * 300)
+    assert len(top) == 10
+    for term in top:
+        assert term["frequency"] - term["max_error"] <= truth[term["word"]] <= term["frequency"]
+    assert top[0]["word"] == "w0"
+
+
+def test_window_selects_tier_and_skips_old_buckets():
+    terms = TopicTerms(capacity=10)
+    terms.add({"cũ": 5}, 0)
+    terms.add({"mới": 2}, 3000)
+
+    assert [term["word"] for term in terms.top(600, 10, 3300)] == ["mới"]
+    assert [term["word"] for term in terms.top(HOUR, 10, 3300)] == ["cũ", "mới"]
+    # Ngày gần nhất dùng bucket 1 giờ
+    assert terms.top(24 * HOUR, 10, 3300) == [
+        {"word": "cũ", "frequency": 5, "max_error": 0},
+        {"word": "mới", "frequency": 2, "max_error": 0},
+    ]
+
+
+def test_late_data_goes_to_its_bucket_if_still_kept():
+    terms = TopicTerms(capacity=10)
+    terms.add({"a": 1}, 0)
+    terms.add({"b": 1}, 300)
+    terms.add({"a": 1}, 10)
+    assert terms.top(600, 1, 600) == [{"word": "a", "frequency": 2, "max_error": 0}]
+
+    # Bucket 5 phút của dữ liệu trễ không còn (bị bỏ qua); bucket 1 giờ vẫn nhận
+    assert terms.add({"c": 1}, 1200) == []
+    assert terms.add({"c": 5}, 900) == [300]
+    assert terms.top(600, 1, 1200) == [{"word": "c", "frequency": 1, "max_error": 0}]
+    assert terms.top(2 * HOUR, 1, 1200) == [{"word": "c", "frequency": 6, "max_error": 0}]
+
+
+def test_aggregator_keeps_most_recent_topics():
+    aggregator = TopicTermAggregator(capacity=5, max_topics=2)
+    aggregator.add("t1", {"a": 1}, 0)
+    aggregator.add("t2", {"b": 1}, 0)
+    aggregator.add("t1", {"a": 1}, 1)
+    aggregator.add("t3", {"c": 1}, 2)
+    aggregator.add("", {"d": 1}, 2)
+    aggregator.add("t4", {}, 2)
+
+    assert list(aggregator.topics) == ["t1", "t3"]
+    assert aggregator.top("t1", now=10) == [{"word": "a", "frequency": 2, "max_error": 0}]
+    assert aggregator.top("t2", now=10) == []
+    assert aggregator.get_stats() == {
+        "topics": 2, "max_topics": 2, "capacity": 5, "updates": 4, "late_dropped": {300: 0, 3600: 0}
+    }
+
+
+def test_events_older_than_the_ring_are_counted_as_dropped():
+    aggregator = TopicTermAggregator(capacity=5)
+    for bucket in range(13):
+        aggregator.add("t1", {"mới": 1}, 2 * HOUR + bucket * 300)
+
+    # Bucket 5 phút đầu tiên đã bị đẩy khỏi ring (12 bucket) nhưng bucket 1 giờ vẫn còn
+    aggregator.add("t1", {"trễ": 4}, 2 * HOUR)
+    # Cũ hơn mọi bucket ở cả hai tier
+    aggregator.add("t1", {"trễ": 4}, 0)
+
+    assert aggregator.get_stats()["late_dropped"] == {300: 2, 3600: 1}
+    now = 2 * HOUR + 13 * 300
+    assert [term["word"] for term in aggregator.top("t1", window=HOUR, now=now)] == ["mới"]
+    assert aggregator.top("t1", window=24 * HOUR, now=now) == [
+        {"word": "mới", "frequency": 13, "max_error": 0},
+        {"word": "trễ", "frequency": 4, "max_error": 0},
+    ]
+
+
+def test_topic_word_counts_sums_word_clouds_by_topic():
+    data_inputs = [{"topic_id": "t1"}, {"topic_id": "t1"}, {"topic_id": "t2"}, {}, "not a dict"]
+    word_clouds = [
+        [{"word": "khách_hàng", "frequency": 2}],
+        [{"word": "khách_hàng", "frequency": 1}, {"word": "hoàn_tiền", "frequency": 1}],
+        [],
+        [{"word": "x", "frequency": 1}],
+        [{"word": "y", "frequency": 1}],
+    ]
+    assert topic_word_counts(data_inputs, word_clouds) == {"t1": {"khách_hàng": 3, "hoàn_tiền": 1}}
+
+
+def test_server_folds_published_terms_and_serves_them(monkeypatch, redis_server):
+    aggregator = TopicTermAggregator(capacity=5)
+    monkeypatch.setattr(server, "topic_terms", aggregator)
+    monkeypatch.setattr(server.settings, "TOPIC_TERMS_ENABLED", True)
+
+    async def run():
+        conn = fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+        monkeypatch.setattr(server, "redis_conn", conn)
+        app = {}
+        await server.start_result_listener(app)
+        await conn.publish(server.REDIS_TOPIC_TERMS_CHANNEL, json.dumps({"ts": None, "topics": {"t1": {"giá_vé": 3}}}))
+        for _ in range(100):
+            if aggregator.updates:
+                break
+            await asyncio.sleep(0.01)
+        await server.stop_result_listener(app)
+        await asyncio.gather(app["result_listener"], return_exceptions=True)
+
+        ok = await server.topic_top_terms(make_mocked_request("GET", "/topics/t1/terms?window=600&k=5", match_info={"topic_id": "t1"}))
+        bad = await server.topic_top_terms(make_mocked_request("GET", "/topics/t1/terms?window=abc", match_info={"topic_id": "t1"}))
+        return json.loads(ok.body), bad.status
+
+    body, bad_status = asyncio.run(run())
+    assert body == {"topic_id": "t1", "window": 600, "terms": [{"word": "giá_vé", "frequency": 3, "max_error": 0}]}
+    assert bad_status == 400
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from windows import aggregate_windows, check_aggregation, encode_documents, special_tokens, split_windows
+
+
+def test_short_input_is_a_single_window():
+    assert split_windows([5, 6, 7], [1], [2], 4, 1, 8) == [[1, 5, 6, 7, 2]]
+
+
+def test_windows_overlap_and_cover_the_tail():
+    windows = split_windows(list(range(10)), [-1], [-2], 4, 1, 8)
+    assert windows == [
+        [-1, 0, 1, 2, 3, -2],
+        [-1, 3, 4, 5, 6, -2],
+        [-1, 6, 7, 8, 9, -2],
+    ]
+
+
+def test_max_windows_are_spread_across_the_document():
+    windows = split_windows(list(range(100)), [], [], 10, 0, 3)
+    assert [window[0] for window in windows] == [0, 40, 90]
+    assert split_windows(list(range(100)), [], [], 10, 0, 1) == [list(range(10))]
+
+
+def test_encode_documents_truncates_unless_long_doc(tiny_model):
+    tokenizer, _, _ = tiny_model
+    prefix, suffix = special_tokens(tokenizer)
+    text = " ".join(["sản phẩm rất tốt"] * 10)
+
+    single = encode_documents([text, "tệ quá"], tokenizer, max_length=12)
+    assert [len(windows) for windows in single] == [1, 1]
+    assert len(single[0][0]) == 12
+
+    windows = encode_documents([text], tokenizer, long_doc=True, window_tokens=16, overlap=4, max_windows=8)[0]
+    assert len(windows) == 3
+    assert all(window[:1] == prefix and window[-1:] == suffix and len(window) <= 18 for window in windows)
+
+
+def test_aggregate_max_negative_keeps_most_negative_window():
+    scores = np.array([[0.1, 0.9], [0.8, 0.2], [0.3, 0.7], [0.6, 0.4]])
+    doc_index = np.array([0, 0, 1, 1])
+    result = aggregate_windows(scores, doc_index, [4, 4, 4, 4], 2, "max_negative", negative_index=0)
+    np.testing.assert_allclose(result, [[0.8, 0.2], [0.6, 0.4]])
+
+
+def test_aggregate_mean_weights_by_window_length():
+    scores = np.array([[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]])
+    result = aggregate_windows(scores, np.array([0, 0, 1]), [3, 1, 2], 2, "mean")
+    np.testing.assert_allclose(result, [[0.75, 0.25], [0.5, 0.5]])
+
+
+def test_aggregate_is_identity_with_one_window_per_document():
+    scores = np.array([[0.2, 0.8]])
+    assert aggregate_windows(scores, np.array([0]), [5], 1, "mean") is scores
+
+
+def test_unknown_aggregation_is_rejected():
+    assert check_aggregation("mean") == "mean"
+    with pytest.raises(ValueError, match="max_negatve"):
+        check_aggregation("max_negatve")
+    with pytest.raises(ValueError):
+        aggregate_windows(np.array([[0.2, 0.8]]), np.array([0]), [5], 1, "median")
+
+
+def test_worker_refuses_to_start_with_unknown_aggregation(monkeypatch):
+    import worker
+
+    def load_model(*args):
+        raise AssertionError("model should not be loaded")
+
+    monkeypatch.setattr(worker.settings, "LONG_DOC_AGGREGATION", "average")
+    monkeypatch.setattr(worker, "load_model", load_model)
+    with pytest.raises(ValueError, match="average"):
+        worker.init_model()
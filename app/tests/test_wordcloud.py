@@ -0,0 +1,53 @@
+import random
+
+from pyvi import ViTokenizer
+
+from wordcloud import WordCloudEngine, compound_words, segment_batch, sent2features
+
+SENTENCES = [
+    "Khách hàng phản ánh dịch vụ chăm sóc khách hàng của ngân hàng quá chậm trễ.",
+    "Sản phẩm sữa bị phát hiện có chất lượng kém, nhiều phụ huynh lo lắng cho sức khỏe của con.",
+    "Nhân viên tư vấn không hỗ trợ hoàn tiền dù đơn hàng đã bị hủy từ tuần trước!!!",
+    "Ứng dụng Ngân Hàng liên tục báo lỗi khi chuyển 1.500.000 đồng vào cuối tháng 12/2024.",
+    "Liên hệ hotro@vietcombank.com.vn hoặc https://vietcombank.com.vn/ho-tro ==> phản hồi sau 24h",
+    "TP.HCM: giá vé máy bay Tết tăng mạnh... Hành khách BỨC XÚC 😡 #vemaybay @VietnamAirlines",
+    "Mr. Nguyễn Văn A, ThS. kinh tế, cho rằng thị trường bất động sản sẽ hồi phục.",
+]
+
+
+def _corpus():
+    rng = random.Random(0)
+    texts = list(SENTENCES) + ["", "   ", "!!!", "😡😡", "a"]
+    for _ in range(30):
+        texts.append(" ".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 4))))
+    return texts
+
+
+def test_features_match_pyvi():
+    for text in SENTENCES:
+        _, syllables = ViTokenizer.ViTokenizer.sylabelize(text)
+        assert sent2features(syllables) == ViTokenizer.ViTokenizer.sent2features(syllables, False)
+
+
+def test_segment_batch_matches_public_tokenize():
+    texts = _corpus()
+    assert segment_batch(texts) == [compound_words(ViTokenizer.tokenize(text)) for text in texts]
+
+
+def test_generate_batch_counts_compound_words_without_stopwords():
+    engine = WordCloudEngine(top_k=2)
+    [cloud] = engine.generate_batch(["Khách hàng phản ánh khách hàng tuy nhiên tuy nhiên tuy nhiên ngân hàng chậm"])
+    assert cloud == [("khách_hàng", 2), ("phản_ánh", 1)]
+    assert engine.generate_batch_dicts([""]) == [[]]
+
+
+def test_segmentation_cache_reuses_repeated_texts():
+    engine = WordCloudEngine(cache_size=2)
+    first = engine.segment([SENTENCES[0], SENTENCES[0], SENTENCES[1]])
+    assert first[0] == first[1]
+    assert engine.segment([SENTENCES[1]]) == [first[2]]
+    assert engine.get_stats() == {"hits": 2, "misses": 2, "cache_size": 2, "hit_rate": 50.0}
+
+    engine.segment([SENTENCES[2]])
+    assert len(engine.cache) == 2
+    assert engine._key(SENTENCES[0]) not in engine.cache
@@ -0,0 +1,176 @@
+import heapq
+import time
+from collections import OrderedDict, deque
+
+# Top từ khóa theo chủ đề trong giờ / ngày gần nhất, cập nhật dần từ word cloud của từng bài
+# (worker publish lên Redis, server gộp lại) nên truy vấn không phải tách từ lại bài đã lưu.
+
+# (độ dài bucket, số bucket): 5 phút × 12 cho giờ gần nhất, 1 giờ × 24 cho ngày gần nhất
+TIERS = ((300, 12), (3600, 24))
+
+
+class SpaceSaving:
+    """
+    Top-K xấp xỉ (Space-Saving) với tối đa capacity bộ đếm.
+    Từ mới khi đã đầy thay chỗ từ có bộ đếm nhỏ nhất và nhận luôn giá trị đó làm sai số,
+    nên tần suất ước lượng không bao giờ thấp hơn thực tế và sai số không quá tổng / capacity.
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "heap", "evicted")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # (count, word), mỗi từ đang theo dõi có đúng một phần tử; count có thể cũ hơn counts[word]
+        self.heap = []
+        self.evicted = False
+
+    def _pop_min(self):
+        while True:
+            count, word = heapq.heappop(self.heap)
+            current = self.counts[word]
+            if current == count:
+                return word
+            heapq.heappush(self.heap, (current, word))
+
+    def min_count(self):
+        """
+        Bộ đếm nhỏ nhất khi đã từng thay chỗ: từ không được theo dõi xuất hiện tối đa chừng đó lần.
+        Chưa thay chỗ lần nào thì mọi từ đều được đếm chính xác nên trả về 0.
+        """
+        if not self.evicted:
+            return 0
+        while True:
+            count, word = self.heap[0]
+            current = self.counts[word]
+            if current == count:
+                return count
+            heapq.heapreplace(self.heap, (current, word))
+
+    def add(self, word, count=1):
+        if word in self.counts:
+            self.counts[word] += count
+            return
+        error = 0
+        if len(self.counts) >= self.capacity:
+            victim = self._pop_min()
+            self.evicted = True
+            error = self.counts.pop(victim)
+            del self.errors[victim]
+        self.counts[word] = error + count
+        self.errors[word] = error
+        heapq.heappush(self.heap, (error + count, word))
+
+
+class TopicTerms:
+    """Các bucket thời gian (theo TIERS) của một chủ đề, mỗi bucket là một SpaceSaving."""
+
+    __slots__ = ("capacity", "tiers")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tiers = [deque(maxlen=count) for _, count in TIERS]
+
+    def add(self, counts, timestamp):
+        """
+        Cộng counts vào bucket chứa timestamp ở mỗi tier.
+        Trả về độ dài bucket của các tier đã bỏ qua dữ liệu vì quá trễ (bucket của nó không còn giữ).
+        """
+        dropped = []
+        for (seconds, _), buckets in zip(TIERS, self.tiers):
+            start = int(timestamp // seconds * seconds)
+            if not buckets or buckets[-1][0] < start:
+                buckets.append((start, SpaceSaving(self.capacity)))
+                bucket = buckets[-1][1]
+            else:
+                # Dữ liệu đến trễ: cộng vào bucket chứa timestamp nếu còn giữ
+                bucket = next((summary for bucket_start, summary in buckets if bucket_start == start), None)
+                if bucket is None:
+                    dropped.append(seconds)
+                    continue
+            for word, count in counts.items():
+                bucket.add(word, count)
+        return dropped
+
+    def top(self, window, k, now):
+        """
+        Gộp các bucket nằm trong window giây gần nhất ở tier nhỏ nhất đủ dài.
+        Bucket không theo dõi một từ vẫn có thể chứa tới min_count() lần từ đó, nên frequency
+        cộng thêm min_count() của các bucket đó và là cận trên; frequency - max_error là cận dưới.
+        """
+        tier = next((i for i, (seconds, count) in enumerate(TIERS) if seconds * count >= window), len(TIERS) - 1)
+        seconds = TIERS[tier][0]
+        since = now - window
+        # floor: tổng min_count() của mọi bucket; từ có mặt trong bucket thì thay min_count() bằng giá trị thật
+        floor = 0
+        counts, errors = {}, {}
+        for start, summary in self.tiers[tier]:
+            if start + seconds <= since:
+                continue
+            minimum = summary.min_count()
+            floor += minimum
+            for word, count in summary.counts.items():
+                counts[word] = counts.get(word, 0) + count - minimum
+                errors[word] = errors.get(word, 0) + summary.errors[word] - minimum
+        return [
+            {"word": word, "frequency": floor + count, "max_error": floor + errors[word]}
+            for word, count in heapq.nlargest(k, counts.items(), key=lambda item: item[1])
+        ]
+
+
+class TopicTermAggregator:
+    """
+    Top từ khóa theo topic_id với bộ nhớ cố định: mỗi chủ đề tối đa
+    capacity × (12 + 24) bộ đếm, giữ tối đa max_topics chủ đề gần nhất (LRU).
+    """
+
+    def __init__(self, capacity=50, max_topics=1000):
+        self.capacity = capacity
+        self.max_topics = max_topics
+        self.topics = OrderedDict()
+        self.updates = 0
+        # Số lần dữ liệu đến quá trễ bị bỏ qua, theo độ dài bucket của tier
+        self.late_dropped = {seconds: 0 for seconds, _ in TIERS}
+
+    def add(self, topic_id, counts, timestamp=None):
+        if not topic_id or not counts:
+            return
+        terms = self.topics.get(topic_id)
+        if terms is None:
+            terms = self.topics[topic_id] = TopicTerms(self.capacity)
+            while len(self.topics) > self.max_topics:
+                self.topics.popitem(last=False)
+        else:
+            self.topics.move_to_end(topic_id)
+        for seconds in terms.add(counts, time.time() if timestamp is None else timestamp):
+            self.late_dropped[seconds] += 1
+        self.updates += 1
+
+    def top(self, topic_id, window=3600, k=20, now=None):
+        terms = self.topics.get(topic_id)
+        if terms is None:
+            return []
+        return terms.top(window, k, time.time() if now is None else now)
+
+    def get_stats(self):
+        return {
+            "topics": len(self.topics),
+            "max_topics": self.max_topics,
+            "capacity": self.capacity,
+            "updates": self.updates,
+            "late_dropped": dict(self.late_dropped)
+        }
+
+
+def topic_word_counts(data_inputs, word_clouds):
+    """Gộp word cloud của một batch theo topic_id: {topic_id: {word: frequency}}."""
+    topics = {}
+    for data_input, word_cloud in zip(data_inputs, word_clouds):
+        topic_id = data_input.get("topic_id") if isinstance(data_input, dict) else None
+        if not topic_id or not word_cloud:
+            continue
+        counts = topics.setdefault(topic_id, {})
+        for item in word_cloud:
+            counts[item["word"]] = counts.get(item["word"], 0) + item["frequency"]
+    return topics
@@ -1,139 +1,79 @@
-import torch
 import numpy as np
 from settings import Settings
-import json
-import requests
+from backends import as_backend, softmax
+from windows import encode_documents, aggregate_windows
 
 settings = Settings()
-def sentiment_inference(text: str, tokenizer, config, model):
-    # Label mapping
-    label_mapping = {
-        'POS': 'positive',
-        'NEG': 'negative',
-        'NEU': 'neutral'
-    }
-
-    # Tokenize input
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
-    input_ids = inputs["input_ids"]
-
-    # Inference
-    with torch.no_grad():
-        outputs = model(input_ids)
-        scores = outputs.logits.softmax(dim=-1).cpu().numpy()[0]
-
-    # Process results
-    ranking = np.argsort(scores)[::-1]
-    result = {}
-    for i in range(len(scores)):
-        original_label = config.id2label[ranking[i]]
-        mapped_label = label_mapping.get(original_label, original_label.lower())
-        score = scores[ranking[i]]
-        result[mapped_label] = np.round(float(score), 4)
-
-    # Top label
-    top_original_label = config.id2label[ranking[0]]
-    top_label = label_mapping.get(top_original_label, top_original_label.lower())
-
-    # Convert to list format
-    ref_list = [{"label": label, "confidence": confidence} for label, confidence in result.items()]
+# Label mapping
+label_mapping = {
+    'POS': 'positive',
+    'NEG': 'negative',
+    'NEU': 'neutral'
+}
+
+def encode_texts(texts, tokenizer):
+    """
+    Tokenize (chưa pad) mỗi văn bản thành list window input_ids.
+    Chỉ có một window (cắt ở 512 token) trừ khi bật LONG_DOC_MODE.
+    """
+    return encode_documents(
+        texts,
+        tokenizer,
+        long_doc=settings.LONG_DOC_MODE,
+        window_tokens=settings.LONG_DOC_WINDOW_TOKENS,
+        overlap=settings.LONG_DOC_WINDOW_OVERLAP,
+        max_windows=settings.LONG_DOC_MAX_WINDOWS
+    )
+
+def sentiment_inference_encoded(encodings, tokenizer, config, model):
+    """
+    Chạy model trên các window đã tokenize của cả batch bằng một lần forward,
+    rồi gộp các window về từng văn bản theo LONG_DOC_AGGREGATION.
+    Batch được pad theo window dài nhất trong batch.
+    Trả về list (ref_list, top_label) theo đúng thứ tự đầu vào.
+    """
+    if not encodings:
+        return []
 
-    return ref_list, top_label
+    rows = [window for windows in encodings for window in windows]
+    doc_index = np.repeat(np.arange(len(encodings)), [len(windows) for windows in encodings])
+    inputs = tokenizer.pad({"input_ids": rows}, return_tensors="np")
 
+    # Inference (model có thể là model HF hoặc một InferenceBackend)
+    logits = as_backend(model).logits(inputs["input_ids"], inputs["attention_mask"])
 
-def check_targeting_topic(data: dict) -> dict:
-    topic = data.get("topic_name", "")
-    combined_text = " ".join([
-        f"Title: {data.get('title', '')}",
-        f"Description: {data.get('description', '')}",
-        f"Content: {data.get('content', '')}"
+    # Label của từng lớp theo thứ tự output của model
+    labels = np.array([
+        label_mapping.get(config.id2label[i], config.id2label[i].lower())
+        for i in range(logits.shape[1])
     ])
+    negative_index = int(np.flatnonzero(labels == "negative")[0]) if "negative" in labels else None
+    scores = aggregate_windows(
+        softmax(logits), doc_index, inputs["attention_mask"].sum(axis=1), len(encodings),
+        settings.LONG_DOC_AGGREGATION, negative_index
+    )
 
-    prompt = f"""
-    Bạn là một chuyên gia phân tích nội dung mạng xã hội trong lĩnh vực truyền thông khủng hoảng.
-
-    Dưới đây là một nội dung có sắc thái tiêu cực, bao gồm tiêu đề, mô tả và nội dung:
-
-    {combined_text}
+    # Process results (vectorized cho cả batch)
+    ranking = np.argsort(-scores, axis=1)
+    ranked_labels = labels[ranking]
+    ranked_scores = np.take_along_axis(scores, ranking, axis=1).astype(np.float64).round(4)
 
-    Chủ đề cần kiểm tra là: "{topic}"
+    results = []
+    for row_labels, row_scores in zip(ranked_labels.tolist(), ranked_scores.tolist()):
+        ref_list = [{"label": label, "confidence": confidence} for label, confidence in zip(row_labels, row_scores)]
+        results.append((ref_list, row_labels[0]))
+    return results
 
-    Nhiệm vụ:
-    1. Kiểm tra xem nội dung có **nhắc đến** chủ đề không?
-    2. Nếu có, nội dung có đang **nhắm vào**, **công kích**, hoặc **quy trách nhiệm tiêu cực** cho chủ đề không?
-    3. Nếu targeting_topic = true, hãy **trích xuất danh sách các từ/cụm từ tiêu cực có thể gây khủng hoảng**. Mỗi phần tử trong danh sách phải là:
-      - Từ đơn (ví dụ: "lừa đảo")
-      - Từ đôi (ví dụ: "mất tiền")
-      - Tối đa 3 từ (ví dụ: "không hoàn tiền")
-      - Tuyệt đối không phải là câu dài hay mô tả.
 
-    Trả về JSON hợp lệ với cấu trúc sau:
-    {{
-      "contains_topic": true/false,
-      "targeting_topic": true/false,
-      "reason": "giải thích ngắn gọn (1 câu)",
-      "crisis_keywords": ["từ khóa 1", "từ khóa 2", ...]
-    }}
-
-    ⚠️ Ghi nhớ:
-    - Nếu chỉ nhắc chủ đề trong hashtag hoặc không liên quan trực tiếp tới hành vi tiêu cực → targeting_topic = false.
-    - Nếu targeting_topic = false thì crisis_keywords là mảng rỗng []
-    - Luôn đảm bảo crisis_keywords là list, các phần tử không dài quá 3 từ.
-
-    Chỉ trả về JSON hợp lệ. Không ghi thêm bất kỳ văn bản nào khác.
+def sentiment_inference_batch(texts, tokenizer, config, model):
     """
+    Chạy model trên cả batch văn bản bằng một lần forward.
+    Trả về list (ref_list, top_label) theo đúng thứ tự đầu vào.
+    """
+    if not texts:
+        return []
+    return sentiment_inference_encoded(encode_texts(texts, tokenizer), tokenizer, config, model)
 
 
-    try:
-        response = requests.post(
-            "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent",
-            headers={
-                "Content-Type": "application/json",
-                "X-goog-api-key": settings.GEMINI_API_KEY
-            },
-            json={
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt.strip()
-                            }
-                        ]
-                    }
-                ]
-            }
-        )
-        response.raise_for_status()
-
-        raw_output = response.json().get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "").strip()
-
-        # Tách phần JSON trong chuỗi
-        json_start = raw_output.find("{")
-        json_end = raw_output.rfind("}") + 1
-        json_str = raw_output[json_start:json_end]
-
-        result = json.loads(json_str)
-
-        # Đảm bảo đúng định dạng
-        default_result = {
-            "contains_topic": False,
-            "targeting_topic": False,
-            "reason": "Không xác định hoặc lỗi đầu ra."
-        }
-
-        for key in default_result:
-            if key not in result:
-                result[key] = default_result[key]
-
-        result["contains_topic"] = bool(result["contains_topic"])
-        result["targeting_topic"] = bool(result["targeting_topic"])
-        result["reason"] = str(result["reason"])
-
-        return result
-
-    except Exception as e:
-        return {
-            "contains_topic": False,
-            "targeting_topic": False,
-            "reason": f"Lỗi xử lý đầu ra từ Gemini: {str(e)}"
-        }
\ No newline at end of file
+def sentiment_inference(text: str, tokenizer, config, model):
+    return sentiment_inference_batch([text], tokenizer, config, model)[0]
@@ -1,34 +1,174 @@
 import re
+import string
+import hashlib
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from pyvi import ViTokenizer
-from typing import List
-from collections import Counter
 
-from models import WordCloudResponse
+# Word cloud tiếng Việt cho cả batch: tách từ (CRF của pyvi) một lần cho mọi văn bản,
+# đếm bằng Counter, bỏ stopword và chỉ trả về top-K từ ghép.
+# Dùng trực tiếp phần bên trong của pyvi (sylabelize, model, bi_grams / tri_grams) nên pyvi được pin ở 0.1.1
+# trong cả hai requirements.txt; app/tests/test_wordcloud.py so kết quả với ViTokenizer.tokenize.
+# Bản giống hệt nằm ở app/wordcloud.py và litserve/word_cloud.py (mỗi service build image riêng);
+# app/tests/test_shared_modules.py kiểm tra hai bản luôn giống nhau.
+
+_WORD = re.compile(r"\w+")
 
-# Giả định: bạn đã định nghĩa sẵn class này
+# Từ ghép phổ biến không mang nội dung (đại từ, liên từ, trạng từ...)
+DEFAULT_STOPWORDS = frozenset([
+    "bây_giờ", "bên_cạnh", "bởi_vì", "các_bạn", "chúng_mình", "chúng_ta", "chúng_tôi",
+    "cho_nên", "có_lẽ", "có_thể", "của_mình", "cũng_như", "do_đó", "đôi_khi", "được_biết",
+    "hiện_nay", "hiện_tại", "hôm_nay", "không_phải", "khi_nào", "mọi_người", "ngày_nay",
+    "ngoài_ra", "nhưng_mà", "như_vậy", "nói_chung", "rằng_là", "sau_đó", "tại_sao",
+    "tất_cả", "thế_nào", "thế_nhưng", "thực_sự", "trong_khi", "trước_đó", "tuy_nhiên",
+    "vì_vậy", "vì_thế", "vừa_qua", "ví_dụ", "bao_giờ", "bao_nhiêu", "chẳng_hạn",
+])
 
-def generate_word_cloud(content: str) -> List[WordCloudResponse]:
-    tokenized_content = ViTokenizer.tokenize(content)
-    words = re.findall(r'\w+', tokenized_content.lower())
-    meaningful_words = [word for word in words if '_' in word]
+_VI = ViTokenizer.ViTokenizer
+# pyvi so khớp bằng "in string.punctuation" (kiểm tra chuỗi con), giữ nguyên để tách từ y hệt
+_PUNCTUATION = string.punctuation
 
-    word_cloud_dict = {}
-    for word in meaningful_words:
-        if word not in word_cloud_dict:
-            word_cloud_dict[word] = 1
+
+def _join_syllables(syllables: List[str], labels: List[str]) -> str:
+    """Ghép âm tiết theo nhãn CRF, giống hệt ViTokenizer.tokenize."""
+    output = syllables[0]
+    for i in range(1, len(labels)):
+        if labels[i] == 'I_W' and syllables[i] not in _PUNCTUATION and \
+                syllables[i - 1] not in _PUNCTUATION and \
+                not syllables[i][0].isdigit() and not syllables[i - 1][0].isdigit() \
+                and not (syllables[i][0].istitle() and not syllables[i - 1][0].istitle()):
+            output = output + '_' + syllables[i]
         else:
-            word_cloud_dict[word] += 1
+            output = output + ' ' + syllables[i]
+    return output
+
+
+def sent2features(syllables: List[str]) -> List[dict]:
+    """
+    Giống ViTokenizer.sent2features (cùng khóa và giá trị feature) nhưng chữ thường, istitle /
+    isupper và tra bi-gram / tri-gram chỉ tính một lần cho mỗi âm tiết thay vì lặp lại ở mọi vị trí lân cận.
+    """
+    count = len(syllables)
+    lowers = [syllable.lower() for syllable in syllables]
+    titles = [syllable.istitle() for syllable in syllables]
+    uppers = [syllable.isupper() for syllable in syllables]
+    bi_grams = [f"{lowers[i]} {lowers[i + 1]}" in _VI.bi_grams for i in range(count - 1)]
+    tri_grams = [f"{lowers[i]} {lowers[i + 1]} {lowers[i + 2]}" in _VI.tri_grams for i in range(count - 2)]
+
+    sentence = []
+    for i in range(count):
+        features = {
+            'bias': 1.0,
+            'word.lower()': lowers[i],
+            'word.isupper()': uppers[i],
+            'word.istitle()': titles[i],
+            'word.isdigit()': syllables[i].isdigit(),
+        }
+        if i > 0:
+            features['-1:word.lower()'] = lowers[i - 1]
+            features['-1:word.istitle()'] = titles[i - 1]
+            features['-1:word.isupper()'] = uppers[i - 1]
+            features['-1:word.bi_gram()'] = bi_grams[i - 1]
+            if i > 1:
+                features['-2:word.tri_gram()'] = tri_grams[i - 2]
+        if i < count - 1:
+            features['+1:word.lower()'] = lowers[i + 1]
+            features['+1:word.istitle()'] = titles[i + 1]
+            features['+1:word.isupper()'] = uppers[i + 1]
+            features['+1:word.bi_gram()'] = bi_grams[i]
+            if i < count - 2:
+                features['+2:word.tri_gram()'] = tri_grams[i]
+        sentence.append(features)
+    return sentence
+
+
+def compound_words(tokenized: str) -> Tuple[str, ...]:
+    """Các từ ghép (có "_") của văn bản đã tách từ, chữ thường, theo thứ tự xuất hiện."""
+    return tuple(word for word in _WORD.findall(tokenized.lower()) if '_' in word)
+
+
+def segment_batch(texts: List[str]) -> List[Tuple[str, ...]]:
+    """Tách từ cả batch bằng một lần gọi CRF; trả về từ ghép của từng văn bản."""
+    sentences = [_VI.sylabelize(text)[1] for text in texts]
+    indexes = [i for i, syllables in enumerate(sentences) if syllables]
+    labels = _VI.model.predict([sent2features(sentences[i]) for i in indexes]) if indexes else []
+
+    # Văn bản không có âm tiết nào: tokenize trả lại nguyên văn
+    segmented = [compound_words(text) for text in texts]
+    for i, sentence_labels in zip(indexes, labels):
+        segmented[i] = compound_words(_join_syllables(sentences[i], sentence_labels))
+    return segmented
+
+
+class WordCloudEngine:
+    """
+    Tạo word cloud cho nhiều văn bản một lúc.
+    Kết quả tách từ được giữ trong LRU theo nội dung, văn bản lặp lại (repost, bài trùng) không phải chạy CRF.
+    """
+
+    def __init__(self, top_k: Optional[int] = 50, stopwords: Iterable[str] = DEFAULT_STOPWORDS,
+                 cache_size: int = 10000):
+        self.top_k = top_k
+        self.stopwords = frozenset(stopwords)
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[bytes, Tuple[str, ...]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def segment(self, texts: List[str]) -> List[Tuple[str, ...]]:
+        keys = [self._key(text) for text in texts]
+        segmented: List[Optional[Tuple[str, ...]]] = [None] * len(texts)
+        missing: Dict[bytes, int] = {}
+        for i, key in enumerate(keys):
+            words = self.cache.get(key)
+            if words is not None:
+                self.cache.move_to_end(key)
+                segmented[i] = words
+                self.stats["hits"] += 1
+            elif key not in missing:
+                missing[key] = i
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
 
-    word_cloud = [WordCloudResponse(word=word, frequency=word_cloud_dict[word]) for word in meaningful_words if
-                  word in word_cloud_dict]
+        if missing:
+            computed = dict(zip(missing, segment_batch([texts[i] for i in missing.values()])))
+            self.cache.update(computed)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            for i, key in enumerate(keys):
+                if segmented[i] is None:
+                    segmented[i] = computed[key]
+        return segmented
 
-    seen = set()
-    ordered_word_cloud = []
-    for item in word_cloud:
-        if item.word not in seen:
-            ordered_word_cloud.append(item)
-            seen.add(item.word)
+    def generate_batch(self, texts: List[str], top_k: Optional[int] = None) -> List[List[Tuple[str, int]]]:
+        """
+        Word cloud (word, frequency) cho từng văn bản, tần suất giảm dần;
+        cùng tần suất thì theo thứ tự xuất hiện đầu tiên.
+        """
+        top_k = top_k or self.top_k
+        stopwords = self.stopwords
+        clouds = []
+        for words in self.segment(texts):
+            counts = Counter(word for word in words if word not in stopwords)
+            clouds.append(counts.most_common(top_k))
+        return clouds
 
-    ordered_word_cloud.sort(key=lambda x: x.frequency, reverse=True)
+    def generate_batch_dicts(self, texts: List[str], top_k: Optional[int] = None) -> List[List[Dict[str, int]]]:
+        """Như generate_batch nhưng mỗi từ là {"word", "frequency"} (định dạng trả về cho client)."""
+        return [
+            [{"word": word, "frequency": frequency} for word, frequency in cloud]
+            for cloud in self.generate_batch(texts, top_k)
+        ]
 
-    return ordered_word_cloud
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "cache_size": len(self.cache),
+            "hit_rate": round(self.stats["hits"] / lookups * 100, 2) if lookups else 0.0
+        }
@@ -1,11 +1,22 @@
+import gc
+import os
 import redis
 import json
+import time
 import multiprocessing
-from transformers import AutoTokenizer, AutoConfig, AutoModelForSequenceClassification
-from wordcloud import generate_word_cloud
+from wordcloud import WordCloudEngine
 from settings import Settings
-from sentiment import sentiment_filtering
-from huggingface_hub import snapshot_download
+from sentiment import sentiment_filtering_batch, build_sentiment_text, needs_llm_stage
+from utils import encode_texts
+from batching import LengthBucketBatcher
+from payloads import parse_payload
+from sentiment_cache import SentimentCache
+from llm import flush_prefilter_stats
+from topic_terms import topic_word_counts
+from model_loader import load_model, warm_up
+from backends import create_backend
+from windows import check_aggregation
+from supervisor import usable_cores, available_cpus, plan_layout, assign_cpu_sets, configure_worker_threads
 
 settings = Settings()
 
@@ -17,93 +28,314 @@ def get_redis_connection():
         decode_responses=True
     )
 
-# Load model
-model_path = settings.MODEL
-local_dir = snapshot_download(repo_id=model_path, local_dir="./models")
-tokenizer = AutoTokenizer.from_pretrained(local_dir)
-config = AutoConfig.from_pretrained(local_dir)
-model = AutoModelForSequenceClassification.from_pretrained(local_dir)
+# Model được load một lần ở process cha (init_model) rồi dùng chung cho các worker qua fork
+tokenizer = None
+config = None
+model = None
+
+# Cache tách từ riêng của mỗi worker process
+word_cloud_engine = WordCloudEngine(top_k=settings.WORD_CLOUD_TOP_K, cache_size=settings.WORD_CLOUD_CACHE_SIZE)
+
+def init_model():
+    global tokenizer, config, model
+    check_aggregation(settings.LONG_DOC_AGGREGATION)
+    tokenizer, config, hf_model = load_model(settings.MODEL, settings.MODEL_DIR)
+    # model là InferenceBackend (torch / onnx / int8) theo INFERENCE_BACKEND
+    onnx_path = settings.ONNX_PATH or os.path.join(settings.MODEL_DIR, "onnx", "model.onnx")
+    model = create_backend(settings.INFERENCE_BACKEND, hf_model, onnx_path)
+    print(f"🧠 Inference backend: {model.name}")
 
 REDIS_REQUEST_QUEUE = "sentiment_request_queue"
-REDIS_RESULT_QUEUE = "sentiment_result_queue"
+REDIS_RESULT_CHANNEL = "sentiment_result"
+REDIS_LLM_QUEUE = "sentiment_llm_queue"
+REDIS_TOPIC_TERMS_CHANNEL = "topic_terms"
 
-def predict_sentiment(data_input):
+def build_full_text(data_input):
+    return ' '.join(filter(None, [
+        data_input.get("title", ""),
+        data_input.get("content", ""),
+        data_input.get("description", "")
+    ]))
+
+def predict_sentiment_batch(data_inputs, encodings=None, cache=None):
+    """
+    Chạy sentiment cho cả batch bằng một lần forward.
+    encodings (nếu có) là input_ids đã tokenize sẵn cho từng data_input.
+    cache (nếu có) là SentimentCache dùng để bỏ qua các nội dung đã có kết quả.
+    Trả về list (prediction, word_cloud) theo thứ tự đầu vào.
+    """
+    outputs = [({"error": "⚠️ Invalid input data"}, []) for _ in data_inputs]
+    valid_indexes = [i for i, data_input in enumerate(data_inputs) if isinstance(data_input, dict)]
+    if not valid_indexes:
+        return outputs
+
+    valid_inputs = [data_inputs[i] for i in valid_indexes]
+    valid_encodings = [encodings[i] for i in valid_indexes] if encodings is not None else None
     try:
-        if not isinstance(data_input, dict):
-            raise ValueError("⚠️ Invalid input data")
-
-        result = sentiment_filtering(data_input, tokenizer, config, model)
-        full_text = ' '.join(filter(None, [
-            data_input.get("title", ""),
-            data_input.get("content", ""),
-            data_input.get("description", "")
-        ]))
-        word_cloud_items = generate_word_cloud(full_text)
-        word_cloud = [{"word": wc.word, "frequency": wc.frequency} for wc in word_cloud_items]
-
-        return result, word_cloud
+        # Bài đăng tiêu cực cần LLM được chuyển cho llm_worker, worker không chờ round trip tới Gemini
+        predictions = sentiment_filtering_batch(
+            valid_inputs, tokenizer, config, model, valid_encodings, cache,
+            defer_topic_analysis=settings.LLM_STAGE_ENABLED
+        )
     except Exception as e:
-        return {"error": str(e)}, []
+        for i in valid_indexes:
+            outputs[i] = ({"error": str(e)}, [])
+        return outputs
+
+    try:
+        # Tách từ cả batch một lần (xem WordCloudEngine)
+        word_clouds = word_cloud_engine.generate_batch_dicts([build_full_text(data_input) for data_input in valid_inputs])
+    except Exception as e:
+        for i in valid_indexes:
+            outputs[i] = ({"error": str(e)}, [])
+        return outputs
+
+    for i, prediction, word_cloud in zip(valid_indexes, predictions, word_clouds):
+        outputs[i] = (prediction, word_cloud)
+    return outputs
+
+def predict_sentiment(data_input):
+    return predict_sentiment_batch([data_input])[0]
+
+def publish_results(redis_conn, tasks, results):
+    # Trả kết quả về đúng channel của server process đang chờ từng job
+    pipe = redis_conn.pipeline(transaction=False)
+    for task, result in zip(tasks, results):
+        pipe.publish(task.get("reply_to", REDIS_RESULT_CHANNEL), json.dumps({
+            "job_id": task.get("job_id"),
+            "result": result
+        }))
+    pipe.execute()
+
+def publish_topic_terms(redis_conn, data_inputs, word_clouds):
+    # Số lần xuất hiện của từ theo chủ đề trong batch, server gộp vào top từ khóa theo giờ / ngày
+    topics = topic_word_counts(data_inputs, word_clouds)
+    if topics:
+        redis_conn.publish(REDIS_TOPIC_TERMS_CHANNEL, json.dumps({"ts": time.time(), "topics": topics}))
+
+def enqueue_llm_jobs(redis_conn, tasks, results):
+    # Kết quả còn thiếu phần kiểm tra chủ đề: llm_worker hoàn thiện rồi publish về reply_to
+    pipe = redis_conn.pipeline(transaction=False)
+    for task, result in zip(tasks, results):
+        pipe.rpush(REDIS_LLM_QUEUE, json.dumps({
+            "job_id": task.get("job_id"),
+            "reply_to": task.get("reply_to", REDIS_RESULT_CHANNEL),
+            "data_input": task.get("data_input", {}),
+            "result": result
+        }))
+    pipe.execute()
+
+def fetch_batch(redis_conn, block=True):
+    """
+    Lấy tối đa WORKER_MAX_BATCH_SIZE job, hoặc chờ tối đa WORKER_MAX_BATCH_WAIT_MS
+    kể từ job đầu tiên, tùy điều kiện nào đến trước.
+    Với block=False chỉ lấy các job đang có sẵn trong queue.
+    """
+    if not block:
+        return redis_conn.lpop(REDIS_REQUEST_QUEUE, settings.WORKER_MAX_BATCH_SIZE) or []
+
+    packed = redis_conn.blpop(REDIS_REQUEST_QUEUE, timeout=5)
+    if not packed:
+        return []
+
+    payloads = [packed[1]]
+    deadline = time.monotonic() + settings.WORKER_MAX_BATCH_WAIT_MS / 1000
+    while len(payloads) < settings.WORKER_MAX_BATCH_SIZE:
+        # Lấy ngay các job đang có sẵn trong queue
+        available = redis_conn.lpop(REDIS_REQUEST_QUEUE, settings.WORKER_MAX_BATCH_SIZE - len(payloads))
+        if available:
+            payloads.extend(available)
+            continue
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        packed = redis_conn.blpop(REDIS_REQUEST_QUEUE, timeout=remaining)
+        if not packed:
+            break
+        payloads.append(packed[1])
+    return payloads
+
+def encode_tasks(tasks):
+    texts = [
+        build_sentiment_text(task.get("data_input")) if isinstance(task.get("data_input"), dict) else ""
+        for task in tasks
+    ]
+    return encode_texts(texts, tokenizer)
+
+def add_to_batcher(batcher, tasks):
+    """
+    Tokenize một lần để xếp job vào bucket theo độ dài window dài nhất, input_ids được dùng lại khi inference.
+    Trả về list (task, lỗi) của các job không tokenize được.
+    """
+    try:
+        encodings = encode_tasks(tasks)
+    except Exception:
+        # Tokenize lại từng job để chỉ loại job gây lỗi
+        encodings = []
+        for task in tasks:
+            try:
+                encodings.append(encode_tasks([task])[0])
+            except Exception as e:
+                encodings.append(e)
+
+    failed = []
+    for task, windows in zip(tasks, encodings):
+        if isinstance(windows, Exception):
+            failed.append((task, str(windows)))
+        else:
+            batcher.add((task, windows), max(len(window) for window in windows))
+    return failed
+
+def cache_namespace(settings):
+    """
+    Namespace của SentimentCache: label phụ thuộc model, backend và cách cắt / gộp window
+    (LONG_DOC_*), nên đổi một trong các cấu hình này thì không dùng lại kết quả cũ.
+    Chỉ mục near-duplicate nằm trong process nên luôn cùng cấu hình, không cần namespace.
+    """
+    if not settings.LONG_DOC_MODE:
+        return f"{settings.MODEL}:{settings.INFERENCE_BACKEND}:single"
+    return (
+        f"{settings.MODEL}:{settings.INFERENCE_BACKEND}:long:"
+        f"{settings.LONG_DOC_WINDOW_TOKENS}-{settings.LONG_DOC_WINDOW_OVERLAP}-"
+        f"{settings.LONG_DOC_MAX_WINDOWS}-{settings.LONG_DOC_AGGREGATION}"
+    )
+
+def error_result(task, error):
+    return {
+        "id": task.get("meta", {}).get("id", ""),
+        "error": error,
+        "word_cloud": []
+    }
+
+def publish_errors(redis_conn, failed):
+    # Job không đọc được job_id thì không có ai chờ, chỉ ghi log
+    failed = [(task, error) for task, error in failed if task.get("job_id")]
+    if failed:
+        publish_results(redis_conn, [task for task, _ in failed], [error_result(task, error) for task, error in failed])
+
+def enqueue_payloads(redis_conn, batcher, payloads):
+    """Parse và xếp từng payload vào batcher; job lỗi nhận kết quả lỗi ngay, không ảnh hưởng các job khác."""
+    tasks, failed = [], []
+    for payload in payloads:
+        task, error = parse_payload(payload)
+        if error is None:
+            tasks.append(task)
+        else:
+            failed.append((task, error))
+    if tasks:
+        failed.extend(add_to_batcher(batcher, tasks))
+    if failed:
+        print(f"❌ invalid_jobs={len(failed)} | job_ids={[task.get('job_id') for task, _ in failed]} | errors={[error for _, error in failed]}")
+        publish_errors(redis_conn, failed)
+
+def build_result(meta, prediction, word_cloud):
+    return {
+        "id": meta.get("id", ""),
+        "topic_name": meta.get("topic_name", ""),
+        "topic_id": meta.get("topic_id", ""),
+        "title": meta.get("title", ""),
+        "content": meta.get("content", ""),
+        "description": meta.get("description", ""),
+        "site_name": meta.get("siteName", ""),
+        "site_id": meta.get("siteId", ""),
+        "type": meta.get("type", ""),
+        **prediction,
+        "word_cloud": word_cloud
+    }
+
+def worker_process(num_threads=None, cpu_set=None):
+    if num_threads:
+        configure_worker_threads(num_threads, cpu_set)
+
+    # Warm-up trước khi nhận job để job đầu tiên không chịu chi phí khởi tạo
+    elapsed = warm_up(tokenizer, config, model)
+    print(f"🔥 Worker {multiprocessing.current_process().name} warmed up in {elapsed:.2f}s | threads={num_threads} | cpus={sorted(cpu_set) if cpu_set else 'all'}")
 
-def worker_process():
     redis_conn = get_redis_connection()
+    cache = SentimentCache(
+        redis_conn,
+        namespace=cache_namespace(settings),
+        max_items=settings.SENTIMENT_CACHE_SIZE,
+        ttl=settings.SENTIMENT_CACHE_TTL
+    ) if settings.SENTIMENT_CACHE_ENABLED else None
+    batcher = LengthBucketBatcher(
+        settings.WORKER_LENGTH_BUCKETS,
+        settings.WORKER_MAX_BATCH_SIZE,
+        settings.WORKER_BUCKET_MAX_DELAY_MS
+    )
     while True:
+        tasks = []
         try:
-            packed = redis_conn.blpop(REDIS_REQUEST_QUEUE, timeout=5)
-            if not packed:
+            # Chỉ chờ job mới khi không còn job nào đang đợi trong các bucket
+            payloads = fetch_batch(redis_conn, block=len(batcher) == 0)
+            if payloads:
+                enqueue_payloads(redis_conn, batcher, payloads)
+
+            entries = batcher.next_batch()
+            if not entries:
                 continue
 
-            _, payload = packed
-            task = json.loads(payload)
-
-            job_id = task.get("job_id")
-            data_input = task.get("data_input", {})
-            meta = task.get("meta", {})
-
-            print(f"📥 job_id={job_id} | id={meta.get('id')}")
-
-            prediction, word_cloud = predict_sentiment(data_input)
-            result = {
-                "id": meta.get("id", ""),
-                "topic_name": meta.get("topic_name", ""),
-                "topic_id": meta.get("topic_id", ""),
-                "title": meta.get("title", ""),
-                "content": meta.get("content", ""),
-                "description": meta.get("description", ""),
-                "site_name": meta.get("siteName", ""),
-                "site_id": meta.get("siteId", ""),
-                "type": meta.get("type", ""),
-                **prediction,
-                "word_cloud": word_cloud
-            }
-
-            print(f"✅ job_id={job_id} | result={result}")
-            redis_conn.rpush(REDIS_RESULT_QUEUE, json.dumps({
-                "job_id": job_id,
-                "result": result
-            }))
+            tasks = [task for (task, _), _ in entries]
+            encodings = [windows for (_, windows), _ in entries]
+            print(f"📥 batch_size={len(tasks)} | windows={sum(len(windows) for windows in encodings)} | max_tokens={max(length for _, length in entries)} | job_ids={[task.get('job_id') for task in tasks]}")
+
+            outputs = predict_sentiment_batch([task.get("data_input", {}) for task in tasks], encodings, cache)
+            if settings.TOPIC_TERMS_ENABLED:
+                publish_topic_terms(redis_conn, [task.get("data_input") for task in tasks], [word_cloud for _, word_cloud in outputs])
+            results = [
+                build_result(task.get("meta", {}), prediction, word_cloud)
+                for task, (prediction, word_cloud) in zip(tasks, outputs)
+            ]
+
+            print(f"✅ batch_size={len(tasks)} | results={results}")
+            deferred = [
+                needs_llm_stage(task.get("data_input"), result)
+                for task, result in zip(tasks, results)
+            ]
+            publish_results(
+                redis_conn,
+                [task for task, wait in zip(tasks, deferred) if not wait],
+                [result for result, wait in zip(results, deferred) if not wait]
+            )
+            if any(deferred):
+                enqueue_llm_jobs(
+                    redis_conn,
+                    [task for task, wait in zip(tasks, deferred) if wait],
+                    [result for result, wait in zip(results, deferred) if wait]
+                )
+            if cache is not None:
+                cache.flush_stats()
+            flush_prefilter_stats(redis_conn)
+
+            if batcher.batches % 100 == 0:
+                print(f"📊 batcher stats={batcher.get_stats()}")
+                if cache is not None:
+                    print(f"📊 cache stats={cache.get_stats()}")
 
         except Exception as e:
-            result = {
-                "id": meta.get("id", ""),
-                "error": str(e),
-                "word_cloud": []
-            }
-            print(f"❌ job_id={job_id} | Error: {e}")
-            redis_conn.rpush(REDIS_RESULT_QUEUE, json.dumps({
-                "job_id": job_id,
-                "result": result
-            }))
+            print(f"❌ batch_size={len(tasks)} | Error: {e}")
+            publish_results(redis_conn, tasks, [error_result(task, str(e)) for task in tasks])
 
 if __name__ == "__main__":
-    num_processes = multiprocessing.cpu_count()*0.8
-    # convert num_processes to int
-    num_processes = int(num_processes)
+    # Chia core theo process × thread để tổng số thread không vượt quá số core được cấp
+    cores = usable_cores()
+    thread_counts = plan_layout(cores, settings.WORKER_PROCESSES, settings.WORKER_THREADS)
+    cpu_sets = (
+        assign_cpu_sets(available_cpus(), thread_counts)
+        if settings.WORKER_PIN_CPUS else [None] * len(thread_counts)
+    )
+
+    init_model()
+    # Đưa các object đã load vào generation cố định để GC không chạm vào (giữ trang nhớ dùng chung sau fork)
+    gc.freeze()
+    # Luôn dùng fork để các worker chia sẻ weights của process cha thay vì load lại
+    mp_context = multiprocessing.get_context("fork")
 
-    print(f"Starting {num_processes} worker processes...")
+    print(f"Starting {len(thread_counts)} worker processes (threads: {thread_counts}) on {cores} cores...")
     processes = []
-    for _ in range(num_processes):
-        p = multiprocessing.Process(target=worker_process)
+    for num_threads, cpu_set in zip(thread_counts, cpu_sets):
+        p = mp_context.Process(target=worker_process, args=(num_threads, cpu_set))
         p.start()
         processes.append(p)
 
@@ -113,4 +345,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("Shutting down...")
         for p in processes:
-            p.terminate()
\ No newline at end of file
+            p.terminate()
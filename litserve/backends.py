@@ -0,0 +1,138 @@
+import os
+import numpy as np
+import torch
+
+# Bản giống hệt nằm ở app/backends.py và litserve/backends.py: mỗi service build image chỉ từ thư mục
+# của nó (COPY app/, COPY litserve/) nên không import chung được; app/tests/test_shared_modules.py
+# kiểm tra hai bản luôn giống nhau.
+
+BACKENDS = ("torch", "onnx", "int8")
+
+
+class InferenceBackend:
+    """
+    Giao diện chung cho các backend inference trên CPU.
+    logits nhận input_ids và attention_mask (numpy, đã pad) và trả về logits dạng numpy.
+    """
+    name = "base"
+
+    def logits(self, input_ids, attention_mask):
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """PyTorch eager, fp32."""
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def logits(self, input_ids, attention_mask):
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=torch.as_tensor(input_ids),
+                attention_mask=torch.as_tensor(attention_mask)
+            )
+        return outputs.logits.float().cpu().numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch eager với các lớp Linear được lượng tử hóa động sang int8."""
+    name = "int8"
+
+    def __init__(self, model):
+        super().__init__(torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8))
+
+
+class _LogitsOnly(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def export_onnx(model, onnx_path):
+    """
+    Export model sang ONNX (batch và độ dài động). Bỏ qua nếu file đã tồn tại.
+    """
+    if os.path.exists(onnx_path):
+        return onnx_path
+
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+    dummy_ids = torch.ones((2, 8), dtype=torch.long)
+    dummy_mask = torch.ones((2, 8), dtype=torch.long)
+    tmp_path = f"{onnx_path}.tmp"
+    torch.onnx.export(
+        _LogitsOnly(model).eval(),
+        (dummy_ids, dummy_mask),
+        tmp_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+    os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNX Runtime trên CPU. Model được export một lần ra onnx_path;
+    InferenceSession được tạo lười ở lần gọi đầu tiên (an toàn khi fork worker).
+    """
+    name = "onnx"
+
+    def __init__(self, model, onnx_path, num_threads=0):
+        self.onnx_path = export_onnx(model, onnx_path)
+        self.num_threads = num_threads
+        self.session = None
+
+    def _get_session(self):
+        if self.session is None:
+            try:
+                import onnxruntime as ort
+            except ImportError as e:
+                raise RuntimeError("INFERENCE_BACKEND=onnx cần cài onnxruntime") from e
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = self.num_threads or torch.get_num_threads()
+            options.inter_op_num_threads = 1
+            self.session = ort.InferenceSession(self.onnx_path, options, providers=["CPUExecutionProvider"])
+        return self.session
+
+    def logits(self, input_ids, attention_mask):
+        return self._get_session().run(["logits"], {
+            "input_ids": np.asarray(input_ids, dtype=np.int64),
+            "attention_mask": np.asarray(attention_mask, dtype=np.int64),
+        })[0]
+
+
+def create_backend(name, model, onnx_path=None):
+    """
+    Tạo backend theo tên: "torch" (fp32), "onnx" (ONNX Runtime) hoặc "int8" (quantized).
+    """
+    if name == "torch":
+        return TorchBackend(model)
+    if name == "int8":
+        return QuantizedTorchBackend(model)
+    if name == "onnx":
+        return OnnxBackend(model, onnx_path)
+    raise ValueError(f"Unknown inference backend: {name} (expected one of {BACKENDS})")
+
+
+def as_backend(model):
+    """Cho phép truyền model HF trực tiếp như trước: bọc lại bằng TorchBackend."""
+    return model if isinstance(model, InferenceBackend) else TorchBackend(model)
+
+
+def softmax(logits):
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
@@ -0,0 +1,124 @@
+"""
+Load test server.py với nhiều cấu hình batching: với mỗi cặp MAX_BATCH_SIZE:BATCH_TIMEOUT,
+khởi động server.py, bắn request đồng thời từ --concurrency client và đo throughput, p50 / p99 latency.
+
+    python bench_batching.py --settings 1:0 4:0.005 8:0.01 16:0.02 --concurrency 32 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+
+SENTENCES = [
+    "Khách hàng phản ánh dịch vụ chăm sóc khách hàng của ngân hàng quá chậm trễ.",
+    "Sản phẩm sữa bị phát hiện có chất lượng kém, nhiều phụ huynh lo lắng cho sức khỏe của con.",
+    "Nhân viên tư vấn không hỗ trợ hoàn tiền dù đơn hàng đã bị hủy từ tuần trước.",
+    "Ứng dụng ngân hàng liên tục báo lỗi khi chuyển tiền vào cuối tháng.",
+    "Cửa hàng tiện lợi mới khai trương tại thành phố Hồ Chí Minh thu hút đông đảo người dân.",
+    "Giá vé máy bay tăng mạnh trong dịp lễ khiến hành khách bức xúc.",
+    "Người tiêu dùng nên kiểm tra kỹ thông tin sản phẩm trước khi thanh toán.",
+]
+
+
+def build_texts(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 6))) for _ in range(count)]
+
+
+def start_server(max_batch_size, batch_timeout, port, num_api_servers):
+    env = dict(
+        os.environ,
+        MAX_BATCH_SIZE=str(max_batch_size),
+        BATCH_TIMEOUT=str(batch_timeout),
+        PORT=str(port),
+        NUM_API_SERVERS=str(num_api_servers)
+    )
+    return subprocess.Popen(
+        [sys.executable, "server.py"], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_ready(session, base_url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server.py exited with code {process.returncode}")
+        try:
+            async with session.get(f"{base_url}/health") as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError("server.py did not become healthy")
+
+
+async def run_load(session, url, texts, concurrency, texts_per_request):
+    payloads = [
+        {"text": texts[start] if texts_per_request == 1 else texts[start:start + texts_per_request]}
+        for start in range(0, len(texts), texts_per_request)
+    ]
+    latencies = []
+    queue = iter(payloads)
+
+    async def client():
+        for payload in queue:
+            started = time.perf_counter()
+            async with session.post(url, json=payload) as resp:
+                resp.raise_for_status()
+                await resp.read()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return np.array(latencies), time.perf_counter() - started
+
+
+async def main(args):
+    texts = build_texts(args.requests * args.texts_per_request)
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(
+        f"requests={args.requests} | texts_per_request={args.texts_per_request} | "
+        f"concurrency={args.concurrency} | api_servers={args.num_api_servers}"
+    )
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
+        for setting in args.settings:
+            max_batch_size, batch_timeout = setting.split(":")
+            process = start_server(int(max_batch_size), float(batch_timeout), args.port, args.num_api_servers)
+            try:
+                await wait_ready(session, base_url, process, args.startup_timeout)
+                # Làm nóng (tokenizer, model) trước khi đo
+                await run_load(session, f"{base_url}/predict", texts[:args.concurrency * 2], args.concurrency, 1)
+                latencies, elapsed = await run_load(
+                    session, f"{base_url}/predict", texts, args.concurrency, args.texts_per_request
+                )
+            finally:
+                process.terminate()
+                process.wait()
+
+            print(
+                f"batch={int(max_batch_size):3d} timeout={float(batch_timeout) * 1000:5.1f}ms | "
+                f"throughput={len(texts) / elapsed:8.1f} texts/s | "
+                f"p50={np.percentile(latencies, 50) * 1000:7.1f}ms | p99={np.percentile(latencies, 99) * 1000:7.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--settings", nargs="+", default=["1:0", "4:0.005", "8:0.01", "16:0.02"],
+                        help="MAX_BATCH_SIZE:BATCH_TIMEOUT (giây)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--texts-per-request", type=int, default=1)
+    parser.add_argument("--num-api-servers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8990)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    asyncio.run(main(parser.parse_args()))
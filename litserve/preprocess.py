@@ -0,0 +1,69 @@
+import os
+from typing import List, Tuple
+
+from socketio import packet
+
+from word_cloud import WordCloudEngine
+
+# Phần tốn CPU của socket_server (word cloud, dựng kết quả, mã hóa packet Socket.IO).
+# Chạy trong process pool, mỗi process có WordCloudEngine (và cache tách từ) riêng,
+# nên event loop của socket_server chỉ còn lo I/O.
+
+WORD_CLOUD_TOP_K = int(os.getenv("WORD_CLOUD_TOP_K", "50"))
+WORD_CLOUD_CACHE_SIZE = int(os.getenv("WORD_CLOUD_CACHE_SIZE", "10000"))
+
+word_cloud_engine: WordCloudEngine = None
+
+
+def init_worker():
+    """Initializer của process pool: tạo WordCloudEngine một lần cho mỗi process."""
+    global word_cloud_engine
+    word_cloud_engine = WordCloudEngine(top_k=WORD_CLOUD_TOP_K, cache_size=WORD_CLOUD_CACHE_SIZE)
+
+
+def build_text(item: dict) -> str:
+    return f"{item.get('title', '')} {item.get('description', '')} {item.get('content', '')}"
+
+
+def build_result(item: dict, word_cloud: List[dict]) -> dict:
+    """Kết quả trả về client cho một item, "sentiment" điền sau khi có kết quả inference."""
+    return {
+        "id": item.get("id", ""),
+        "topic_name": item.get("topic_name", ""),
+        "topic_id": item.get("topic_id", ""),
+        "title": item.get("title", ""),
+        "content": item.get("content", ""),
+        "description": item.get("description", ""),
+        "site_name": item.get("siteName", ""),
+        "site_id": item.get("siteId", ""),
+        "type": item.get("type", ""),
+        "log_level": None,
+        "reason": "",
+        "input_type": item.get("type", ""),
+        "sentiment": None,
+        "contains_topic": False,
+        "targeting_topic": False,
+        "crisis_keywords": [],
+        "is_kol": item.get("is_kol", False),
+        "total_interactions": item.get("total_interactions", 0),
+        "word_cloud": word_cloud
+    }
+
+
+def prepare_chunk(items: List[dict]) -> Tuple[List[str], List[dict]]:
+    """
+    Xử lý một chunk item trong process pool: văn bản (để gọi inference) và
+    kết quả của từng item (build_result).
+    """
+    texts = [build_text(item) for item in items]
+    word_clouds = word_cloud_engine.generate_batch_dicts(texts)
+    results = [build_result(item, word_cloud) for item, word_cloud in zip(items, word_clouds)]
+    return texts, results
+
+
+def encode_event(event: str, data: dict) -> str:
+    """
+    Mã hóa packet Socket.IO của một event (namespace mặc định) giống hệt AsyncServer.emit,
+    để json.dumps của payload lớn chạy trong process pool thay vì trên event loop.
+    """
+    return packet.Packet(packet.EVENT, namespace="/", data=[event, data]).encode()
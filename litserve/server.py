@@ -1,17 +1,43 @@
+import os
+import numpy as np
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 from litserve import LitAPI, LitServer
+from backends import create_backend, softmax
+from windows import encode_documents, aggregate_windows, check_aggregation
+
+# Backend inference: "torch" (fp32), "onnx" (ONNX Runtime) hoặc "int8" (quantized)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_PATH = os.getenv("ONNX_PATH", "./onnx/model.onnx")
+
+# Chế độ văn bản dài: chấm nhiều window chồng lấn thay vì cắt ở 512 token
+LONG_DOC_MODE = os.getenv("LONG_DOC_MODE", "false").lower() == "true"
+LONG_DOC_WINDOW_TOKENS = int(os.getenv("LONG_DOC_WINDOW_TOKENS", "256"))
+LONG_DOC_WINDOW_OVERLAP = int(os.getenv("LONG_DOC_WINDOW_OVERLAP", "64"))
+LONG_DOC_MAX_WINDOWS = int(os.getenv("LONG_DOC_MAX_WINDOWS", "8"))
+LONG_DOC_AGGREGATION = os.getenv("LONG_DOC_AGGREGATION", "max_negative")
+
+# Gộp các request đến cùng lúc vào một lần forward: tối đa MAX_BATCH_SIZE request,
+# chờ tối đa BATCH_TIMEOUT giây để gom đủ. socket_server gửi song song nhiều chunk từ
+# nhiều worker nên thường có request để gộp; request lẻ chỉ chờ thêm tối đa 5ms.
+# MAX_BATCH_SIZE=1 tắt batching; tinh chỉnh bằng bench_batching.py trên máy chạy thật
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "8"))
+BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", "0.005"))
+NUM_API_SERVERS = int(os.getenv("NUM_API_SERVERS", "12"))
+PORT = int(os.getenv("PORT", "8989"))
 
 class BERTLitAPI(LitAPI):
     def setup(self, device):
         """
         Load the tokenizer and model from custom Hugging Face repo
         """
+        check_aggregation(LONG_DOC_AGGREGATION)
         model_name = "Khoa/sentiment-analysis-all-category-122024.8"
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
         self.model.to(device)
         self.model.eval()
+        self.backend = create_backend(INFERENCE_BACKEND, self.model, ONNX_PATH)
         raw_id2label = {int(k): v for k, v in self.model.config.id2label.items()}
         label_alias = {
             "NEG": "Negative",
@@ -23,21 +49,65 @@ class BERTLitAPI(LitAPI):
             idx: label_alias.get(label.upper(), label)
             for idx, label in raw_id2label.items()
         }
+        self.negative_index = next((idx for idx, label in self.id2label.items() if label == "Negative"), None)
+
     def decode_request(self, request):
+        """
+        Tokenize thành window input_ids của từng văn bản, chưa pad (pad trong batch).
+        single_text: request gửi một chuỗi thay vì list, response khi đó là một object.
+        """
         text = request["text"]
-        if isinstance(text, str):
+        single_text = isinstance(text, str)
+        if single_text:
             text = [text]
-        inputs = self.tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-        return inputs
+        windows = encode_documents(
+            text,
+            self.tokenizer,
+            long_doc=LONG_DOC_MODE,
+            window_tokens=LONG_DOC_WINDOW_TOKENS,
+            overlap=LONG_DOC_WINDOW_OVERLAP,
+            max_windows=LONG_DOC_MAX_WINDOWS
+        )
+        return {"windows": windows, "single_text": single_text}
+
+    def batch(self, inputs):
+        """
+        Gộp nhiều request: pad mọi window của mọi văn bản về cùng độ dài,
+        ghi văn bản của từng window (doc_index) và số văn bản của từng request.
+        """
+        encodings = [windows for request in inputs for windows in request["windows"]]
+        rows = [window for windows in encodings for window in windows]
+        padded = self.tokenizer.pad({"input_ids": rows}, return_tensors="np")
+        return {
+            "input_ids": padded["input_ids"],
+            "attention_mask": padded["attention_mask"],
+            "doc_index": np.repeat(np.arange(len(encodings)), [len(windows) for windows in encodings]),
+            "num_docs": len(encodings),
+            "request_docs": [len(request["windows"]) for request in inputs],
+            "single_text": [request["single_text"] for request in inputs],
+        }
 
     def predict(self, inputs):
-        with torch.no_grad():
-            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
-            outputs = self.model(**inputs)
-        return outputs.logits
+        # Không bật batching: inputs là một request chưa pad
+        single = "input_ids" not in inputs
+        if single:
+            inputs = self.batch([inputs])
+        logits = self.backend.logits(inputs["input_ids"], inputs["attention_mask"])
+        # Gộp các window về từng văn bản (không đổi gì nếu mỗi văn bản chỉ có một window)
+        probs = aggregate_windows(
+            softmax(logits), inputs["doc_index"], inputs["attention_mask"].sum(axis=1), inputs["num_docs"],
+            LONG_DOC_AGGREGATION, self.negative_index
+        )
+        per_request = list(zip(torch.split(torch.from_numpy(probs), inputs["request_docs"]), inputs["single_text"]))
+        return per_request[0] if single else per_request
+
+    def unbatch(self, output):
+        """(xác suất, single_text) của từng request (theo thứ tự trong batch)."""
+        return list(output)
 
-    def encode_response(self, logits):
-        probs = torch.nn.functional.softmax(logits, dim=-1)
+    def encode_response(self, output):
+        """Một object nếu request gửi một chuỗi, ngược lại list theo thứ tự văn bản."""
+        probs, single_text = output
         top_probs, top_classes = torch.topk(probs, k=1, dim=-1)
 
         results = []
@@ -54,9 +124,12 @@ class BERTLitAPI(LitAPI):
             }
             results.append(result)
 
-        return results if len(results) > 1 else results[0]
+        return results[0] if single_text else results
 
 if __name__ == "__main__":
-    api = BERTLitAPI()
+    api = BERTLitAPI(
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_timeout=BATCH_TIMEOUT if MAX_BATCH_SIZE > 1 else 0.0
+    )
     server = LitServer(api, accelerator='cpu', devices=0)
-    server.run(host="0.0.0.0", port=8989, num_api_servers=12, log_level="info")
\ No newline at end of file
+    server.run(host="0.0.0.0", port=PORT, num_api_servers=NUM_API_SERVERS, log_level="info")
\ No newline at end of file
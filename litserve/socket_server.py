@@ -1,16 +1,29 @@
-import re
+import os
 import uvicorn
 import socketio
 import asyncio
 import aiohttp
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 from fastapi import FastAPI
-from pyvi import ViTokenizer
-from typing import List, Dict, Any
-from pydantic import BaseModel
 from tenacity import retry, stop_after_attempt, wait_fixed, RetryError, retry_if_exception_type
+from preprocess import init_worker, prepare_chunk, encode_event
 
 # ────────⚙️ Config ────────
 INFER_URL = "http://0.0.0.0:8989/predict"
+# Số văn bản trong một request tới model server (request dạng list {"text": [...]})
+INFER_BATCH_SIZE = int(os.getenv("INFER_BATCH_SIZE", "32"))
+INFER_TIMEOUT = float(os.getenv("INFER_TIMEOUT", "30"))
+# Số process tách từ / dựng kết quả / mã hóa packet cho mỗi uvicorn worker (start_socket.sh chạy 8 worker)
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "2"))
+# Số item gửi sang process pool trong một lần submit
+CPU_CHUNK_SIZE = int(os.getenv("CPU_CHUNK_SIZE", "64"))
+# Chu kỳ đo độ trễ event loop (giây) và số mẫu giữ lại
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_LAG_SAMPLES = int(os.getenv("LOOP_LAG_SAMPLES", "3000"))
+
 
 # ────────🔌 Socket.IO + FastAPI ────────
 sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
@@ -20,39 +33,21 @@ asgi_app = socketio.ASGIApp(sio, app)
 # ────────🌐 AIOHTTP Session ────────
 aiohttp_session: aiohttp.ClientSession = None
 
+# ────────🧠 CPU Pool ────────
+cpu_pool: ProcessPoolExecutor = None
 
-# ────────📦 Models ────────
-class WordCloudResponse(BaseModel):
-    word: str
-    frequency: int
-
-
-# ────────🧠 NLP Utils ────────
-def generate_word_cloud(content: str) -> List[Dict[str, Any]]:
-    """
-    Tạo word cloud từ nội dung tiếng Việt.
-    Chỉ lấy các từ ghép có gạch dưới sau khi tokenize.
-    """
-    tokenized = ViTokenizer.tokenize(content)
-    words = re.findall(r'\w+', tokenized.lower())
-    meaningful_words = [w for w in words if '_' in w]
-
-    freq_map = {}
-    for word in meaningful_words:
-        freq_map[word] = freq_map.get(word, 0) + 1
-
-    # Tránh trùng từ
-    seen = set()
-    word_cloud = []
-    for word in meaningful_words:
-        if word not in seen:
-            seen.add(word)
-            word_cloud.append(WordCloudResponse(word=word, frequency=freq_map[word]))
+# ────────⏱️ Event Loop Lag ────────
+loop_lags = deque(maxlen=LOOP_LAG_SAMPLES)
+loop_lag_task: asyncio.Task = None
 
-    # Sắp xếp theo tần suất
-    word_cloud.sort(key=lambda x: x.frequency, reverse=True)
 
-    return [item.dict() for item in word_cloud]
+async def monitor_loop_lag():
+    """Đo độ trễ giữa thời điểm hẹn đánh thức và thời điểm loop thực sự chạy lại."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lags.append(max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
 
 
 # ────────📤 Inference Call ────────
@@ -61,31 +56,85 @@ def generate_word_cloud(content: str) -> List[Dict[str, Any]]:
     wait=wait_fixed(2),
     retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError))
 )
-async def call_inference(text: str) -> str:
+async def call_inference(texts: List[str]) -> List[str]:
     """
-    Gọi API phân tích cảm xúc (sentiment) từ model server.
+    Gọi API phân tích cảm xúc (sentiment) từ model server cho một chunk văn bản,
+    trả về nhãn theo đúng thứ tự của texts.
     """
+    async with aiohttp_session.post(INFER_URL, json={"text": texts}, timeout=aiohttp.ClientTimeout(total=INFER_TIMEOUT)) as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+    # Model server trả về một object khi request gửi một chuỗi; texts luôn là list nhưng vẫn nhận cả hai dạng
+    if isinstance(data, dict):
+        data = [data]
+    if len(data) != len(texts):
+        raise ValueError(f"expected {len(texts)} predictions, got {len(data)}")
+    return [row.get("predicted_label", "neutral").lower() for row in data]
+
+
+async def infer_chunk(texts: List[str]) -> List[str]:
+    """Retry theo chunk; hết lượt retry thì cả chunk nhận "neutral"."""
     try:
-        async with aiohttp_session.post(INFER_URL, json={"text": text}, timeout=aiohttp.ClientTimeout(total=5)) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                return data.get("predicted_label", "neutral").lower()
+        return await call_inference(texts)
+    except RetryError as e:
+        print(f"[❗] Inference error: {e.last_attempt.exception()}")
     except Exception as e:
         print(f"[❗] Inference error: {e}")
+    return ["neutral"] * len(texts)
 
-    return "neutral"
+
+async def emit_encoded(sid: str, encoded_packet: str):
+    """Gửi packet đã mã hóa bằng encode_event tới một client (như sio.emit(..., to=sid))."""
+    eio_sid = sio.manager.eio_sid_from_sid(sid, "/")
+    if eio_sid is None:
+        print(f"⚠️ Client {sid} disconnected before the result was sent")
+        return
+    await sio.eio.send(eio_sid, encoded_packet)
 
 
 # ────────🚀 FastAPI Events ────────
 @app.on_event("startup")
 async def startup_event():
-    global aiohttp_session
+    global aiohttp_session, cpu_pool, loop_lag_task
     aiohttp_session = aiohttp.ClientSession()
+    # spawn: process con không kế thừa event loop / socket của uvicorn worker
+    cpu_pool = ProcessPoolExecutor(
+        max_workers=CPU_POOL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker
+    )
+    # Khởi động sẵn mọi process (nạp model pyvi) để event đầu tiên không phải chờ
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(cpu_pool, prepare_chunk, []) for _ in range(CPU_POOL_WORKERS)])
+    loop_lag_task = asyncio.create_task(monitor_loop_lag())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    loop_lag_task.cancel()
     await aiohttp_session.close()
+    cpu_pool.shutdown(cancel_futures=True)
+
+
+@app.get("/stats/loop")
+async def loop_stats():
+    """Độ trễ event loop (ms) của uvicorn worker trả lời request này."""
+    lags = sorted(loop_lags)
+
+    def percentile(p):
+        return round(lags[min(len(lags) - 1, int(len(lags) * p))] * 1000, 3) if lags else None
+
+    return {
+        "pid": os.getpid(),
+        "interval_ms": LOOP_LAG_INTERVAL * 1000,
+        "samples": len(lags),
+        "lag_ms": {
+            "p50": percentile(0.5),
+            "p99": percentile(0.99),
+            "max": round(lags[-1] * 1000, 3) if lags else None
+        },
+        "cpu_pool": {"workers": CPU_POOL_WORKERS, "chunk_size": CPU_CHUNK_SIZE}
+    }
 
 
 # ────────⚡ Socket.IO Events ────────
@@ -103,40 +152,28 @@ async def disconnect(sid):
 async def handle_predict(sid, data):
     print("📥 Received 'predict' event")
     items = data.get("data", [])
-    results = []
-
-    async def process_item(item):
-        text = f"{item.get('title', '')} {item.get('description', '')} {item.get('content', '')}"
-        sentiment = await call_inference(text)
-        word_cloud = generate_word_cloud(text)
-
-        return {
-            "id": item.get("id", ""),
-            "topic_name": item.get("topic_name", ""),
-            "topic_id": item.get("topic_id", ""),
-            "title": item.get("title", ""),
-            "content": item.get("content", ""),
-            "description": item.get("description", ""),
-            "site_name": item.get("siteName", ""),
-            "site_id": item.get("siteId", ""),
-            "type": item.get("type", ""),
-            "log_level": None,
-            "reason": "",
-            "input_type": item.get("type", ""),
-            "sentiment": sentiment,
-            "contains_topic": False,
-            "targeting_topic": False,
-            "crisis_keywords": [],
-            "is_kol": item.get("is_kol", False),
-            "total_interactions": item.get("total_interactions", 0),
-            "word_cloud": word_cloud
-        }
-
-    # Parallelize with asyncio
-    tasks = [process_item(item) for item in items]
-    results = await asyncio.gather(*tasks)
-
-    await sio.emit("result", {"results": results}, to=sid)
+
+    # Word cloud và dựng kết quả chạy trong process pool theo từng chunk
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(*[
+        loop.run_in_executor(cpu_pool, prepare_chunk, items[start:start + CPU_CHUNK_SIZE])
+        for start in range(0, len(items), CPU_CHUNK_SIZE)
+    ])
+    texts = [text for chunk_texts, _ in chunks for text in chunk_texts]
+    results = [result for _, chunk_results in chunks for result in chunk_results]
+
+    # Mỗi chunk INFER_BATCH_SIZE văn bản là một request, các chunk chạy song song
+    chunk_sentiments = await asyncio.gather(*[
+        infer_chunk(texts[start:start + INFER_BATCH_SIZE])
+        for start in range(0, len(texts), INFER_BATCH_SIZE)
+    ])
+    sentiments = [sentiment for chunk in chunk_sentiments for sentiment in chunk]
+    for result, sentiment in zip(results, sentiments):
+        result["sentiment"] = sentiment
+
+    # Payload vài MB: mã hóa JSON trong process pool, event loop chỉ gửi chuỗi đã mã hóa
+    encoded_packet = await loop.run_in_executor(cpu_pool, encode_event, "result", {"results": results})
+    await emit_encoded(sid, encoded_packet)
 
 
 # ────────▶️ Main ────────
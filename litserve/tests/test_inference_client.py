@@ -0,0 +1,94 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from tenacity import wait_none
+
+import socket_server
+
+
+def _label(text):
+    return {"predicted_label": "Negative" if "tệ" in text else "Positive"}
+
+
+def _run(monkeypatch, handler, scenario):
+    """Chạy scenario() với model server giả (handler cho POST /predict) và aiohttp_session thật."""
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/predict", handler)
+        server = TestServer(app)
+        await server.start_server()
+        monkeypatch.setattr(socket_server, "INFER_URL", str(server.make_url("/predict")))
+        monkeypatch.setattr(socket_server, "aiohttp_session", aiohttp.ClientSession())
+        try:
+            return await scenario()
+        finally:
+            await socket_server.aiohttp_session.close()
+            await server.close()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(socket_server.call_inference.retry, "wait", wait_none())
+
+
+def test_call_inference_posts_one_list_request_per_chunk(monkeypatch):
+    requests = []
+
+    async def predict(request):
+        texts = (await request.json())["text"]
+        requests.append(texts)
+        return web.json_response([_label(text) for text in texts])
+
+    labels = _run(monkeypatch, predict, lambda: socket_server.call_inference(["rất tệ", "tốt", "tệ quá"]))
+    assert labels == ["negative", "positive", "negative"]
+    assert requests == [["rất tệ", "tốt", "tệ quá"]]
+
+
+def test_call_inference_accepts_single_object_response(monkeypatch):
+    async def predict(request):
+        return web.json_response({"predicted_label": "Neutral"})
+
+    assert _run(monkeypatch, predict, lambda: socket_server.call_inference(["một văn bản"])) == ["neutral"]
+
+
+def test_infer_chunk_retries_server_errors(monkeypatch):
+    attempts = []
+
+    async def predict(request):
+        attempts.append(1)
+        if len(attempts) < 3:
+            return web.Response(status=503)
+        texts = (await request.json())["text"]
+        return web.json_response([_label(text) for text in texts])
+
+    assert _run(monkeypatch, predict, lambda: socket_server.infer_chunk(["tệ", "tốt"])) == ["negative", "positive"]
+    assert len(attempts) == 3
+
+
+def test_infer_chunk_falls_back_to_neutral_after_retries(monkeypatch):
+    attempts = []
+
+    async def predict(request):
+        attempts.append(1)
+        return web.Response(status=500)
+
+    assert _run(monkeypatch, predict, lambda: socket_server.infer_chunk(["a", "b"])) == ["neutral", "neutral"]
+    assert len(attempts) == 3
+
+
+def test_infer_chunk_rejects_wrong_number_of_predictions_without_retry(monkeypatch):
+    attempts = []
+
+    async def predict(request):
+        attempts.append(1)
+        return web.json_response([{"predicted_label": "Negative"}])
+
+    assert _run(monkeypatch, predict, lambda: socket_server.infer_chunk(["a", "b"])) == ["neutral", "neutral"]
+    # ValueError không phải lỗi mạng: không retry
+    assert len(attempts) == 1
@@ -0,0 +1,70 @@
+import pytest
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+import server
+from server import BERTLitAPI
+
+
+@pytest.fixture
+def api(monkeypatch, tiny_model_dir):
+    """BERTLitAPI đã setup với model nhỏ thay cho model trên Hub."""
+    tokenizer = AutoTokenizer.from_pretrained(tiny_model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(tiny_model_dir)
+    monkeypatch.setattr(server.AutoTokenizer, "from_pretrained", lambda name: tokenizer)
+    monkeypatch.setattr(server.AutoModelForSequenceClassification, "from_pretrained", lambda name: model)
+    lit_api = BERTLitAPI(max_batch_size=server.MAX_BATCH_SIZE, batch_timeout=server.BATCH_TIMEOUT)
+    lit_api.setup("cpu")
+    return lit_api
+
+
+def test_setup_rejects_unknown_aggregation(monkeypatch):
+    monkeypatch.setattr(server, "LONG_DOC_AGGREGATION", "average")
+    with pytest.raises(ValueError, match="average"):
+        BERTLitAPI().setup("cpu")
+
+
+def _respond(api, request):
+    return api.encode_response(api.predict(api.decode_request(request)))
+
+
+def test_batching_is_configured_on_the_api(api):
+    # Mặc định bật batching (max_batch_size=1 khiến litserve bỏ qua batch/unbatch)
+    assert (api.max_batch_size, api.batch_timeout) == (8, 0.005)
+    assert api.id2label == {0: "Negative", 1: "Neutral", 2: "Positive"}
+
+
+def test_single_string_gets_an_object_and_list_gets_a_list(api):
+    single = _respond(api, {"text": "sản phẩm tốt"})
+    assert isinstance(single, dict)
+    assert single["predicted_label"] in {"Negative", "Neutral", "Positive"}
+    assert set(single["all_probs"]) == {"Negative", "Neutral", "Positive"}
+
+    [one] = _respond(api, {"text": ["sản phẩm tốt"]})
+    assert one == single
+    assert len(_respond(api, {"text": ["tốt", "rất tệ", "dịch vụ chậm quá"]})) == 3
+
+
+def test_batch_and_unbatch_match_unbatched_requests(api):
+    requests = [
+        {"text": "sản phẩm rất tốt"},
+        {"text": ["tệ", "khách hàng phàn nàn dịch vụ chậm quá", "lỗi"]},
+        {"text": ["rất tốt"]},
+    ]
+    # Mỗi request trong batch giữ dạng response của riêng nó
+    shapes = [dict, list, list]
+    batch = api.batch([api.decode_request(request) for request in requests])
+    assert batch["num_docs"] == 5
+    assert batch["request_docs"] == [1, 3, 1]
+    assert batch["single_text"] == [True, False, False]
+    assert list(batch["doc_index"]) == [0, 1, 2, 3, 4]
+
+    outputs = api.unbatch(api.predict(batch))
+    assert len(outputs) == 3
+    for request, output, shape in zip(requests, outputs, shapes):
+        batched = api.encode_response(output)
+        alone = _respond(api, request)
+        assert isinstance(batched, shape) and isinstance(alone, shape)
+        if shape is dict:
+            batched, alone = [batched], [alone]
+        assert [row["predicted_class"] for row in batched] == [row["predicted_class"] for row in alone]
+        assert [row["confidence"] for row in batched] == pytest.approx([row["confidence"] for row in alone], abs=1e-5)
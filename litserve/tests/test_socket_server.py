@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from socketio import packet
+
+import preprocess
+import socket_server
+from preprocess import build_text, encode_event, prepare_chunk
+
+ITEM = {
+    "id": "1",
+    "topic_name": "Vinamilk",
+    "topic_id": "t1",
+    "type": "NEWS_TOPIC",
+    "siteId": "s1",
+    "siteName": "baomoi",
+    "title": "Khách hàng phản ánh",
+    "description": "",
+    "content": "Ngân hàng hoàn tiền chậm, khách hàng bức xúc",
+    "is_kol": True,
+    "total_interactions": 5,
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def word_cloud_engine():
+    preprocess.init_worker()
+
+
+def test_build_text_matches_the_model_input_format():
+    # Văn bản gửi model giữ nguyên như trước (không chuẩn hóa Unicode / khoảng trắng)
+    assert build_text(ITEM) == "Khách hàng phản ánh  Ngân hàng hoàn tiền chậm, khách hàng bức xúc"
+    assert build_text({"title": " A ", "content": "B\n"}) == " A   B\n"
+
+
+def test_prepare_chunk_returns_texts_and_results_without_sentiment():
+    texts, results = prepare_chunk([ITEM, {}])
+    assert texts == [build_text(ITEM), "  "]
+
+    result = results[0]
+    assert result["sentiment"] is None
+    assert (result["site_name"], result["site_id"], result["input_type"]) == ("baomoi", "s1", "NEWS_TOPIC")
+    assert result["word_cloud"][0] == {"word": "khách_hàng", "frequency": 2}
+    assert results[1]["id"] == "" and results[1]["word_cloud"] == []
+    assert prepare_chunk([]) == ([], [])
+
+
+def _decode(encoded_packet):
+    # Event ở namespace mặc định: "2" + JSON của [event, data]
+    assert encoded_packet.startswith('2["')
+    return packet.Packet(encoded_packet=encoded_packet).data
+
+
+def test_encode_event_matches_socketio_emit_packet():
+    data = {"results": [{"sentiment": "negative", "title": "Giá vé tăng 😡"}]}
+    encoded_packet = encode_event("result", data)
+    assert encoded_packet == packet.Packet(packet.EVENT, namespace="/", data=["result", data]).encode()
+    assert _decode(encoded_packet) == ["result", data]
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Packet gửi qua engine.io theo eio sid, kèm thread đã mã hóa JSON."""
+    sent = []
+    encoder_threads = []
+    dumps = packet.Packet.json.dumps
+
+    class RecordingJSON:
+        loads = staticmethod(packet.Packet.json.loads)
+
+        @staticmethod
+        def dumps(*args, **kwargs):
+            encoder_threads.append(threading.get_ident())
+            return dumps(*args, **kwargs)
+
+    async def fake_send(eio_sid, encoded_packet):
+        sent.append((eio_sid, encoded_packet))
+
+    monkeypatch.setattr(packet.Packet, "json", RecordingJSON)
+    monkeypatch.setattr(socket_server.sio.manager, "eio_sid_from_sid", lambda sid, namespace: f"eio-{sid}")
+    monkeypatch.setattr(socket_server.sio.eio, "send", fake_send)
+    return sent, encoder_threads
+
+
+def test_handle_predict_emits_results_in_order(monkeypatch, sent):
+    sent, encoder_threads = sent
+    calls = []
+
+    async def fake_infer_chunk(texts):
+        calls.append(len(texts))
+        return ["negative" if "chậm" in text else "neutral" for text in texts]
+
+    monkeypatch.setattr(socket_server, "infer_chunk", fake_infer_chunk)
+    monkeypatch.setattr(socket_server, "CPU_CHUNK_SIZE", 2)
+    monkeypatch.setattr(socket_server, "INFER_BATCH_SIZE", 3)
+
+    items = [dict(ITEM, id=str(i), content="" if i % 2 else ITEM["content"]) for i in range(5)]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        monkeypatch.setattr(socket_server, "cpu_pool", pool)
+        asyncio.run(socket_server.handle_predict("sid-1", {"data": items}))
+
+    assert calls == [3, 2]
+    [(eio_sid, encoded_packet)] = sent
+    assert eio_sid == "eio-sid-1"
+    event, data = _decode(encoded_packet)
+    assert event == "result"
+    assert [result["id"] for result in data["results"]] == ["0", "1", "2", "3", "4"]
+    assert [result["sentiment"] for result in data["results"]] == ["negative", "neutral", "negative", "neutral", "negative"]
+    # Thứ tự khóa giữ như payload gốc: "sentiment" đứng sau "input_type"
+    keys = list(data["results"][0])
+    assert keys.index("sentiment") == keys.index("input_type") + 1
+    # Payload được mã hóa trong pool, không phải trên thread của event loop
+    assert encoder_threads and threading.get_ident() not in encoder_threads
+
+
+def test_handle_predict_with_no_items(monkeypatch, sent):
+    sent, _ = sent
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        monkeypatch.setattr(socket_server, "cpu_pool", pool)
+        asyncio.run(socket_server.handle_predict("sid-1", {}))
+    assert [_decode(encoded_packet) for _, encoded_packet in sent] == [["result", {"results": []}]]
+
+
+def test_result_for_disconnected_client_is_dropped(monkeypatch, sent):
+    sent, _ = sent
+    monkeypatch.setattr(socket_server.sio.manager, "eio_sid_from_sid", lambda sid, namespace: None)
+    asyncio.run(socket_server.emit_encoded("gone", encode_event("result", {"results": []})))
+    assert sent == []
+
+
+def test_large_event_does_not_stall_the_loop(monkeypatch, sent):
+    """Với process pool thật, độ trễ lớn nhất của loop nhỏ hơn khi tự mã hóa payload trên loop."""
+    sent, _ = sent
+    long_item = dict(ITEM, content=ITEM["content"] * 60)
+    items = [dict(long_item, id=str(i)) for i in range(500)]
+
+    async def fake_infer_chunk(texts):
+        return ["negative"] * len(texts)
+
+    monkeypatch.setattr(socket_server, "infer_chunk", fake_infer_chunk)
+
+    async def max_lag(work):
+        loop = asyncio.get_running_loop()
+        lags, done = [], asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                started = loop.time()
+                await asyncio.sleep(0.001)
+                lags.append(loop.time() - started - 0.001)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0.01)
+        await work()
+        done.set()
+        await task
+        return max(lags)
+
+    async def scenario():
+        await socket_server.startup_event()
+        try:
+            offloaded = await max_lag(lambda: socket_server.handle_predict("sid-1", {"data": items}))
+            _, data = _decode(sent[0][1])
+
+            async def encode_on_loop():
+                encode_event("result", data)
+
+            inline = await max_lag(encode_on_loop)
+        finally:
+            await socket_server.shutdown_event()
+        return offloaded, inline, data
+
+    offloaded, inline, data = asyncio.run(scenario())
+    assert len(data["results"]) == 500
+    assert offloaded < inline
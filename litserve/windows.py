@@ -0,0 +1,79 @@
+import numpy as np
+
+# Bản giống hệt nằm ở app/windows.py và litserve/windows.py: mỗi service build image chỉ từ thư mục
+# của nó (COPY app/, COPY litserve/) nên không import chung được; app/tests/test_shared_modules.py
+# kiểm tra hai bản luôn giống nhau.
+
+AGGREGATIONS = ("max_negative", "mean")
+
+
+def check_aggregation(rule):
+    """Kiểm tra LONG_DOC_AGGREGATION lúc khởi động, không để giá trị gõ sai âm thầm thành mean."""
+    if rule not in AGGREGATIONS:
+        raise ValueError(f"Unknown long-document aggregation: {rule} (expected one of {AGGREGATIONS})")
+    return rule
+
+
+def special_tokens(tokenizer):
+    """
+    Special token bao quanh một câu (ví dụ [CLS] ... [SEP] hoặc <s> ... </s>),
+    lấy từ kết quả tokenize chuỗi rỗng.
+    """
+    wrapped = tokenizer("", add_special_tokens=True)["input_ids"]
+    return wrapped[:1], wrapped[1:]
+
+
+def split_windows(input_ids, prefix, suffix, window_tokens, overlap, max_windows):
+    """
+    Cắt input_ids (chưa có special token) thành các window chồng lấn nhau `overlap` token,
+    mỗi window được bọc bởi prefix / suffix.
+    Nếu số window vượt max_windows thì lấy các window rải đều trên toàn văn bản.
+    """
+    if len(input_ids) <= window_tokens:
+        starts = [0]
+    else:
+        step = max(1, window_tokens - overlap)
+        last_start = len(input_ids) - window_tokens
+        starts = list(range(0, last_start, step)) + [last_start]
+        if len(starts) > max_windows:
+            if max_windows == 1:
+                starts = [0]
+            else:
+                starts = [starts[round(i * (len(starts) - 1) / (max_windows - 1))] for i in range(max_windows)]
+    return [prefix + input_ids[start:start + window_tokens] + suffix for start in starts]
+
+
+def encode_documents(texts, tokenizer, long_doc=False, window_tokens=256, overlap=64, max_windows=8, max_length=512):
+    """
+    Tokenize từng văn bản thành list window input_ids.
+    Mặc định (long_doc=False) mỗi văn bản là một window, cắt ở max_length như trước.
+    """
+    if not long_doc:
+        return [[ids] for ids in tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]]
+
+    prefix, suffix = special_tokens(tokenizer)
+    window_tokens = min(window_tokens, max_length - len(prefix) - len(suffix))
+    raw_ids = tokenizer(texts, add_special_tokens=False)["input_ids"]
+    return [split_windows(ids, prefix, suffix, window_tokens, overlap, max_windows) for ids in raw_ids]
+
+
+def aggregate_windows(window_scores, doc_index, window_lengths, num_docs, rule="max_negative", negative_index=None):
+    """
+    Gộp xác suất của các window thành xác suất của từng văn bản.
+    - max_negative: lấy window có xác suất tiêu cực cao nhất (không bỏ sót đoạn tiêu cực).
+    - mean: trung bình có trọng số theo số token của window.
+    max_negative khi model không có nhãn tiêu cực (negative_index=None) cũng dùng mean.
+    """
+    check_aggregation(rule)
+    if len(window_scores) == num_docs:
+        return window_scores
+
+    if rule == "max_negative" and negative_index is not None:
+        order = np.lexsort((-window_scores[:, negative_index], doc_index))
+        _, first = np.unique(doc_index[order], return_index=True)
+        return window_scores[order[first]]
+
+    weights = np.asarray(window_lengths, dtype=np.float64)
+    sums = np.zeros((num_docs, window_scores.shape[1]))
+    np.add.at(sums, doc_index, window_scores * weights[:, None])
+    return sums / np.bincount(doc_index, weights=weights, minlength=num_docs)[:, None]
@@ -1,7 +1,92 @@
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, List
+
 from aiocache import Cache
+from aiocache.serializers import BaseSerializer
 from app.settings import Settings
+from app.llm import router, build_targeting_prompt, build_batch_targeting_prompt
 
 settings = Settings()
 
 
-cache = Cache(Cache.REDIS, endpoint=settings.REDIS_HOST, port=6379, namespace="buzz-cache", ttl=3600)
+class CompressedJsonSerializer(BaseSerializer):
+    """JSON nén zlib: kết quả lọc có nhiều trường text, nén giảm đáng kể bộ nhớ Redis."""
+
+    DEFAULT_ENCODING = None
+
+    def dumps(self, value: Any) -> bytes:
+        return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def loads(self, value: bytes) -> Any:
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(value).decode("utf-8"))
+
+
+def cache_version() -> str:
+    """
+    Phiên bản cache theo prompt và các model đang bật: đổi prompt hoặc model thì các key cũ không còn được đọc.
+    Thứ tự provider không tính vào vì provider trả lời được chọn theo latency.
+    """
+    fingerprint = "\n".join([
+        *sorted(provider.model for provider in router.providers),
+        build_targeting_prompt({}),
+        build_batch_targeting_prompt([], "")
+    ])
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+
+
+CACHE_VERSION = cache_version()
+
+cache = Cache(
+    Cache.REDIS,
+    endpoint=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    namespace=f"buzz-cache:{CACHE_VERSION}",
+    ttl=settings.FILTER_CACHE_TTL,
+    serializer=CompressedJsonSerializer()
+)
+
+# Thống kê L2 của process này
+l2_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+async def get_many(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Đọc nhiều key bằng một lệnh MGET; lỗi Redis được coi như miss."""
+    if not keys or not settings.REDIS_CACHE_ENABLED:
+        return {}
+    try:
+        values = await cache.multi_get(keys)
+    except Exception as e:
+        print(f"⚠️ Redis cache read error: {e}")
+        l2_stats["errors"] += 1
+        return {}
+
+    found = {key: value for key, value in zip(keys, values) if value is not None}
+    l2_stats["hits"] += len(found)
+    l2_stats["misses"] += len(keys) - len(found)
+    return found
+
+
+async def set_many(items: Dict[str, Dict[str, Any]]) -> None:
+    """Ghi nhiều key (MSET + EXPIRE trong một transaction)."""
+    if not items or not settings.REDIS_CACHE_ENABLED:
+        return
+    try:
+        await cache.multi_set(list(items.items()))
+    except Exception as e:
+        print(f"⚠️ Redis cache write error: {e}")
+        l2_stats["errors"] += 1
+
+
+async def clear() -> None:
+    """Xóa các key của phiên bản cache hiện tại (không truyền namespace thì aiocache sẽ FLUSHDB)."""
+    if not settings.REDIS_CACHE_ENABLED:
+        return
+    try:
+        await cache.clear(namespace=cache.namespace)
+    except Exception as e:
+        print(f"⚠️ Redis cache clear error: {e}")
+        l2_stats["errors"] += 1
@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, Optional
 from app.llm import check_targeting_topic
 
 array_type_comment = [
@@ -13,9 +13,16 @@ array_type_post = [
     "linkedinTopic", "ecommerceTopic", "threadsTopic"
 ]
 
-async def filter_negative_content(data_input: Dict, result: Dict) -> Dict:
+def needs_topic_analysis(data_input: Dict) -> bool:
+    """
+    Bài đăng (post) cần gọi LLM kiểm tra có nhắm vào chủ đề hay không.
+    """
+    return data_input.get('type', '') in array_type_post
+
+async def filter_negative_content(data_input: Dict, result: Dict, topic_analysis: Optional[Dict] = None) -> Dict:
     """
     Hàm lọc nội dung tiêu cực, chỉ gọi khi sentiment là negative.
+    topic_analysis: kết quả LLM đã có sẵn (ví dụ từ check_targeting_topics cho cả batch), None thì tự gọi.
     """
     input_type = data_input.get('type', '')
     is_kol = data_input.get("is_kol", False)
@@ -27,7 +34,8 @@ async def filter_negative_content(data_input: Dict, result: Dict) -> Dict:
         "targeting_topic": False,
         "crisis_keywords": [],
         "log_level": 2,
-        "should_call_llm": False
+        "should_call_llm": False,
+        "failed": False
     })
 
     # Level 1: Bình luận tiêu cực
@@ -43,11 +51,13 @@ async def filter_negative_content(data_input: Dict, result: Dict) -> Dict:
     if input_type in array_type_post:
         result["should_call_llm"] = True
         try:
-            topic_analysis = await check_targeting_topic(data_input)
+            if topic_analysis is None:
+                topic_analysis = await check_targeting_topic(data_input)
         except Exception as e:
             result.update({
                 "reason": f"Lỗi khi gọi LLM: {str(e)}",
-                "log_level": 2
+                "log_level": 2,
+                "failed": True
             })
             return result
 
@@ -60,7 +70,9 @@ async def filter_negative_content(data_input: Dict, result: Dict) -> Dict:
             "contains_topic": contains_topic,
             "targeting_topic": targeting_topic,
             "crisis_keywords": crisis_keywords,
-            "reason": reason
+            "reason": reason,
+            # Lỗi tạm thời (LLM lỗi / timeout): trả về cho request này nhưng không cache
+            "failed": topic_analysis.get("failed", False)
         })
 
         # Level 3: targeting + crisis keywords + high impact
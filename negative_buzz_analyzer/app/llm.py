@@ -1,116 +1,195 @@
-import json
+import asyncio
+import time
 import httpx
-from typing import Dict, List
+import redis.asyncio as aioredis
+from typing import Dict, List, Optional, Tuple
 from app.settings import Settings
+from app.rate_limiter import AsyncRateLimiter, estimate_tokens, parse_retry_after
+from app.providers import (
+    LLMProvider, ProviderRouter, RequestTimer, create_providers, build_targeting_prompt, build_batch_targeting_prompt,
+    parse_targeting_output, parse_batch_output
+)
+from app import providers
+from app.topic_matcher import TopicPrefilter, not_mentioned_verdict
 
 settings = Settings()
 
-async def check_targeting_topic(data: dict) -> dict:
-    topic = data.get("topic_name", "")
-    combined_text = " ".join([
-        f"Title: {data.get('title', '')}",
-        f"Description: {data.get('description', '')}",
-        f"Content: {data.get('content', '')}"
-    ])
-
-    prompt = f"""
-    Bạn là một chuyên gia phân tích nội dung mạng xã hội trong lĩnh vực truyền thông khủng hoảng.
-
-    Dưới đây là một nội dung có sắc thái tiêu cực, bao gồm tiêu đề, mô tả và nội dung:
-
-    {combined_text}
-
-    Chủ đề cần kiểm tra là: "{topic}"
-
-    Nhiệm vụ:
-    1. Kiểm tra xem nội dung có **nhắc đến** chủ đề không?
-    2. Nếu có, nội dung có đang **nhắm vào**, **công kích**, hoặc **quy trách nhiệm tiêu cực** cho chủ đề không?
-    3. Nếu targeting_topic = true, hãy **trích xuất danh sách các từ/cụm từ tiêu cực có thể gây khủng hoảng**. Mỗi phần tử trong danh sách phải là:
-      - Từ đơn (ví dụ: "lừa đảo")
-      - Từ đôi (ví dụ: "mất tiền")
-      - Tối đa 3 từ (ví dụ: "không hoàn tiền")
-      - Tuyệt đối không phải là câu dài hay mô tả.
-
-    Trả về JSON hợp lệ với cấu trúc sau:
-    {{
-      "contains_topic": true/false,
-      "targeting_topic": true/false,
-      "reason": "giải thích ngắn gọn (1 câu)",
-      "crisis_keywords": ["từ khóa 1", "từ khóa 2", ...]
-    }}
-
-    ⚠️ Ghi nhớ:
-    - Nếu chỉ nhắc chủ đề trong hashtag hoặc không liên quan trực tiếp tới hành vi tiêu cực → targeting_topic = false.
-    - Nếu targeting_topic = false thì crisis_keywords là mảng rỗng []
-    - Luôn đảm bảo crisis_keywords là list, các phần tử không dài quá 3 từ.
-
-    Chỉ trả về JSON hợp lệ. Không ghi thêm bất kỳ văn bản nào khác.
+# Provider được bật theo LLM_PROVIDERS (thứ tự ưu tiên) và có API key
+router = ProviderRouter(
+    create_providers(
+        [name.strip() for name in settings.LLM_PROVIDERS.split(",") if name.strip()],
+        {"fireworks": settings.FIREWORKS_API_KEY, "gemini": settings.GEMINI_API_KEY}
+    ),
+    hedge=settings.LLM_HEDGE_ENABLED,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    hedge_max_delay=settings.LLM_HEDGE_MAX_DELAY,
+    max_failures=settings.LLM_PROVIDER_MAX_FAILURES,
+    cooldown=settings.LLM_PROVIDER_COOLDOWN
+)
+
+# Bỏ qua LLM với bài không nhắc tới chủ đề / alias (None nếu tắt)
+prefilter: Optional[TopicPrefilter] = TopicPrefilter() if settings.LLM_PREFILTER_ENABLED else None
+
+# Một client dùng chung cho cả process (HTTP/2 + keep-alive), tạo / đóng trong lifespan của app
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_rate_limiters: Dict[str, AsyncRateLimiter] = {}
+
+def create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=settings.LLM_HTTP2,
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+        )
+    )
+
+async def start_client() -> None:
+    global _client, _semaphore
+    if _client is None:
+        _client = create_client()
+    _semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def rate_limits(name: str) -> Tuple[int, int]:
+    """(request/phút, token/phút) theo quota của từng provider"""
+    return {
+        "gemini": (settings.LLM_GEMINI_REQUESTS_PER_MINUTE, settings.LLM_GEMINI_TOKENS_PER_MINUTE),
+        "fireworks": (settings.LLM_FIREWORKS_REQUESTS_PER_MINUTE, settings.LLM_FIREWORKS_TOKENS_PER_MINUTE),
+    }[name]
+
+def get_rate_limiter(name: str) -> Optional[AsyncRateLimiter]:
+    """Token bucket của provider, dùng chung giữa mọi worker / replica qua Redis (None nếu tắt)"""
+    if name not in _rate_limiters and settings.LLM_RATE_LIMIT_ENABLED:
+        _rate_limiters[name] = AsyncRateLimiter(
+            aioredis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT),
+            name,
+            *rate_limits(name),
+            settings.LLM_RATE_LIMIT_MAX_WAIT
+        )
+    return _rate_limiters.get(name)
+
+def get_client() -> httpx.AsyncClient:
+    """Client dùng chung; tự tạo nếu chưa gọi start_client (ví dụ khi dùng ngoài FastAPI)"""
+    global _client, _semaphore
+    if _client is None:
+        _client = create_client()
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+    return _client
+
+async def post_llm(provider: LLMProvider, prompt: str, timer: Optional[RequestTimer] = None) -> str:
+    """
+    Gửi prompt tới một provider qua client dùng chung, trả về nội dung text của câu trả lời.
+    Chờ rate limiter của provider trước mỗi lần gọi; 429 được gọi lại sau Retry-After (tối đa LLM_MAX_RETRIES lần).
+    timer chỉ đo thời gian HTTP (không tính chờ rate limiter / semaphore / Retry-After).
+    """
+    timer = timer or RequestTimer()
+    client = get_client()
+    limiter = get_rate_limiter(provider.name)
+    url, headers, payload = provider.build_request(prompt)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        if limiter is not None:
+            await limiter.acquire(estimate_tokens(prompt))
+        async with _semaphore:
+            with timer.measure():
+                response = await client.post(url, headers=headers, json=payload)
+            if response.status_code != 429 or attempt == settings.LLM_MAX_RETRIES:
+                response.raise_for_status()
+
+        if response.status_code == 429:
+            delay = parse_retry_after(response.headers.get("Retry-After"), default=2 ** attempt)
+            if limiter is not None:
+                await limiter.penalize(delay)
+            else:
+                await asyncio.sleep(delay)
+            continue
+        return provider.extract_text(response.json())
+
+async def call_llm(prompt: str) -> str:
+    """
+    Gọi provider nhanh nhất còn khỏe (theo p50); nếu quá p95 vẫn chưa xong thì gửi thêm
+    tới provider thứ hai, lấy kết quả về trước và hủy request còn lại.
     """
+    content, _ = await router.complete(prompt, post_llm)
+    return content
 
-    messages = [
-        {"role": "user", "content": prompt.strip()}
-    ]
+def get_stats() -> dict:
+    return {**router.get_stats(), "prefilter": prefilter.get_stats() if prefilter is not None else None}
+
+def prefilter_verdict(data: dict) -> Optional[dict]:
+    """Kết quả tại chỗ nếu bài không nhắc tới chủ đề (tên / topic_aliases); None nếu cần gọi LLM."""
+    if prefilter is None:
+        return None
+    text = " ".join([data.get("title") or "", data.get("description") or "", data.get("content") or ""])
+    if prefilter.mentions_topic(data, text):
+        return None
+    return not_mentioned_verdict()
 
-    headers = {
-        "Authorization": f"Bearer {settings.FIREWORKS_API_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "fireworks-playground": "true",
-    }
-
-    payload = {
-        "model": "accounts/fireworks/models/llama4-scout-instruct-basic",
-        "messages": messages,
-        "max_tokens": 4096,
-        "temperature": 0.6,
-        "top_p": 1,
-        "top_k": 40,
-        "n": 1,
-        "presence_penalty": 0,
-        "frequency_penalty": 0,
-        "stream": False,
-        "echo": False,
-        "logprobs": True
-    }
+def error_verdict(e: Exception) -> dict:
+    """Verdict mặc định khi gọi LLM lỗi; failed=True để kết quả không bị ghi vào cache."""
+    return {**providers.error_verdict(e), "failed": True}
+
+async def check_targeting_topic(data: dict) -> dict:
+    verdict = prefilter_verdict(data)
+    if verdict is not None:
+        return verdict
+    return await _check_single(data)
 
+async def _check_single(data: dict) -> dict:
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                "https://api.fireworks.ai/inference/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            content = response.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-
-            json_start = content.find("{")
-            json_end = content.rfind("}") + 1
-            json_str = content[json_start:json_end]
-            result = json.loads(json_str)
-
-            default_result = {
-                "contains_topic": False,
-                "targeting_topic": False,
-                "reason": "Không xác định hoặc lỗi đầu ra.",
-                "crisis_keywords": []
-            }
-
-            for key in default_result:
-                if key not in result:
-                    result[key] = default_result[key]
-
-            result["contains_topic"] = bool(result["contains_topic"])
-            result["targeting_topic"] = bool(result["targeting_topic"])
-            result["reason"] = str(result["reason"])
-            if not isinstance(result.get("crisis_keywords", []), list):
-                result["crisis_keywords"] = []
-
-            return result
+        content = await call_llm(build_targeting_prompt(data))
+        return parse_targeting_output(content)
 
     except Exception as e:
-        return {
-            "contains_topic": False,
-            "targeting_topic": False,
-            "reason": f"Lỗi xử lý từ Fireworks: {str(e)}",
-            "crisis_keywords": []
-        }
+        return error_verdict(e)
+
+async def _check_chunk(chunk: List[dict]) -> List[Optional[dict]]:
+    """Một request cho cả chunk (cùng chủ đề); None cho phần tử thiếu hoặc sai schema."""
+    items = [(str(number), data) for number, data in enumerate(chunk, start=1)]
+    try:
+        content = await call_llm(build_batch_targeting_prompt(items, chunk[0].get("topic_name", "")))
+        verdicts = parse_batch_output(content)
+    except Exception as e:
+        print(f"⚠️ Batched LLM call failed ({len(chunk)} items): {e}")
+        verdicts = {}
+    return [verdicts.get(item_id) for item_id, _ in items]
+
+async def check_targeting_topics(items: List[dict]) -> List[dict]:
+    """
+    Phiên bản batch của check_targeting_topic: gộp tối đa LLM_BATCH_SIZE bài cùng chủ đề
+    vào một prompt, chỉ gọi lại từng bài với các phần tử không đọc được.
+    Bài không nhắc tới chủ đề có kết quả ngay, không gửi lên LLM.
+    Trả về list verdict theo thứ tự đầu vào.
+    """
+    verdicts: List[Optional[dict]] = [prefilter_verdict(data) for data in items]
+    groups: Dict[str, List[int]] = {}
+    for i, data in enumerate(items):
+        if verdicts[i] is None:
+            groups.setdefault(data.get("topic_name", ""), []).append(i)
+
+    chunks = [
+        indexes[start:start + settings.LLM_BATCH_SIZE]
+        for indexes in groups.values()
+        for start in range(0, len(indexes), settings.LLM_BATCH_SIZE)
+    ]
+
+    batched = [chunk for chunk in chunks if len(chunk) > 1]
+    chunk_results = await asyncio.gather(*[_check_chunk([items[i] for i in chunk]) for chunk in batched])
+    for chunk, results in zip(batched, chunk_results):
+        for i, verdict in zip(chunk, results):
+            verdicts[i] = verdict
+
+    # Bài lẻ và phần tử lỗi: gọi từng bài như trước
+    retry_indexes = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    retries = await asyncio.gather(*[_check_single(items[i]) for i in retry_indexes])
+    for i, verdict in zip(retry_indexes, retries):
+        verdicts[i] = verdict
+    return verdicts
@@ -0,0 +1,448 @@
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Tầng provider LLM dùng chung (Gemini / Fireworks): prompt, parse kết quả,
+# latency từng provider, chọn provider nhanh nhất còn khỏe và gửi request dự phòng (hedge).
+# Bản giống hệt nằm ở app/providers.py và negative_buzz_analyzer/app/providers.py: hai service build
+# image riêng (COPY app/, COPY negative_buzz_analyzer/) nên không import chung được;
+# app/tests/test_shared_modules.py kiểm tra hai bản luôn giống nhau.
+# Transport HTTP (aiohttp / requests / httpx) do từng service cung cấp.
+
+
+def build_combined_text(data):
+    return " ".join([
+        f"Title: {data.get('title', '')}",
+        f"Description: {data.get('description', '')}",
+        f"Content: {data.get('content', '')}"
+    ])
+
+
+def build_targeting_prompt(data):
+    topic = data.get("topic_name", "")
+    combined_text = build_combined_text(data)
+
+    prompt = f"""
+    Bạn là một chuyên gia phân tích nội dung mạng xã hội trong lĩnh vực truyền thông khủng hoảng.
+
+    Dưới đây là một nội dung có sắc thái tiêu cực, bao gồm tiêu đề, mô tả và nội dung:
+
+    {combined_text}
+
+    Chủ đề cần kiểm tra là: "{topic}"
+
+    Nhiệm vụ:
+    1. Kiểm tra xem nội dung có **nhắc đến** chủ đề không?
+    2. Nếu có, nội dung có đang **nhắm vào**, **công kích**, hoặc **quy trách nhiệm tiêu cực** cho chủ đề không?
+    3. Nếu targeting_topic = true, hãy **trích xuất danh sách các từ/cụm từ tiêu cực có thể gây khủng hoảng**. Mỗi phần tử trong danh sách phải là:
+      - Từ đơn (ví dụ: "lừa đảo")
+      - Từ đôi (ví dụ: "mất tiền")
+      - Tối đa 3 từ (ví dụ: "không hoàn tiền")
+      - Tuyệt đối không phải là câu dài hay mô tả.
+
+    Trả về JSON hợp lệ với cấu trúc sau:
+    {{
+      "contains_topic": true/false,
+      "targeting_topic": true/false,
+      "reason": "giải thích ngắn gọn (1 câu)",
+      "crisis_keywords": ["từ khóa 1", "từ khóa 2", ...]
+    }}
+
+    ⚠️ Ghi nhớ:
+    - Nếu chỉ nhắc chủ đề trong hashtag hoặc không liên quan trực tiếp tới hành vi tiêu cực → targeting_topic = false.
+    - Nếu targeting_topic = false thì crisis_keywords là mảng rỗng []
+    - Luôn đảm bảo crisis_keywords là list, các phần tử không dài quá 3 từ.
+
+    Chỉ trả về JSON hợp lệ. Không ghi thêm bất kỳ văn bản nào khác.
+    """
+    return prompt.strip()
+
+
+def build_batch_targeting_prompt(items, topic):
+    """Prompt gộp nhiều bài cùng chủ đề, mỗi bài có id riêng; phần hướng dẫn chỉ gửi một lần."""
+    posts = "\n\n".join(f"[id: {item_id}]\n{build_combined_text(data)}" for item_id, data in items)
+
+    prompt = f"""
+    Bạn là một chuyên gia phân tích nội dung mạng xã hội trong lĩnh vực truyền thông khủng hoảng.
+
+    Dưới đây là {len(items)} nội dung có sắc thái tiêu cực, mỗi nội dung có một id và bao gồm tiêu đề, mô tả và nội dung:
+
+    {posts}
+
+    Chủ đề cần kiểm tra là: "{topic}"
+
+    Nhiệm vụ (thực hiện riêng cho từng nội dung):
+    1. Kiểm tra xem nội dung có **nhắc đến** chủ đề không?
+    2. Nếu có, nội dung có đang **nhắm vào**, **công kích**, hoặc **quy trách nhiệm tiêu cực** cho chủ đề không?
+    3. Nếu targeting_topic = true, hãy **trích xuất danh sách các từ/cụm từ tiêu cực có thể gây khủng hoảng**. Mỗi phần tử trong danh sách phải là:
+      - Từ đơn (ví dụ: "lừa đảo")
+      - Từ đôi (ví dụ: "mất tiền")
+      - Tối đa 3 từ (ví dụ: "không hoàn tiền")
+      - Tuyệt đối không phải là câu dài hay mô tả.
+
+    Trả về một mảng JSON hợp lệ, mỗi phần tử ứng với một nội dung theo cấu trúc sau:
+    [
+      {{
+        "id": "id của nội dung",
+        "contains_topic": true/false,
+        "targeting_topic": true/false,
+        "reason": "giải thích ngắn gọn (1 câu)",
+        "crisis_keywords": ["từ khóa 1", "từ khóa 2", ...]
+      }}
+    ]
+
+    ⚠️ Ghi nhớ:
+    - Mảng phải có đúng một phần tử cho mỗi id ở trên, giữ nguyên id.
+    - Nếu chỉ nhắc chủ đề trong hashtag hoặc không liên quan trực tiếp tới hành vi tiêu cực → targeting_topic = false.
+    - Nếu targeting_topic = false thì crisis_keywords là mảng rỗng []
+    - Luôn đảm bảo crisis_keywords là list, các phần tử không dài quá 3 từ.
+
+    Chỉ trả về JSON hợp lệ. Không ghi thêm bất kỳ văn bản nào khác.
+    """
+    return prompt.strip()
+
+
+def parse_targeting_output(content):
+    """Lấy JSON kết quả từ câu trả lời của LLM và chuẩn hóa các trường bắt buộc."""
+    json_start = content.find("{")
+    json_end = content.rfind("}") + 1
+    result = json.loads(content[json_start:json_end])
+
+    default_result = {
+        "contains_topic": False,
+        "targeting_topic": False,
+        "reason": "Không xác định hoặc lỗi đầu ra.",
+        "crisis_keywords": []
+    }
+
+    for key in default_result:
+        if key not in result:
+            result[key] = default_result[key]
+
+    result["contains_topic"] = bool(result["contains_topic"])
+    result["targeting_topic"] = bool(result["targeting_topic"])
+    result["reason"] = str(result["reason"])
+    if not isinstance(result["crisis_keywords"], list):
+        result["crisis_keywords"] = []
+    return result
+
+
+def validate_verdict(obj):
+    """Kiểm tra một phần tử của mảng kết quả theo schema; None nếu sai kiểu hoặc thiếu trường."""
+    if not isinstance(obj, dict):
+        return None
+    if not isinstance(obj.get("contains_topic"), bool) or not isinstance(obj.get("targeting_topic"), bool):
+        return None
+    if not isinstance(obj.get("reason"), str):
+        return None
+    crisis_keywords = obj.get("crisis_keywords", [])
+    if not isinstance(crisis_keywords, list) or not all(isinstance(keyword, str) for keyword in crisis_keywords):
+        return None
+    return {
+        "contains_topic": obj["contains_topic"],
+        "targeting_topic": obj["targeting_topic"],
+        "reason": obj["reason"],
+        "crisis_keywords": crisis_keywords
+    }
+
+
+def parse_batch_output(raw_output):
+    """Trả về dict id -> verdict cho các phần tử hợp lệ trong mảng JSON; dict rỗng nếu không đọc được mảng."""
+    json_start = raw_output.find("[")
+    json_end = raw_output.rfind("]") + 1
+    try:
+        elements = json.loads(raw_output[json_start:json_end])
+    except ValueError:
+        return {}
+    if not isinstance(elements, list):
+        return {}
+
+    verdicts = {}
+    for element in elements:
+        verdict = validate_verdict(element)
+        if verdict is not None and "id" in element:
+            verdicts[str(element["id"])] = verdict
+    return verdicts
+
+
+def error_verdict(e):
+    return {
+        "contains_topic": False,
+        "targeting_topic": False,
+        "reason": f"Lỗi xử lý đầu ra từ LLM: {str(e)}",
+        "crisis_keywords": []
+    }
+
+
+class LatencyStats:
+    """Latency của các lần gọi gần nhất (giữ tối đa max_samples mẫu) và số lần lỗi."""
+
+    def __init__(self, max_samples=1000):
+        self.samples = deque(maxlen=max_samples)
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, seconds, ok=True):
+        self.calls += 1
+        if ok:
+            self.samples.append(seconds)
+        else:
+            self.errors += 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def get_stats(self):
+        def ms(q):
+            value = self.percentile(q)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": ms(50),
+            "p95_ms": ms(95),
+            "p99_ms": ms(99)
+        }
+
+
+class LLMProvider:
+    """Một LLM backend: cách dựng request và đọc text trả lời, cùng latency / tình trạng của nó."""
+
+    name = "base"
+
+    def __init__(self, api_key, model):
+        self.api_key = api_key
+        self.model = model
+        self.latency = LatencyStats()
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def build_request(self, prompt):
+        """Trả về (url, headers, payload)."""
+        raise NotImplementedError
+
+    def extract_text(self, body):
+        raise NotImplementedError
+
+    def healthy(self, now=None):
+        return (now or time.monotonic()) >= self.cooldown_until
+
+    def record_cancelled(self, seconds):
+        # Request thua khi hedge bị hủy: latency thật ít nhất bằng thời gian đã chờ,
+        # ghi lại để provider chậm không mãi được coi là "chưa có số liệu" và xếp đầu
+        self.latency.samples.append(seconds)
+
+    def record(self, seconds, ok, max_failures, cooldown):
+        # Lỗi liên tiếp max_failures lần thì tạm ngừng route tới provider trong `cooldown` giây
+        self.latency.record(seconds, ok)
+        if ok:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= max_failures:
+            self.cooldown_until = time.monotonic() + cooldown
+            self.consecutive_failures = 0
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def build_request(self, prompt):
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
+        headers = {
+            "Content-Type": "application/json",
+            "X-goog-api-key": self.api_key or ""
+        }
+        payload = {
+            "contents": [
+                {
+                    "parts": [
+                        {
+                            "text": prompt
+                        }
+                    ]
+                }
+            ]
+        }
+        return url, headers, payload
+
+    def extract_text(self, body):
+        return body.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "").strip()
+
+
+class FireworksProvider(LLMProvider):
+    name = "fireworks"
+
+    def build_request(self, prompt):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "fireworks-playground": "true",
+        }
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 4096,
+            "temperature": 0.6,
+            "top_p": 1,
+            "top_k": 40,
+            "n": 1,
+            "presence_penalty": 0,
+            "frequency_penalty": 0,
+            "stream": False,
+            "echo": False,
+            "logprobs": True
+        }
+        return "https://api.fireworks.ai/inference/v1/chat/completions", headers, payload
+
+    def extract_text(self, body):
+        return body.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+
+
+PROVIDERS = {
+    "gemini": (GeminiProvider, "gemini-2.0-flash"),
+    "fireworks": (FireworksProvider, "accounts/fireworks/models/llama4-scout-instruct-basic"),
+}
+
+
+def create_providers(names, api_keys):
+    """Tạo provider theo thứ tự ưu tiên trong names, bỏ qua provider chưa có API key."""
+    providers = []
+    for name in names:
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider: {name} (expected one of {', '.join(PROVIDERS)})")
+        provider_class, model = PROVIDERS[name]
+        if api_keys.get(name):
+            providers.append(provider_class(api_keys[name], model))
+    return providers
+
+
+class RequestTimer:
+    """
+    Thời gian chờ HTTP của một lần gọi provider, cộng qua các lần retry.
+    Không tính thời gian chờ rate limiter / Retry-After để latency phản ánh tốc độ của provider.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    @contextmanager
+    def measure(self):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.seconds += time.monotonic() - started
+
+
+class ProviderRouter:
+    """
+    Chọn provider nhanh nhất (p50) trong các provider còn khỏe cho mỗi lần gọi;
+    provider chính lỗi thì chuyển sang provider thứ hai.
+    Với hedge=True, nếu sau khoảng p95 của provider chính vẫn chưa có kết quả thì gửi thêm một request
+    tới provider thứ hai, lấy kết quả về trước và hủy request còn lại (tốn thêm request / token).
+    """
+
+    def __init__(self, providers, hedge=False, hedge_min_delay=0.5, hedge_max_delay=10.0,
+                 max_failures=3, cooldown=30.0):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def ranked(self):
+        now = time.monotonic()
+        healthy = [provider for provider in self.providers if provider.healthy(now)]
+        # Provider chưa có số liệu được thử trước; cùng latency thì theo thứ tự cấu hình
+        return sorted(
+            healthy or self.providers,
+            key=lambda provider: (provider.latency.percentile(50) or 0.0, self.providers.index(provider))
+        )
+
+    def hedge_delay(self, provider):
+        p95 = provider.latency.percentile(95)
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95))
+
+    async def _timed(self, provider, prompt, send):
+        timer = RequestTimer()
+        try:
+            text = await send(provider, prompt, timer)
+        except asyncio.CancelledError:
+            # Bị hủy khi chưa gửi HTTP (còn chờ rate limiter) thì không có số liệu gì
+            if timer.seconds:
+                provider.record_cancelled(timer.seconds)
+            raise
+        except Exception:
+            provider.record(timer.seconds, False, self.max_failures, self.cooldown)
+            raise
+        provider.record(timer.seconds, True, self.max_failures, self.cooldown)
+        return text
+
+    async def complete(self, prompt, send):
+        """
+        Gửi prompt qua send(provider, prompt, timer) -> text (transport của từng service,
+        bọc riêng lời gọi HTTP trong timer.measure()). Trả về (text, tên provider đã trả lời).
+        """
+        ranked = self.ranked()
+        if not ranked:
+            raise RuntimeError("No LLM provider configured")
+        primary = ranked[0]
+        backup = ranked[1] if len(ranked) > 1 else None
+
+        tasks = {asyncio.create_task(self._timed(primary, prompt, send)): primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary) if self.hedge and backup else None)
+            hedge = None
+            if not done and backup is not None:
+                self.hedged += 1
+                hedge = asyncio.create_task(self._timed(backup, prompt, send))
+                tasks[hedge] = backup
+                backup = None
+
+            error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        # Chỉ tính request hedge trả lời trước, không tính chuyển provider khi provider chính lỗi
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result(), provider.name
+                    error = task.exception()
+                # Provider chính lỗi (trước khi tới lúc hedge): chuyển ngay sang provider dự phòng
+                if not tasks and backup is not None:
+                    tasks[asyncio.create_task(self._timed(backup, prompt, send))] = backup
+                    backup = None
+            raise error
+        finally:
+            # Chờ request thua dừng hẳn để latency của nó được ghi trước lần chọn provider tiếp theo
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self):
+        return {
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "providers": {
+                provider.name: {**provider.latency.get_stats(), "healthy": provider.healthy()}
+                for provider in self.providers
+            }
+        }
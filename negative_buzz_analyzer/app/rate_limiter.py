@@ -0,0 +1,231 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+import redis
+
+# Bản giống hệt nằm ở app/rate_limiter.py và negative_buzz_analyzer/app/rate_limiter.py: hai service
+# build image riêng (COPY app/, COPY negative_buzz_analyzer/) nên không import chung được;
+# app/tests/test_shared_modules.py kiểm tra hai bản luôn giống nhau.
+
+REDIS_RATE_LIMIT_PREFIX = "llm_rate_limit"
+
+# "now" lấy từ đồng hồ của Redis (TIME), không phải của client: đồng hồ các replica lệch nhau
+# có thể làm ts lùi lại và bucket được nạp hai lần cho cùng một khoảng thời gian.
+NOW_MS = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+"""
+
+# Hai bucket (request/phút và token/phút) trong một hash, cập nhật nguyên tử bằng Lua.
+# Trả về 0 nếu đã trừ được cả hai bucket, ngược lại số ms cần chờ (không trừ gì).
+ACQUIRE_SCRIPT = NOW_MS + """
+local key = KEYS[1]
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', key, 'requests', 'tokens', 'ts', 'blocked_until')
+local requests = tonumber(state[1]) or rpm
+local available = tonumber(state[2]) or tpm
+local ts = tonumber(state[3]) or now
+local blocked_until = tonumber(state[4]) or 0
+
+-- Trong thời gian bị chặn (Retry-After) bucket không được nạp thêm
+local elapsed = math.max(0, now - math.max(ts, blocked_until))
+requests = math.min(rpm, requests + elapsed * rpm / 60000)
+available = math.min(tpm, available + elapsed * tpm / 60000)
+
+local wait = 0
+if now < blocked_until then
+    wait = blocked_until - now
+end
+if requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60000 / rpm)
+end
+if available < tokens then
+    wait = math.max(wait, (tokens - available) * 60000 / tpm)
+end
+
+if wait == 0 then
+    requests = requests - 1
+    available = available - tokens
+end
+redis.call('HSET', key, 'requests', requests, 'tokens', available, 'ts', now)
+redis.call('PEXPIRE', key, 120000)
+return math.ceil(wait)
+"""
+
+# Provider trả 429 + Retry-After: chặn cả bucket tới thời điểm đó và xả bucket request,
+# để sau khi hết chặn các process bắt đầu lại từ bucket rỗng thay vì dồn một loạt request.
+PENALIZE_SCRIPT = NOW_MS + """
+local key = KEYS[1]
+local until_ms = now + tonumber(ARGV[1])
+local blocked_until = tonumber(redis.call('HGET', key, 'blocked_until')) or 0
+redis.call('HSET', key, 'blocked_until', math.max(blocked_until, until_ms), 'requests', 0, 'ts', now)
+redis.call('PEXPIRE', key, math.max(120000, until_ms - now))
+return 1
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng số token của prompt (tiếng Việt có dấu ~3 ký tự / token)."""
+    return max(1, len(text) // 3)
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Retry-After dạng số giây hoặc HTTP-date; trả về số giây cần chờ."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_stats(raw: Dict[Any, Any]) -> Dict[str, float]:
+    stats = {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()}
+    return {
+        "throttled_calls": int(stats.get("throttled_calls", 0)),
+        "throttled_seconds": round(stats.get("throttled_seconds", 0.0), 3),
+        "rate_limited": int(stats.get("rate_limited", 0))
+    }
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    Token bucket dùng chung giữa mọi process / replica qua Redis, theo request/phút và token/phút.
+    acquire() chờ tới khi đủ ngân sách thay vì báo lỗi; nếu Redis lỗi thì cho qua (fail open).
+    """
+
+    def __init__(
+        self,
+        redis_conn: Any,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_wait: float = 60.0
+    ):
+        self.redis_conn = redis_conn
+        self.key = f"{REDIS_RATE_LIMIT_PREFIX}:{name}"
+        self.stats_key = f"{REDIS_RATE_LIMIT_PREFIX}:{name}:stats"
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self._acquire = redis_conn.register_script(ACQUIRE_SCRIPT)
+        self._penalize = redis_conn.register_script(PENALIZE_SCRIPT)
+
+    def _args(self, tokens: int) -> List[int]:
+        # Request lớn hơn cả bucket sẽ không bao giờ đủ token: giới hạn ở dung lượng bucket
+        return [self.requests_per_minute, self.tokens_per_minute, min(tokens, self.tokens_per_minute)]
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Chờ tới khi đủ ngân sách; trả về số giây đã chờ"""
+        started = time.monotonic()
+        waited = False
+        while True:
+            try:
+                wait_ms = self._acquire(keys=[self.key], args=self._args(tokens))
+            except redis.RedisError as e:
+                print(f"⚠️ Rate limiter error: {e}")
+                return 0.0
+            if wait_ms <= 0:
+                break
+            if time.monotonic() - started + wait_ms / 1000 > self.max_wait:
+                raise RateLimitTimeout(f"LLM rate limit: waited {time.monotonic() - started:.1f}s")
+            waited = True
+            time.sleep(wait_ms / 1000)
+        return self._record_throttle(time.monotonic() - started if waited else 0.0)
+
+    def penalize(self, seconds: float) -> None:
+        """Provider trả 429: chặn bucket trong `seconds` giây cho mọi process"""
+        self._record("rate_limited", 1)
+        try:
+            self._penalize(keys=[self.key], args=[int(seconds * 1000)])
+        except redis.RedisError as e:
+            print(f"⚠️ Rate limiter error: {e}")
+
+    def get_stats(self) -> Dict[str, float]:
+        """Thống kê cộng dồn của mọi process dùng chung bucket này"""
+        try:
+            return parse_stats(self.redis_conn.hgetall(self.stats_key))
+        except redis.RedisError as e:
+            print(f"⚠️ Rate limiter stats error: {e}")
+            return parse_stats({})
+
+    def _record_throttle(self, throttled: float) -> float:
+        if throttled > 0:
+            self._record("throttled_calls", 1, throttled_seconds=throttled)
+        return throttled
+
+    def _record(self, name: str, value: int, throttled_seconds: Optional[float] = None) -> None:
+        try:
+            pipe = self.redis_conn.pipeline(transaction=False)
+            pipe.hincrby(self.stats_key, name, value)
+            if throttled_seconds is not None:
+                pipe.hincrbyfloat(self.stats_key, "throttled_seconds", throttled_seconds)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"⚠️ Rate limiter stats error: {e}")
+
+
+class AsyncRateLimiter(RateLimiter):
+    """Phiên bản asyncio (redis.asyncio) của RateLimiter."""
+
+    async def acquire(self, tokens: int = 1) -> float:
+        """Chờ tới khi đủ ngân sách; trả về số giây đã chờ"""
+        started = time.monotonic()
+        waited = False
+        while True:
+            try:
+                wait_ms = await self._acquire(keys=[self.key], args=self._args(tokens))
+            except redis.RedisError as e:
+                print(f"⚠️ Rate limiter error: {e}")
+                return 0.0
+            if wait_ms <= 0:
+                break
+            if time.monotonic() - started + wait_ms / 1000 > self.max_wait:
+                raise RateLimitTimeout(f"LLM rate limit: waited {time.monotonic() - started:.1f}s")
+            waited = True
+            await asyncio.sleep(wait_ms / 1000)
+        return await self._record_throttle(time.monotonic() - started if waited else 0.0)
+
+    async def penalize(self, seconds: float) -> None:
+        """Provider trả 429: chặn bucket trong `seconds` giây cho mọi process"""
+        await self._record("rate_limited", 1)
+        try:
+            await self._penalize(keys=[self.key], args=[int(seconds * 1000)])
+        except redis.RedisError as e:
+            print(f"⚠️ Rate limiter error: {e}")
+
+    async def get_stats(self) -> Dict[str, float]:
+        """Thống kê cộng dồn của mọi process dùng chung bucket này"""
+        try:
+            return parse_stats(await self.redis_conn.hgetall(self.stats_key))
+        except redis.RedisError as e:
+            print(f"⚠️ Rate limiter stats error: {e}")
+            return parse_stats({})
+
+    async def _record_throttle(self, throttled: float) -> float:
+        if throttled > 0:
+            await self._record("throttled_calls", 1, throttled_seconds=throttled)
+        return throttled
+
+    async def _record(self, name: str, value: int, throttled_seconds: Optional[float] = None) -> None:
+        try:
+            pipe = self.redis_conn.pipeline(transaction=False)
+            pipe.hincrby(self.stats_key, name, value)
+            if throttled_seconds is not None:
+                pipe.hincrbyfloat(self.stats_key, "throttled_seconds", throttled_seconds)
+            await pipe.execute()
+        except redis.RedisError as e:
+            print(f"⚠️ Rate limiter stats error: {e}")
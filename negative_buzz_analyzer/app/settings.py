@@ -5,6 +5,36 @@ from typing import Optional  # ✅ Import thêm Optional
 class Settings(BaseSettings):
     FIREWORKS_API_KEY: Optional[str] = Field(default=None, env="FIREWORKS_API_KEY")
     FIREWORKS_API_URL: str = Field(default="https://api.fireworks.ai", env="FIREWORKS_API_URL")
+    GEMINI_API_KEY: Optional[str] = Field(default=None, env="GEMINI_API_KEY")
+    REDIS_HOST: str = Field(default="localhost", env="REDIS_HOST")
+    REDIS_PORT: int = Field(default=6379, env="REDIS_PORT")
+    REDIS_CACHE_ENABLED: bool = Field(default=True, env="REDIS_CACHE_ENABLED")
+    LLM_BATCH_SIZE: int = Field(default=8, env="LLM_BATCH_SIZE")
+    LLM_HTTP2: bool = Field(default=True, env="LLM_HTTP2")
+    LLM_TIMEOUT: float = Field(default=30.0, env="LLM_TIMEOUT")
+    LLM_CONNECT_TIMEOUT: float = Field(default=5.0, env="LLM_CONNECT_TIMEOUT")
+    LLM_MAX_CONNECTIONS: int = Field(default=20, env="LLM_MAX_CONNECTIONS")
+    LLM_KEEPALIVE_EXPIRY: float = Field(default=60.0, env="LLM_KEEPALIVE_EXPIRY")
+    LLM_CONCURRENCY: int = Field(default=64, env="LLM_CONCURRENCY")
+    LLM_RATE_LIMIT_ENABLED: bool = Field(default=True, env="LLM_RATE_LIMIT_ENABLED")
+    # Quota riêng của từng provider (mỗi provider một bucket trong Redis)
+    LLM_GEMINI_REQUESTS_PER_MINUTE: int = Field(default=2000, env="LLM_GEMINI_REQUESTS_PER_MINUTE")
+    LLM_GEMINI_TOKENS_PER_MINUTE: int = Field(default=4000000, env="LLM_GEMINI_TOKENS_PER_MINUTE")
+    LLM_FIREWORKS_REQUESTS_PER_MINUTE: int = Field(default=600, env="LLM_FIREWORKS_REQUESTS_PER_MINUTE")
+    LLM_FIREWORKS_TOKENS_PER_MINUTE: int = Field(default=1000000, env="LLM_FIREWORKS_TOKENS_PER_MINUTE")
+    LLM_RATE_LIMIT_MAX_WAIT: float = Field(default=60.0, env="LLM_RATE_LIMIT_MAX_WAIT")
+    LLM_MAX_RETRIES: int = Field(default=3, env="LLM_MAX_RETRIES")
+    # Mặc định chỉ dùng Fireworks như trước; thêm "gemini" (ví dụ "fireworks,gemini") để bật Gemini
+    LLM_PROVIDERS: str = Field(default="fireworks", env="LLM_PROVIDERS")
+    LLM_HEDGE_ENABLED: bool = Field(default=False, env="LLM_HEDGE_ENABLED")
+    LLM_HEDGE_MIN_DELAY: float = Field(default=0.5, env="LLM_HEDGE_MIN_DELAY")
+    LLM_HEDGE_MAX_DELAY: float = Field(default=10.0, env="LLM_HEDGE_MAX_DELAY")
+    LLM_PROVIDER_MAX_FAILURES: int = Field(default=3, env="LLM_PROVIDER_MAX_FAILURES")
+    LLM_PROVIDER_COOLDOWN: float = Field(default=30.0, env="LLM_PROVIDER_COOLDOWN")
+    LLM_PREFILTER_ENABLED: bool = Field(default=True, env="LLM_PREFILTER_ENABLED")
+    FILTER_CACHE_MAX_SIZE: int = Field(default=1000, env="FILTER_CACHE_MAX_SIZE")
+    FILTER_CACHE_TTL: int = Field(default=3600, env="FILTER_CACHE_TTL")
+    FILTER_CACHE_MAX_BYTES: Optional[int] = Field(default=None, env="FILTER_CACHE_MAX_BYTES")
 
     class Config:
         env_file = ".env"
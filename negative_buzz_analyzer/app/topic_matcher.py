@@ -0,0 +1,170 @@
+import re
+import unicodedata
+from collections import OrderedDict, deque
+
+# Lọc trước khi gọi LLM: bài không nhắc tới chủ đề (tên hoặc alias, không phân biệt dấu / hoa thường)
+# thì chắc chắn contains_topic = targeting_topic = false, không cần gọi LLM.
+# Bản giống hệt nằm ở app/topic_matcher.py và negative_buzz_analyzer/app/topic_matcher.py: hai service
+# build image riêng nên không import chung được; app/tests/test_shared_modules.py kiểm tra hai bản luôn giống nhau.
+
+_COMBINING_MARKS = re.compile("[\u0300-\u036f]+")
+# Byte ASCII không phải chữ / số (kể cả "?" thay cho ký tự ngoài ASCII) thành khoảng trắng
+_ASCII_FOLD = bytes(code if chr(code).isalnum() else 32 for code in range(128)) + b" " * 128
+
+
+def fold_text(text):
+    """
+    Bỏ dấu tiếng Việt (kể cả đ → d), chữ thường, mọi ký tự không phải chữ / số Latin
+    thành một khoảng trắng; kết quả có khoảng trắng ở hai đầu để khớp ranh giới từ.
+    """
+    stripped = _COMBINING_MARKS.sub("", unicodedata.normalize("NFD", (text or "").lower().replace("đ", "d")))
+    ascii_text = stripped.encode("ascii", "replace").translate(_ASCII_FOLD).decode("ascii")
+    return " " + " ".join(ascii_text.split()) + " "
+
+
+# Tên dài hơn thì chỉ lấy bản có dấu cách và bản viết liền (tránh 2^n mẫu)
+MAX_SPACING_VARIANTS_WORDS = 6
+
+
+def topic_patterns(topic_name, aliases=()):
+    """
+    Mẫu cần tìm cho một chủ đề: tên và từng alias sau khi fold, thêm bản viết liền
+    (hashtag / mention như #vietnamairlines). Mẫu chỉ giữ ranh giới từ ở đầu nên
+    "vietcombank" vẫn khớp "vietcombank2024"; khớp thừa chỉ tốn thêm một lần gọi LLM.
+    """
+    patterns = set()
+    for name in [topic_name, *aliases]:
+        words = fold_text(name).split()
+        if not words:
+            continue
+        if len(words) > MAX_SPACING_VARIANTS_WORDS:
+            patterns.update([" " + " ".join(words), " " + "".join(words)])
+            continue
+        # Mọi cách viết liền / tách giữa các từ: "viet nam airlines", "vietnam airlines", "vietnamairlines"...
+        for mask in range(2 ** (len(words) - 1)):
+            pattern = words[0]
+            for position, word in enumerate(words[1:]):
+                pattern += ("" if mask >> position & 1 else " ") + word
+            patterns.add(" " + pattern)
+    return sorted(patterns)
+
+
+class AhoCorasick:
+    """Automaton Aho-Corasick: tìm mọi mẫu trong một lần duyệt văn bản, O(độ dài văn bản)."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state] += (index,)
+
+        # Liên kết fail theo BFS; output của một trạng thái gồm cả output của trạng thái fail
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """Sinh (vị trí kết thúc, chỉ số mẫu) cho mọi lần khớp."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position, index
+
+    def contains_any(self, text):
+        """Dừng ngay ở lần khớp đầu tiên."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+class TopicPrefilter:
+    """
+    Quyết định contains_topic tại chỗ: automaton theo (chủ đề, alias) được build một lần
+    và giữ trong LRU. Chỉ bài có nhắc tới chủ đề mới cần gọi LLM.
+    """
+
+    def __init__(self, max_topics=1024):
+        self.max_topics = max_topics
+        self.automata = OrderedDict()
+        self.stats = {"checked": 0, "skipped": 0}
+        self._unflushed = dict(self.stats)
+
+    def _count(self, name):
+        self.stats[name] += 1
+        self._unflushed[name] += 1
+
+    def automaton(self, topic_name, aliases=()):
+        key = (topic_name or "", tuple(aliases or ()))
+        automaton = self.automata.get(key)
+        if automaton is None:
+            patterns = topic_patterns(*key)
+            automaton = AhoCorasick(patterns) if patterns else None
+            self.automata[key] = automaton
+            while len(self.automata) > self.max_topics:
+                self.automata.popitem(last=False)
+        else:
+            self.automata.move_to_end(key)
+        return automaton
+
+    def mentions_topic(self, data, text):
+        """
+        True nếu text nhắc tới chủ đề của data (topic_name / topic_aliases).
+        Chủ đề rỗng thì không quyết định được tại chỗ nên coi như có nhắc (để LLM xử lý).
+        """
+        self._count("checked")
+        automaton = self.automaton(data.get("topic_name", ""), data.get("topic_aliases") or ())
+        if automaton is None or automaton.contains_any(fold_text(text)):
+            return True
+        self._count("skipped")
+        return False
+
+    def pop_unflushed(self):
+        """Bộ đếm tăng thêm từ lần gọi trước (để cộng dồn vào thống kê chung)."""
+        deltas = {name: value for name, value in self._unflushed.items() if value}
+        self._unflushed = {name: 0 for name in self.stats}
+        return deltas
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "llm_calls_avoided_rate": round(self.stats["skipped"] / self.stats["checked"] * 100, 2)
+            if self.stats["checked"] else 0.0,
+            "topics": len(self.automata)
+        }
+
+
+def not_mentioned_verdict():
+    return {
+        "contains_topic": False,
+        "targeting_topic": False,
+        "reason": "Nội dung không nhắc đến chủ đề.",
+        "crisis_keywords": [],
+        "provenance": {"source": "prefilter"}
+    }
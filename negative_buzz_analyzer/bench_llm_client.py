@@ -0,0 +1,116 @@
+"""
+So sánh client HTTP tạo mới cho mỗi lần gọi LLM (cách cũ) với client dùng chung của app.llm,
+trên một stub LLM server chạy local: số kết nối server nhận được và latency p50 / p99.
+
+    python bench_llm_client.py --requests 500 --concurrency 200 --delay-ms 50
+
+Lưu ý: stub chạy HTTP thường nên httpx dùng HTTP/1.1 (HTTP/2 chỉ được thương lượng qua TLS/ALPN);
+số kết nối ở đây phản ánh tác dụng của connection pool + keep-alive. Với Fireworks (https)
+client dùng chung còn ghép nhiều request trên cùng một kết nối HTTP/2.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from aiohttp import web
+
+from app import llm
+from app.providers import FireworksProvider
+
+
+class StubFireworksProvider(FireworksProvider):
+    """Fireworks provider trỏ tới stub server local."""
+
+    def __init__(self, url):
+        super().__init__("bench", "bench-model")
+        self.url = url
+
+    def build_request(self, prompt):
+        return (self.url, *super().build_request(prompt)[1:])
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def start_stub(port, delay_ms, peers):
+    async def chat(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        await request.read()
+        await asyncio.sleep(delay_ms / 1000)
+        content = json.dumps({"contains_topic": True, "targeting_topic": False, "reason": "stub"})
+        return web.json_response({"choices": [{"message": {"content": content}}]})
+
+    app = web.Application()
+    app.router.add_post("/inference/v1/chat/completions", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def per_call_client(url, prompt):
+    # Cách cũ: mỗi lần gọi mở một AsyncClient mới
+    _, headers, payload = llm.router.providers[0].build_request(prompt)
+    async with httpx.AsyncClient(timeout=30) as client:
+        response = await client.post(url, headers=headers, json=payload)
+        response.raise_for_status()
+
+
+async def shared_client(url, prompt):
+    await llm.call_llm(prompt)
+
+
+async def run(mode, call, args, url, peers):
+    peers.clear()
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], []
+    prompt = llm.build_targeting_prompt({"title": "bench", "content": "nội dung", "topic_name": "bench"})
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await call(url, prompt)
+            except httpx.HTTPError as e:
+                errors.append(e)
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(args.requests)])
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        print(f"{mode:<10} | connections={len(peers):5d} | errors={len(errors)}")
+        return
+    print(
+        f"{mode:<10} | connections={len(peers):5d} | errors={len(errors):4d} | p50={percentile(latencies, 50) * 1000:7.1f}ms | "
+        f"p99={percentile(latencies, 99) * 1000:7.1f}ms | total={elapsed:6.2f}s"
+    )
+
+
+async def main(args):
+    peers = set()
+    runner = await start_stub(args.port, args.delay_ms, peers)
+    url = f"http://127.0.0.1:{args.port}/inference/v1/chat/completions"
+    llm.router.providers = [StubFireworksProvider(url)]
+    await llm.start_client()
+    try:
+        await run("per-call", per_call_client, args, url, peers)
+        await run("shared", shared_client, args, url, peers)
+        print(f"shared client stats={llm.get_stats()}")
+    finally:
+        await llm.close_client()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--delay-ms", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8799)
+    asyncio.run(main(parser.parse_args()))
@@ -1,17 +1,33 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, ConfigDict
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import asyncio
 import hashlib
 import json
 import time
-from app.core import filter_negative_content
+from app.settings import Settings
+from app.core import filter_negative_content, needs_topic_analysis
+from app.llm import check_targeting_topics
+from app import llm
+from app import cache as l2_cache
+
+settings = Settings()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared LLM HTTP client on startup and close it on shutdown"""
+    await llm.start_client()
+    yield
+    await llm.close_client()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Negative Content Filter API",
     description="API for filtering negative content with caching",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- Models ---
@@ -26,11 +42,26 @@ class CacheStats(BaseModel):
     max_size: int
     ttl: int
     usage_percent: float
+    size_bytes: int
+    max_bytes: Optional[int]
+    hits: int
+    misses: int
+    hit_rate: float
+    miss_rate: float
+    evictions: int
+    expirations: int
+    l2_hits: int
+    l2_misses: int
+    l2_errors: int
+    l2_version: str
+    in_flight: int
+    coalesced: int
 
 class FilterItem(BaseModel):
     """Input model for filtering negative content"""
     id: Optional[str] = None
     topic_name: Optional[str] = None
+    topic_aliases: Optional[List[str]] = None
     type: Optional[str] = None
     topic_id: Optional[str] = None
     site_id: Optional[str] = None
@@ -71,20 +102,34 @@ class FilterResponse(BaseModel):
 # --- Cache Manager ---
 
 class FilterCache:
-    """Cache manager for negative content filtering results"""
+    """
+    Cache manager for negative content filtering results.
+
+    Entries live in an OrderedDict ordered by last access, so lookups, inserts,
+    LRU eviction and TTL expiry are all O(1): the least recently used entry is
+    always at the front, and because the TTL slides on access it is also the
+    first one to expire.
+    """
     
-    def __init__(self, max_size: int = 1000, ttl: int = 3600):
+    def __init__(self, max_size: int = 1000, ttl: int = 3600, max_bytes: Optional[int] = None):
         """
         Initialize cache with size and TTL constraints.
         
         Args:
             max_size: Maximum number of items in cache
-            ttl: Time to live (seconds) for cache entries
+            ttl: Time to live (seconds) since the last access of an entry
+            max_bytes: Maximum total size (bytes of the JSON-encoded results), None for no limit
         """
-        self.cache: Dict[str, Any] = {}
+        # key -> (result, last access time, size in bytes)
+        self.cache: "OrderedDict[str, Tuple[Dict[str, Any], float, int]]" = OrderedDict()
         self.max_size: int = max_size
         self.ttl: int = ttl
-        self.access_times: Dict[str, float] = {}
+        self.max_bytes: Optional[int] = max_bytes
+        self.total_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
 
     def _generate_cache_key(self, data_input: Dict[str, Any]) -> str:
         """Generate cache key from input data"""
@@ -96,6 +141,9 @@ class FilterCache:
             'site_name': data_input.get('site_name', ''),
             'type': data_input.get('type', '')
         }
+        # Alias đổi kết quả prefilter; chỉ thêm vào key khi có để key cũ vẫn dùng được
+        if data_input.get('topic_aliases'):
+            cache_fields['topic_aliases'] = data_input['topic_aliases']
         cache_str = json.dumps(cache_fields, sort_keys=True, ensure_ascii=False)
         return hashlib.md5(cache_str.encode('utf-8')).hexdigest()
 
@@ -103,80 +151,156 @@ class FilterCache:
         """Check if cache entry has expired"""
         return time.time() - timestamp > self.ttl
 
+    def _remove(self, cache_key: str) -> None:
+        _, _, size = self.cache.pop(cache_key)
+        self.total_bytes -= size
+
     def _cleanup_expired(self) -> None:
-        """Remove expired cache entries"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, timestamp in self.access_times.items()
-            if current_time - timestamp > self.ttl
-        ]
-        for key in expired_keys:
-            self.cache.pop(key, None)
-            self.access_times.pop(key, None)
+        """Remove expired entries from the front (oldest access first), stopping at the first live one"""
+        while self.cache:
+            cache_key, (_, timestamp, _) = next(iter(self.cache.items()))
+            if not self._is_expired(timestamp):
+                break
+            self._remove(cache_key)
+            self.expirations += 1
 
     def _evict_lru(self) -> None:
-        """Evict least recently used entry when cache is full"""
-        if len(self.cache) >= self.max_size:
-            oldest_key = min(self.access_times, key=self.access_times.get)
-            self.cache.pop(oldest_key, None)
-            self.access_times.pop(oldest_key, None)
+        """Evict least recently used entries while the cache is over its count or byte limit"""
+        while self.cache and (
+            len(self.cache) > self.max_size
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self.cache)))
+            self.evictions += 1
 
     def get(self, data_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Retrieve result from cache"""
         cache_key = self._generate_cache_key(data_input)
-        if cache_key in self.cache:
-            if self._is_expired(self.access_times[cache_key]):
-                self.cache.pop(cache_key, None)
-                self.access_times.pop(cache_key, None)
-                return None
-            self.access_times[cache_key] = time.time()
-            return self.cache[cache_key]
-        return None
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            self.misses += 1
+            return None
+        result, timestamp, size = entry
+        if self._is_expired(timestamp):
+            self._remove(cache_key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.cache[cache_key] = (result, time.time(), size)
+        self.cache.move_to_end(cache_key)
+        self.hits += 1
+        return result
 
     def set(self, data_input: Dict[str, Any], result: Dict[str, Any]) -> None:
         """Store result in cache"""
+        cache_key = self._generate_cache_key(data_input)
+        if cache_key in self.cache:
+            self._remove(cache_key)
+        size = len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        self.cache[cache_key] = (result.copy(), time.time(), size)
+        self.total_bytes += size
         self._cleanup_expired()
         self._evict_lru()
-        cache_key = self._generate_cache_key(data_input)
-        self.cache[cache_key] = result.copy()
-        self.access_times[cache_key] = time.time()
 
     def clear(self) -> None:
         """Clear all cache entries"""
         self.cache.clear()
-        self.access_times.clear()
+        self.total_bytes = 0
 
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
+        lookups = self.hits + self.misses
         return {
             'cache_size': len(self.cache),
             'max_size': self.max_size,
             'ttl': self.ttl,
-            'usage_percent': len(self.cache) / self.max_size * 100
+            'usage_percent': len(self.cache) / self.max_size * 100,
+            'size_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups * 100 if lookups else 0.0,
+            'miss_rate': self.misses / lookups * 100 if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
         }
 
 # Initialize global cache
-filter_cache = FilterCache(max_size=1000, ttl=3600)
+filter_cache = FilterCache(
+    max_size=settings.FILTER_CACHE_MAX_SIZE,
+    ttl=settings.FILTER_CACHE_TTL,
+    max_bytes=settings.FILTER_CACHE_MAX_BYTES
+)
 
-# --- Services ---
+# --- In-flight Requests ---
+
+class InFlightRequests:
+    """Single-flight map: concurrent identical items share one LLM call"""
+
+    def __init__(self):
+        self.futures: Dict[str, asyncio.Future] = {}
+        self.coalesced: int = 0
+
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """Return the future of an identical item already being processed, if any"""
+        future = self.futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+        return future
+
+    def start(self, key: str) -> asyncio.Future:
+        """Register the caller as the owner of this key"""
+        future = asyncio.get_running_loop().create_future()
+        self.futures[key] = future
+        return future
+
+    def finish(self, key: str, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Hand the owner's result (or error) to every waiter and release the key"""
+        future = self.futures.pop(key, None)
+        if future is None or future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            # Waiters were not cancelled themselves: fail them like any other owner error
+            error = RuntimeError("The request processing this item was cancelled")
+        if error is not None:
+            future.set_exception(error)
+            future.exception()  # Mark as retrieved when nobody is waiting
+        else:
+            future.set_result(result)
+
+    def release(self, key: str, future: asyncio.Future, error: BaseException) -> None:
+        """Fail the waiters of an owner that never settled (cancelled before its work ran)"""
+        if self.futures.get(key) is future:
+            self.finish(key, error=error)
+
+    async def settle(self, key: str, awaitable) -> Any:
+        """Await the owner's work and share the outcome; the key is released even on cancellation"""
+        result, error = None, None
+        try:
+            result = await awaitable
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish(key, result=result, error=error)
+
+    async def run(self, key: str, factory) -> Any:
+        """Run factory() once per key; concurrent callers await the same result"""
+        future = self.join(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        self.start(key)
+        return await self.settle(key, factory())
+
+# Initialize global in-flight map
+in_flight = InFlightRequests()
 
-async def filter_negative_content_service(data_input: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Filter negative content for a single item with caching.
-    
-    Args:
-        data_input: Input data to filter
-        
-    Returns:
-        Dictionary containing input fields and filter results
-    """
-    cached_result = filter_cache.get(data_input)
-    if cached_result:
-        print(f"📋 Cache hit for item: {data_input.get('id', 'unknown')}")
-        return cached_result
+# --- Services ---
 
-    print(f"🔍 Processing item: {data_input.get('id', 'unknown')}")
-    result = {
+def default_filter_result(data_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the result skeleton (input fields + default filter values) for an item."""
+    return {
         "id": data_input.get("id", ""),
         "topic_name": data_input.get("topic_name", ""),
         "type": data_input.get("type", ""),
@@ -190,6 +314,35 @@ async def filter_negative_content_service(data_input: Dict[str, Any]) -> Dict[st
         "reason": ""
     }
 
+def with_input_fields(result: Dict[str, Any], data_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a shared result, keeping the identifiers of this item (they are not part of the cache key)"""
+    return {
+        **result,
+        "id": data_input.get("id", ""),
+        "topic_id": data_input.get("topic_id", ""),
+        "site_id": data_input.get("site_id", "")
+    }
+
+def is_cacheable(result: Dict[str, Any]) -> bool:
+    """Only real verdicts are cached; transient failures (LLM error, exception) are retried next time"""
+    return not result.get("failed", False)
+
+async def process_uncached_item(
+    data_input: Dict[str, Any],
+    topic_analysis: Optional[Dict[str, Any]] = None,
+    write_l2: bool = True
+) -> Dict[str, Any]:
+    """
+    Filter an item that is not in the cache and store the result unless it failed.
+
+    Args:
+        data_input: Input data to filter
+        topic_analysis: LLM verdict computed ahead of time (batched), None to call the LLM here
+        write_l2: Also write the result to the shared Redis cache (the batch service writes once for all items)
+    """
+    print(f"🔍 Processing item: {data_input.get('id', 'unknown')}")
+    result = default_filter_result(data_input)
+
     try:
         filter_result = await filter_negative_content(data_input, {
             "contains_topic": False,
@@ -197,18 +350,53 @@ async def filter_negative_content_service(data_input: Dict[str, Any]) -> Dict[st
             "crisis_keywords": [],
             "log_level": 2,
             "reason": ""
-        })
+        }, topic_analysis)
         result.update(filter_result)
-        filter_cache.set(data_input, result)
+        if is_cacheable(result):
+            filter_cache.set(data_input, result)
+            if write_l2:
+                await l2_cache.set_many({filter_cache._generate_cache_key(data_input): result})
         return result
     except Exception as e:
         print(f"❌ Error processing item {data_input.get('id', 'unknown')}: {e}")
         result["reason"] = f"Error processing item: {str(e)}"
+        result["failed"] = True
         return result
 
+async def filter_negative_content_service(data_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Filter negative content for a single item with caching.
+    
+    Args:
+        data_input: Input data to filter
+        
+    Returns:
+        Dictionary containing input fields and filter results
+    """
+    cached_result = filter_cache.get(data_input)
+    if cached_result:
+        print(f"📋 Cache hit for item: {data_input.get('id', 'unknown')}")
+        return with_input_fields(cached_result, data_input)
+
+    # L2: shared Redis cache, filled by every worker process / replica
+    cache_key = filter_cache._generate_cache_key(data_input)
+    l2_result = (await l2_cache.get_many([cache_key])).get(cache_key)
+    if l2_result:
+        print(f"📋 L2 cache hit for item: {data_input.get('id', 'unknown')}")
+        filter_cache.set(data_input, l2_result)
+        return with_input_fields(l2_result, data_input)
+
+    result = await in_flight.run(cache_key, lambda: process_uncached_item(data_input))
+    return with_input_fields(result, data_input)
+
 async def batch_filter_negative_content_service(data_list: List[FilterItem]) -> List[Dict[str, Any]]:
     """
-    Filter negative content for multiple items concurrently.
+    Filter negative content for multiple items.
+
+    Cache misses that need topic analysis are sent to the LLM in multi-post
+    prompts (up to LLM_BATCH_SIZE posts per topic) before the items are filtered
+    concurrently. Duplicates of an item already being processed await its result
+    instead of calling the LLM again.
     
     Args:
         data_list: List of items to filter
@@ -217,24 +405,64 @@ async def batch_filter_negative_content_service(data_list: List[FilterItem]) ->
         List of dictionaries containing input fields and filter results
     """
     print(f"🚀 Processing batch of {len(data_list)} items")
-    tasks = [filter_negative_content_service(item.dict(exclude_none=True)) for item in data_list]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    data_inputs = [item.dict(exclude_none=True) for item in data_list]
+    cached_results = [filter_cache.get(data_input) for data_input in data_inputs]
+    cache_keys = [filter_cache._generate_cache_key(data_input) for data_input in data_inputs]
+
+    # L1 misses are looked up in Redis with a single MGET
+    l2_results = await l2_cache.get_many(list(dict.fromkeys(
+        cache_key for cache_key, cached in zip(cache_keys, cached_results) if not cached
+    )))
+    for i, cache_key in enumerate(cache_keys):
+        if not cached_results[i] and cache_key in l2_results:
+            filter_cache.set(data_inputs[i], l2_results[cache_key])
+            cached_results[i] = with_input_fields(l2_results[cache_key], data_inputs[i])
+
+    # Identical items (in this batch or in concurrent requests) wait for a single owner
+    owners, waiting = [], {}
+    for i, (cache_key, cached) in enumerate(zip(cache_keys, cached_results)):
+        if cached:
+            continue
+        future = in_flight.join(cache_key)
+        if future is None:
+            future = in_flight.start(cache_key)
+            owners.append(i)
+        waiting[i] = future
+
+    owner_set = set(owners)
+
+    async def resolve(i: int) -> Dict[str, Any]:
+        if cached_results[i]:
+            print(f"📋 Cache hit for item: {data_inputs[i].get('id', 'unknown')}")
+            return with_input_fields(cached_results[i], data_inputs[i])
+        if i in owner_set:
+            return await in_flight.settle(
+                cache_keys[i], process_uncached_item(data_inputs[i], topic_analyses.get(i), write_l2=False)
+            )
+        return with_input_fields(await asyncio.shield(waiting[i]), data_inputs[i])
+
+    # Owned keys are released even if this request fails or is cancelled (client disconnect, timeout)
+    # before settle() runs for them, otherwise later identical items would wait forever
+    error: BaseException = asyncio.CancelledError()
+    try:
+        pending = [i for i in owners if needs_topic_analysis(data_inputs[i])]
+        topic_analyses = dict(zip(pending, await check_targeting_topics([data_inputs[i] for i in pending])))
+        results = await asyncio.gather(*[resolve(i) for i in range(len(data_inputs))], return_exceptions=True)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        for i in owners:
+            in_flight.release(cache_keys[i], waiting[i], error)
+    await l2_cache.set_many({
+        cache_keys[i]: results[i]
+        for i in owners
+        if not isinstance(results[i], BaseException) and is_cacheable(results[i])
+    })
     
     processed_results = []
     for i, (item, result) in enumerate(zip(data_list, results)):
-        default_result = {
-            "id": item.id or "",
-            "topic_name": item.topic_name or "",
-            "type": item.type or "",
-            "topic_id": item.topic_id or "",
-            "site_id": item.site_id or "",
-            "site_name": item.site_name or "",
-            "contains_topic": False,
-            "targeting_topic": False,
-            "crisis_keywords": [],
-            "log_level": 2,
-            "reason": ""
-        }
+        default_result = default_filter_result(data_inputs[i])
         if isinstance(result, Exception):
             print(f"❌ Error in batch item {i}: {result}")
             default_result["reason"] = f"Error processing item: {str(result)}"
@@ -292,7 +520,35 @@ async def filter_batch_negative_content(request: BatchFilterRequest):
 )
 async def get_cache_stats():
     """Retrieve current cache statistics."""
-    return filter_cache.get_stats()
+    return {
+        **filter_cache.get_stats(),
+        "in_flight": len(in_flight.futures),
+        "coalesced": in_flight.coalesced,
+        "l2_hits": l2_cache.l2_stats["hits"],
+        "l2_misses": l2_cache.l2_stats["misses"],
+        "l2_errors": l2_cache.l2_stats["errors"],
+        "l2_version": l2_cache.CACHE_VERSION
+    }
+
+@app.get(
+    "/api/v1/llm/stats",
+    tags=["LLM"],
+    summary="Get LLM call statistics"
+)
+async def get_llm_stats():
+    """
+    Retrieve per-provider call count, error count, latency percentiles and health of LLM calls
+    in this process, hedged request counts, the share of LLM calls avoided by the topic
+    prefilter, plus rate limiter throttling shared by all processes.
+    """
+    rate_limit = {}
+    for provider in llm.router.providers:
+        limiter = llm.get_rate_limiter(provider.name)
+        rate_limit[provider.name] = await limiter.get_stats() if limiter is not None else None
+    return {
+        **llm.get_stats(),
+        "rate_limit": rate_limit
+    }
 
 @app.delete(
     "/api/v1/cache",
@@ -301,8 +557,9 @@ async def get_cache_stats():
     responses={200: {"model": Dict[str, str]}}
 )
 async def clear_cache():
-    """Clear all cache entries."""
+    """Clear all cache entries (local and Redis)."""
     filter_cache.clear()
+    await l2_cache.clear()
     return {"message": "Cache cleared successfully"}
 
 # --- Main ---
@@ -0,0 +1,14 @@
+# Cài dependency test: pip install -r requirements-dev.txt (trong negative_buzz_analyzer/), rồi chạy python -m pytest -q tests
+import os
+import sys
+
+import fakeredis
+import pytest
+
+# server.py import package app (from app.settings import Settings) như khi chạy trong /app của image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
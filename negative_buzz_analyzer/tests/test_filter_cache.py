@@ -0,0 +1,101 @@
+import json
+
+import server
+from server import FilterCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _item(number, **fields):
+    return {"id": str(number), "topic_name": "Ngân hàng A", "content": f"bài {number}", **fields}
+
+
+def _result(number, reason=""):
+    return {"id": str(number), "log_level": 2, "reason": reason}
+
+
+def test_key_ignores_identifiers_but_not_aliases():
+    cache = FilterCache()
+    assert cache._generate_cache_key(_item(1)) == cache._generate_cache_key({**_item(1), "id": "other", "topic_id": "t"})
+    assert cache._generate_cache_key(_item(1)) != cache._generate_cache_key(_item(1, topic_aliases=["NHA"]))
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = FilterCache(max_size=2)
+    cache.set(_item(1), _result(1))
+    cache.set(_item(2), _result(2))
+    assert cache.get(_item(1)) == _result(1)
+
+    cache.set(_item(3), _result(3))
+    assert cache.get(_item(2)) is None
+    assert cache.get(_item(1)) == _result(1)
+    assert cache.get(_item(3)) == _result(3)
+    assert cache.evictions == 1
+
+
+def test_byte_bound_evicts_until_under_limit():
+    size = len(json.dumps(_result(1, "x" * 100), ensure_ascii=False).encode("utf-8"))
+    cache = FilterCache(max_size=100, max_bytes=size * 2)
+    for number in range(1, 4):
+        cache.set(_item(number), _result(number, "x" * 100))
+
+    assert len(cache.cache) == 2
+    assert cache.total_bytes == size * 2
+    assert cache.get(_item(1)) is None
+    assert cache.evictions == 1
+
+
+def test_ttl_slides_on_access(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(server.time, "time", clock)
+    cache = FilterCache(ttl=10)
+    cache.set(_item(1), _result(1))
+    cache.set(_item(2), _result(2))
+
+    clock.now += 8
+    assert cache.get(_item(1)) == _result(1)
+    clock.now += 8
+    assert cache.get(_item(2)) is None
+    assert cache.get(_item(1)) == _result(1)
+    assert cache.expirations == 1
+
+
+def test_set_drops_expired_entries_from_the_front(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(server.time, "time", clock)
+    cache = FilterCache(ttl=10)
+    cache.set(_item(1), _result(1))
+    clock.now += 20
+    cache.set(_item(2), _result(2))
+
+    assert list(cache.cache) == [cache._generate_cache_key(_item(2))]
+    assert cache.expirations == 1
+
+
+def test_stats_report_rates():
+    cache = FilterCache(max_size=10)
+    cache.set(_item(1), _result(1))
+    cache.get(_item(1))
+    cache.get(_item(1))
+    cache.get(_item(2))
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert round(stats["hit_rate"], 2) == 66.67
+    assert round(stats["miss_rate"], 2) == 33.33
+    assert stats["usage_percent"] == 10.0
+    assert FilterCache().get_stats()["hit_rate"] == 0.0
+
+
+def test_stored_result_is_a_copy():
+    cache = FilterCache()
+    result = _result(1)
+    cache.set(_item(1), result)
+    result["reason"] = "changed"
+    assert cache.get(_item(1))["reason"] == ""
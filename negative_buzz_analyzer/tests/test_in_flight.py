@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import server
+from server import FilterCache, FilterItem, InFlightRequests
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        in_flight = InFlightRequests()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"log_level": 1}
+
+        results = await asyncio.gather(*[in_flight.run("k", work) for _ in range(3)])
+        return results, calls, in_flight
+
+    results, calls, in_flight = asyncio.run(scenario())
+    assert results == [{"log_level": 1}] * 3
+    assert calls == [1]
+    assert in_flight.coalesced == 2
+    assert in_flight.futures == {}
+
+
+def test_owner_error_is_shared_and_key_released():
+    async def scenario():
+        in_flight = InFlightRequests()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("llm down")
+
+        return await asyncio.gather(in_flight.run("k", fail), in_flight.run("k", fail), return_exceptions=True), in_flight
+
+    results, in_flight = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["llm down", "llm down"]
+    assert in_flight.futures == {}
+
+
+def test_cancelled_owner_releases_key_and_fails_waiters():
+    async def scenario():
+        in_flight = InFlightRequests()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        owner = asyncio.create_task(in_flight.run("k", slow))
+        await started.wait()
+        waiter = asyncio.create_task(in_flight.run("k", slow))
+        await asyncio.sleep(0)
+        owner.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        with pytest.raises(RuntimeError):
+            await waiter
+        assert in_flight.futures == {}
+
+        async def fast():
+            return "fresh"
+
+        # The next identical item becomes a new owner instead of waiting forever
+        assert await in_flight.run("k", fast) == "fresh"
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def batch_service(monkeypatch):
+    """Isolate the batch service from the shared caches and the LLM."""
+    monkeypatch.setattr(server, "filter_cache", FilterCache())
+    monkeypatch.setattr(server, "in_flight", InFlightRequests())
+
+    async def no_l2(keys):
+        return {}
+
+    async def skip_l2(items):
+        return None
+
+    async def filter_negative_content(data_input, result, topic_analysis=None):
+        return {**result, "log_level": 3, "reason": topic_analysis["reason"]}
+
+    monkeypatch.setattr(server.l2_cache, "get_many", no_l2)
+    monkeypatch.setattr(server.l2_cache, "set_many", skip_l2)
+    monkeypatch.setattr(server, "filter_negative_content", filter_negative_content)
+    return server
+
+
+def _post(post_id):
+    return FilterItem(id=post_id, type="newsTopic", topic_name="Ngân hàng A", content="Ngân hàng A lừa đảo")
+
+
+def test_cancelled_batch_request_releases_owned_keys(batch_service, monkeypatch):
+    gate = asyncio.Event()
+
+    async def check_targeting_topics(items):
+        if items:
+            await gate.wait()
+        return [{"reason": "llm"} for _ in items]
+
+    monkeypatch.setattr(batch_service, "check_targeting_topics", check_targeting_topics)
+
+    async def scenario():
+        owner = asyncio.create_task(batch_service.batch_filter_negative_content_service([_post("a")]))
+        await asyncio.sleep(0.01)
+        assert len(batch_service.in_flight.futures) == 1
+        waiter = asyncio.create_task(batch_service.batch_filter_negative_content_service([_post("b")]))
+        await asyncio.sleep(0.01)
+
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        [waiter_result] = await waiter
+        assert batch_service.in_flight.futures == {}
+        assert waiter_result["id"] == "b"
+        assert waiter_result["reason"].startswith("Error processing item")
+
+        gate.set()
+        [result] = await batch_service.batch_filter_negative_content_service([_post("c")])
+        assert result["id"] == "c"
+        assert result["reason"] == "llm"
+
+    asyncio.run(scenario())
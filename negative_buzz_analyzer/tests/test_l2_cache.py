@@ -0,0 +1,156 @@
+import asyncio
+import zlib
+
+import fakeredis
+import pytest
+import redis
+
+import server
+from app import cache as l2_cache
+from server import FilterCache, FilterItem, InFlightRequests
+
+RESULT = {"id": "a", "topic_name": "Ngân hàng A", "log_level": 3, "reason": "Công kích ngân hàng.", "crisis_keywords": ["lừa đảo"]}
+
+
+class BrokenClient:
+    async def execute_command(self, *args, **kwargs):
+        raise redis.ConnectionError("down")
+
+    async def mget(self, *args, **kwargs):
+        raise redis.ConnectionError("down")
+
+
+@pytest.fixture
+def l2(redis_server, monkeypatch):
+    client = fakeredis.FakeAsyncRedis(server=redis_server)
+    monkeypatch.setattr(l2_cache.cache, "client", client)
+    monkeypatch.setattr(l2_cache.settings, "REDIS_CACHE_ENABLED", True)
+    monkeypatch.setattr(l2_cache, "l2_stats", {"hits": 0, "misses": 0, "errors": 0})
+    return fakeredis.FakeRedis(server=redis_server)
+
+
+def test_entries_are_compressed_versioned_and_expire(l2):
+    asyncio.run(l2_cache.set_many({"k1": RESULT}))
+
+    key = f"buzz-cache:{l2_cache.CACHE_VERSION}:k1"
+    assert l2.keys() == [key.encode()]
+    assert zlib.decompress(l2.get(key)).decode("utf-8").startswith('{"id": "a"')
+    assert 0 < l2.ttl(key) <= l2_cache.settings.FILTER_CACHE_TTL
+
+    assert asyncio.run(l2_cache.get_many(["k1", "k2"])) == {"k1": RESULT}
+    assert l2_cache.l2_stats == {"hits": 1, "misses": 1, "errors": 0}
+
+
+def test_redis_errors_are_treated_as_misses(l2, monkeypatch):
+    monkeypatch.setattr(l2_cache.cache, "client", BrokenClient())
+    assert asyncio.run(l2_cache.get_many(["k1"])) == {}
+    asyncio.run(l2_cache.set_many({"k1": RESULT}))
+    assert l2_cache.l2_stats["errors"] == 2
+
+
+def test_disabled_l2_does_nothing(l2, monkeypatch):
+    monkeypatch.setattr(l2_cache.settings, "REDIS_CACHE_ENABLED", False)
+    asyncio.run(l2_cache.set_many({"k1": RESULT}))
+    assert l2.keys() == []
+    assert asyncio.run(l2_cache.get_many(["k1"])) == {}
+
+
+def test_cache_version_follows_prompt(monkeypatch):
+    version = l2_cache.cache_version()
+    monkeypatch.setattr(l2_cache, "build_targeting_prompt", lambda data: "prompt v2")
+    assert l2_cache.cache_version() != version
+
+
+@pytest.fixture
+def service(l2, monkeypatch):
+    monkeypatch.setattr(server, "filter_cache", FilterCache())
+    monkeypatch.setattr(server, "in_flight", InFlightRequests())
+    calls = []
+
+    async def check_targeting_topics(items):
+        calls.extend(item["id"] for item in items)
+        return [{"contains_topic": True, "targeting_topic": False, "reason": "llm", "crisis_keywords": []} for _ in items]
+
+    monkeypatch.setattr(server, "check_targeting_topics", check_targeting_topics)
+    return calls
+
+
+def _post(post_id, content="Ngân hàng A lừa đảo"):
+    return FilterItem(id=post_id, type="newsTopic", topic_name="Ngân hàng A", content=content)
+
+
+def test_l2_hit_fills_l1_and_keeps_item_identifiers(service):
+    data_input = _post("b").dict(exclude_none=True)
+    asyncio.run(l2_cache.set_many({server.filter_cache._generate_cache_key(data_input): RESULT}))
+
+    result = asyncio.run(server.filter_negative_content_service(data_input))
+    assert result == {**RESULT, "id": "b", "topic_id": "", "site_id": ""}
+    assert server.filter_cache.get(data_input) == RESULT
+    assert service == []
+
+
+def test_batch_reads_l2_once_and_writes_back_new_results(service, monkeypatch):
+    cached = _post("a").dict(exclude_none=True)
+    asyncio.run(l2_cache.set_many({server.filter_cache._generate_cache_key(cached): RESULT}))
+    lookups = []
+    get_many = l2_cache.get_many
+
+    async def counting_get_many(keys):
+        lookups.append(list(keys))
+        return await get_many(keys)
+
+    monkeypatch.setattr(l2_cache, "get_many", counting_get_many)
+
+    results = asyncio.run(server.batch_filter_negative_content_service([_post("a"), _post("b", "bài khác"), _post("c", "bài khác")]))
+
+    assert len(lookups) == 1 and len(lookups[0]) == 2
+    assert service == ["b"]
+    assert [result["reason"] for result in results] == ["Công kích ngân hàng.", "llm", "llm"]
+    assert [result["id"] for result in results] == ["a", "b", "c"]
+
+    fresh = _post("b", "bài khác").dict(exclude_none=True)
+    stored = asyncio.run(get_many([server.filter_cache._generate_cache_key(fresh)]))
+    assert list(stored.values())[0]["reason"] == "llm"
+
+
+def test_failed_verdicts_are_not_cached(service, monkeypatch):
+    from app import llm
+
+    async def failing_check(items):
+        service.extend(item["id"] for item in items)
+        return [llm.error_verdict(TimeoutError("llm timeout")) for _ in items]
+
+    monkeypatch.setattr(server, "check_targeting_topics", failing_check)
+    [result] = asyncio.run(server.batch_filter_negative_content_service([_post("a")]))
+    assert result["reason"].endswith("llm timeout")
+
+    data_input = _post("a").dict(exclude_none=True)
+    cache_key = server.filter_cache._generate_cache_key(data_input)
+    assert server.filter_cache.get(data_input) is None
+    assert asyncio.run(l2_cache.get_many([cache_key])) == {}
+
+    # Single-item path: an exception while filtering is not cached either
+    async def broken_filter(data_input, result, topic_analysis=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server, "filter_negative_content", broken_filter)
+    result = asyncio.run(server.filter_negative_content_service(data_input))
+    assert result["reason"] == "Error processing item: boom"
+    assert server.filter_cache.get(data_input) is None
+    assert asyncio.run(l2_cache.get_many([cache_key])) == {}
+
+    # The next request retries the LLM instead of serving the failure
+    asyncio.run(server.batch_filter_negative_content_service([_post("b")]))
+    assert service == ["a", "b"]
+
+
+def test_l1_hit_keeps_item_identifiers(service):
+    [first] = asyncio.run(server.batch_filter_negative_content_service([_post("a")]))
+    assert first["id"] == "a"
+
+    single = asyncio.run(server.filter_negative_content_service(_post("b").dict(exclude_none=True)))
+    [batched] = asyncio.run(server.batch_filter_negative_content_service([_post("c")]))
+    assert (single["id"], batched["id"]) == ("b", "c")
+    assert single["reason"] == batched["reason"] == "llm"
+    assert service == ["a"]
+    assert server.filter_cache.get(_post("z").dict(exclude_none=True))["id"] == "a"
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import llm
+from app.providers import create_providers
+
+
+def _completion(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+@pytest.fixture
+def provider():
+    [fireworks] = create_providers(["fireworks"], {"fireworks": "test-key"})
+    return fireworks
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    """Route the shared client through a MockTransport; returns the list of received requests."""
+    monkeypatch.setattr(llm.settings, "LLM_RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(llm, "_client", None)
+    monkeypatch.setattr(llm, "_semaphore", None)
+    requests, responses = [], []
+
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        return responses.pop(0) if responses else httpx.Response(200, json=_completion('{"ok": true}'))
+
+    monkeypatch.setattr(llm, "create_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return requests, responses
+
+
+def test_client_is_shared_for_the_lifespan(mock_llm):
+    async def scenario():
+        await llm.start_client()
+        client = llm.get_client()
+        assert llm.get_client() is client
+        await llm.close_client()
+        assert client.is_closed and llm._client is None
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_is_bounded_by_semaphore(mock_llm, provider, monkeypatch):
+    monkeypatch.setattr(llm.settings, "LLM_CONCURRENCY", 2)
+    requests, _ = mock_llm
+    active, peak = [0], [0]
+    original = llm.create_client
+
+    def tracking_client():
+        client = original()
+        send = client.send
+
+        async def tracked_send(request, **kwargs):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            try:
+                return await send(request, **kwargs)
+            finally:
+                active[0] -= 1
+
+        client.send = tracked_send
+        return client
+
+    monkeypatch.setattr(llm, "create_client", tracking_client)
+
+    async def scenario():
+        await llm.start_client()
+        try:
+            return await asyncio.gather(*[llm.post_llm(provider, f"prompt {i}") for i in range(6)])
+        finally:
+            await llm.close_client()
+
+    assert asyncio.run(scenario()) == ['{"ok": true}'] * 6
+    assert len(requests) == 6
+    assert peak[0] == 2
+
+
+def test_rate_limited_response_is_retried_after_delay(mock_llm, provider, monkeypatch):
+    requests, responses = mock_llm
+    responses.append(httpx.Response(429, headers={"Retry-After": "3"}))
+    delays = []
+    sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(llm.asyncio, "sleep", fake_sleep)
+
+    async def scenario():
+        try:
+            return await llm.post_llm(provider, "prompt")
+        finally:
+            await llm.close_client()
+
+    assert asyncio.run(scenario()) == '{"ok": true}'
+    assert 3.0 in delays
+    assert len(requests) == 2
+    assert json.loads(requests[0].content)["messages"][-1]["content"] == "prompt"
+    assert requests[0].headers["Authorization"] == "Bearer test-key"
+
+
+def test_persistent_errors_raise_after_retries(mock_llm, provider, monkeypatch):
+    monkeypatch.setattr(llm.settings, "LLM_MAX_RETRIES", 1)
+    requests, responses = mock_llm
+    responses.extend([httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(429, headers={"Retry-After": "0"})])
+
+    async def scenario():
+        try:
+            return await llm.post_llm(provider, "prompt")
+        finally:
+            await llm.close_client()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(scenario())
+    assert len(requests) == 2